@@ -26,6 +26,7 @@ backend_app = None
 try:
     # Try to import the existing FastAPI app from backend
     from main import app as backend_app
+    from main import shutdown as backend_shutdown, startup as backend_startup
     print("[INFO] Successfully imported existing backend app from backend/main.py")
 except ImportError as e:
     print(f"[WARNING] Could not import backend app: {e}")
@@ -61,6 +62,13 @@ if backend_app:
         """
         return RedirectResponse(url="/api/chat", status_code=307)
 
+    @app.post("/rag", include_in_schema=False)
+    async def rag_redirect_post(request: Request):
+        """
+        Redirect POST /rag -> /api/rag (307 to preserve POST body).
+        """
+        return RedirectResponse(url="/api/rag", status_code=307)
+
     @app.post("/predict", include_in_schema=False)
     async def predict_redirect_post(request: Request):
         """
@@ -198,3 +206,13 @@ async def startup_event():
     print(f"Backend mounted: {backend_app is not None}")
     print(f"UI available: {UI_BUILD_PATH.exists()}")
     print("=" * 60)
+    # Mounted sub-apps don't get lifespan events
+    if backend_app:
+        await backend_startup()
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop backend background work and close pooled clients (mounted sub-apps get no lifespan)."""
+    if backend_app:
+        await backend_shutdown()
@@ -0,0 +1,196 @@
+"""
+Admission Control
+=================
+Bounds concurrent LLM generations and queues the rest fairly.
+
+- At most MAX_ACTIVE_GENERATIONS generations run at once.
+- Waiting requests are queued per session and served round-robin across
+  sessions, so one student firing many requests cannot starve others.
+- The queue is bounded (MAX_QUEUED_GENERATIONS overall and
+  MAX_QUEUED_PER_SESSION per session) and waits time out after
+  QUEUE_TIMEOUT_SECONDS; both reject with a Retry-After estimate.
+- Queue depth, active generations and wait times are recorded in metrics.
+
+Runs on the event loop only, so no locking is needed.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+from metrics import get_metrics
+import config
+
+ANONYMOUS_SESSION = "anonymous"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a generation cannot be admitted; maps to HTTP 429."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A granted generation slot; release() is idempotent."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+        self.admitted_at = time.monotonic()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+
+class AdmissionController:
+    """Global concurrency limit with per-session fair queuing."""
+
+    def __init__(
+        self,
+        max_active: int = config.MAX_ACTIVE_GENERATIONS,
+        max_queue: int = config.MAX_QUEUED_GENERATIONS,
+        max_queue_per_session: int = config.MAX_QUEUED_PER_SESSION,
+        queue_timeout: float = config.QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.max_active = max(1, max_active)
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        # session id -> waiters; iteration order is the round-robin order
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.metrics = get_metrics()
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    async def acquire(self, session_id: Optional[str] = None) -> AdmissionTicket:
+        """
+        Wait for a generation slot.
+
+        Args:
+            session_id: Requesting session (used for fair queuing)
+
+        Returns:
+            Ticket to release when the generation finishes
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait timed out
+        """
+        sid = session_id or ANONYMOUS_SESSION
+        started = time.monotonic()
+
+        if self.active < self.max_active and not self.waiting:
+            self.active += 1
+            self._record(started, admitted=True)
+            return AdmissionTicket(self)
+
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+        queue = self._queues.get(sid)
+        if queue is not None and len(queue) >= self.max_queue_per_session:
+            self._reject("session_queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(sid, deque()).append(waiter)
+        self.waiting += 1
+        self._update_gauges()
+
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back a slot granted meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self._discard(sid, waiter)
+            raise
+
+        if not waiter.done():
+            self._discard(sid, waiter)
+            self._record(started, admitted=False)
+            self._reject("queue_timeout")
+
+        self._record(started, admitted=True)
+        return AdmissionTicket(self)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, from recent generation times."""
+        typical = self.metrics.percentile("generation_seconds", 50) or 5.0
+        rounds = (self.waiting + 1) / self.max_active
+        return max(1, math.ceil(typical * rounds))
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "sessions_waiting": len(self._queues),
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+        }
+
+    # -----------------------
+    # Internals
+    # -----------------------
+    def _release(self):
+        self.active -= 1
+        self._grant_next()
+        self._update_gauges()
+
+    def _grant_next(self):
+        while self.active < self.max_active and self._queues:
+            sid, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self._queues.move_to_end(sid)  # next session's turn
+            else:
+                del self._queues[sid]
+            if waiter.done():
+                continue
+            self.active += 1
+            waiter.set_result(True)
+
+    def _discard(self, sid: str, waiter: asyncio.Future):
+        queue = self._queues.get(sid)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue:
+                del self._queues[sid]
+        waiter.cancel()
+        self._update_gauges()
+
+    def _reject(self, reason: str):
+        self.metrics.incr(f"admission_rejected_{reason}")
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def _record(self, started: float, admitted: bool):
+        if admitted:
+            self.metrics.incr("admission_admitted")
+        self.metrics.observe("queue_wait_seconds", time.monotonic() - started)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        self.metrics.set_gauge("active_generations", self.active)
+        self.metrics.set_gauge("queue_depth", self.waiting)
+
+
+# Global admission controller (one per worker process)
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the global admission controller, created on first use."""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,175 @@
+"""
+Chunk Store
+===========
+Compressed, id-addressable storage for chunk text, kept outside the vector
+index so candidate generation can work on ids and scores alone.
+
+Each row holds:
+    - the zlib-compressed chunk text (fetched only for final results)
+    - its metadata as JSON
+    - its character length (for context budgeting before fetching text)
+    - its unique lower-cased terms (for the lexical re-rank stage)
+
+Optionally, per-sentence embeddings of each chunk are cached alongside
+(normalised float16) for query-focused compression (see compressor.py).
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id      TEXT PRIMARY KEY,
+    module  TEXT NOT NULL,
+    length  INTEGER NOT NULL,
+    terms   TEXT NOT NULL,
+    meta    TEXT NOT NULL,
+    body    BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_module ON chunks(module);
+CREATE TABLE IF NOT EXISTS sentence_vectors (
+    id      TEXT PRIMARY KEY,
+    spans   TEXT NOT NULL,
+    dim     INTEGER NOT NULL,
+    vectors BLOB NOT NULL
+);
+"""
+
+# SQLite's default limit on bound parameters is 999
+_BATCH = 500
+
+
+def extract_terms(text: str) -> List[str]:
+    """Unique lower-cased word terms of a text, sorted for stable storage."""
+    return sorted(set(re.findall(r"\w+", text.lower())))
+
+
+class ChunkStore:
+    """SQLite-backed chunk text store shared by ingest and retrieval."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # -----------------------
+    # Writes (ingest)
+    # -----------------------
+    def put_many(
+        self,
+        module_id: str,
+        ids: Sequence[str],
+        docs: Sequence[str],
+        metas: Sequence[Dict],
+    ):
+        """Insert or replace chunks for a module."""
+        rows = [
+            (
+                chunk_id,
+                module_id,
+                len(doc),
+                " ".join(extract_terms(doc)),
+                json.dumps(meta),
+                zlib.compress(doc.encode("utf-8"), 6),
+            )
+            for chunk_id, doc, meta in zip(ids, docs, metas)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, module, length, terms, meta, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def put_sentence_vectors(
+        self,
+        ids: Sequence[str],
+        spans: Sequence[List[Tuple[int, int]]],
+        vectors: Sequence[np.ndarray],
+    ):
+        """Cache sentence spans and their normalised embeddings per chunk."""
+        rows = [
+            (
+                chunk_id,
+                json.dumps(chunk_spans),
+                int(vecs.shape[1]) if vecs.ndim == 2 else 0,
+                np.asarray(vecs, dtype=np.float16).tobytes(),
+            )
+            for chunk_id, chunk_spans, vecs in zip(ids, spans, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentence_vectors (id, spans, dim, vectors) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    # -----------------------
+    # Reads (retrieval)
+    # -----------------------
+    def _select(self, columns: str, ids: Iterable[str], table: str = "chunks") -> List[tuple]:
+        ids = list(ids)
+        rows: List[tuple] = []
+        with self._lock:
+            for start in range(0, len(ids), _BATCH):
+                batch = ids[start:start + _BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(
+                    self._conn.execute(
+                        f"SELECT id, {columns} FROM {table} WHERE id IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+        return rows
+
+    def get_terms(self, ids: Iterable[str]) -> Dict[str, Dict]:
+        """Lexical stage view: {id: {"terms": set, "length": int}} without chunk text."""
+        return {
+            chunk_id: {"terms": set(terms.split()), "length": length}
+            for chunk_id, length, terms in self._select("length, terms", ids)
+        }
+
+    def get_chunks(self, ids: Iterable[str]) -> Dict[str, Dict]:
+        """Final stage view: {id: {"doc": str, "meta": dict}} with decompressed text."""
+        return {
+            chunk_id: {
+                "doc": zlib.decompress(body).decode("utf-8"),
+                "meta": json.loads(meta),
+            }
+            for chunk_id, meta, body in self._select("meta, body", ids)
+        }
+
+    def get_sentence_vectors(self, ids: Iterable[str]) -> Dict[str, Tuple[List[Tuple[int, int]], np.ndarray]]:
+        """{id: (sentence spans, (n, dim) float16 vectors)} for chunks that have them."""
+        out = {}
+        for chunk_id, spans, dim, blob in self._select("spans, dim, vectors", ids, table="sentence_vectors"):
+            if not dim:
+                continue
+            vecs = np.frombuffer(blob, dtype=np.float16).reshape(-1, dim)
+            out[chunk_id] = ([tuple(s) for s in json.loads(spans)], vecs)
+        return out
+
+
+_store: Optional[ChunkStore] = None
+
+
+def get_chunk_store() -> ChunkStore:
+    """Get the process-wide chunk store at config.CHUNK_STORE_PATH."""
+    global _store
+    if _store is None:
+        _store = ChunkStore(config.CHUNK_STORE_PATH)
+    return _store
@@ -1,7 +1,12 @@
-from typing import List
+from typing import List, Tuple
 import re
 
-def split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+# Sentence ends at . ! ? (optionally closed by a quote/bracket) followed by
+# whitespace, or at a line break (bullets, headings, table rows).
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n+")
+
+
+def _merge_paragraphs(text: str) -> List[str]:
     paras = re.split(r"\n\s*\n+", text)
 
     # attach short heading-like lines to the next paragraph
@@ -15,19 +20,53 @@ def split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
                 i += 1
         merged.append(p)
         i += 1
+    return merged
+
+
+def split_text_spans(text: str, chunk_size: int, overlap: int) -> List[Tuple[int, int, str]]:
+    """
+    Split text into chunks, returning (start, end, chunk) triples.
 
-    chunks, current = [], ""
+    Offsets index the normalised document "\\n\\n".join(paragraphs), in which
+    every chunk is an exact slice; overlapping or adjacent chunks of one file
+    can therefore be merged back together later (see context_packer.py).
+    """
+    merged = _merge_paragraphs(text)
+
+    spans, current, cur_start = [], "", 0
+    pos = 0
     for p in merged:
+        p_start = pos
+        pos += len(p) + 2
         if len(current) + len(p) + 2 <= chunk_size:
+            if not current:
+                cur_start = p_start
             current += (("\n\n" if current else "") + p)
         else:
             if current:
-                chunks.append(current)
+                spans.append((cur_start, cur_start + len(current), current))
             while len(p) > chunk_size:
-                chunks.append(p[:chunk_size])
+                spans.append((p_start, p_start + chunk_size, p[:chunk_size]))
                 p = p[chunk_size-overlap:]
-            current = p
+                p_start += chunk_size - overlap
+            current, cur_start = p, p_start
     if current:
-        chunks.append(current)
-    return chunks
+        spans.append((cur_start, cur_start + len(current), current))
+    return spans
+
+
+def split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    return [chunk for _, _, chunk in split_text_spans(text, chunk_size, overlap)]
+
 
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Sentence spans (start, end) of text, whitespace between sentences excluded."""
+    spans, start = [], 0
+    for m in _SENTENCE_END.finditer(text):
+        end = m.start() + len(m.group(0).rstrip())
+        if text[start:end].strip():
+            spans.append((start, end))
+        start = m.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    return spans
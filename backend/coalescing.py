@@ -0,0 +1,164 @@
+"""
+Request Coalescing
+==================
+Singleflight for identical in-flight questions: when many students ask the
+same thing at once (e.g. right after a deadline announcement), the first
+request runs the upstream generation and every concurrent request with the
+same cache key attaches to it instead of starting its own.
+
+- The generation runs in its own task and publishes SSE events to a
+  Broadcast; each client is just a subscriber.
+- Late joiners first receive the buffered prefix, then live events, so
+  every subscriber sees the complete stream.
+- The upstream generation is cancelled only when the last subscriber
+  disconnects. The starting request holds a reserved subscription from the
+  moment the flight starts, so a joiner leaving before the starter reads
+  its first event does not cancel the flight; the starter takes the
+  reservation over when its stream begins, or cancels it if its client
+  went away before that.
+
+Runs on the event loop only, so no locking is needed.
+"""
+
+import asyncio
+from contextlib import suppress
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+
+class Broadcast:
+    """Buffered async fan-out of one SSE event stream."""
+
+    def __init__(self):
+        self.events: List[str] = []
+        self.closed = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._reserved = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str):
+        self.events.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        # Wake current waiters; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def reserve(self):
+        """Count the starting request as a subscriber before it starts reading."""
+        self.subscribers += 1
+        self._reserved = True
+
+    def cancel_reservation(self):
+        """Drop the reservation if its subscriber never started reading."""
+        if self._reserved:
+            self._reserved = False
+            self._leave()
+
+    async def subscribe(self, reserved: bool = False) -> AsyncIterator[str]:
+        """
+        Yield every event from the start, then live events until closed.
+
+        Args:
+            reserved: Take over the reservation made by reserve() instead of
+                subscribing anew
+        """
+        if reserved and self._reserved:
+            self._reserved = False
+        else:
+            self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                while position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                if self.closed:
+                    return
+                await self._changed.wait()
+        finally:
+            self._leave()
+
+    def _leave(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.closed and self.task is not None:
+            # Nobody is listening any more: stop the upstream generation
+            # (closing first so no new request joins a dying flight)
+            self.close()
+            self.task.cancel()
+
+
+class SingleFlight:
+    """Maps cache keys to the generation currently running for them."""
+
+    def __init__(self):
+        self._flights: Dict[str, Broadcast] = {}
+
+    def join(self, key: str) -> Optional[Broadcast]:
+        """The in-flight broadcast for key, if any."""
+        flight = self._flights.get(key)
+        return flight if flight is not None and not flight.closed else None
+
+    def start(
+        self,
+        key: str,
+        events: AsyncIterator[str],
+        on_close: Optional[Callable[[], None]] = None,
+    ) -> Broadcast:
+        """
+        Run a generation in the background and publish its events.
+
+        The caller holds a reserved subscription: read it with
+        subscribe(reserved=True), or call cancel_reservation() if the
+        client never starts reading.
+
+        Args:
+            key: Cache key identifying the request
+            events: Async generator producing the SSE events
+            on_close: Called once the generation has finished or was cancelled
+
+        Returns:
+            Broadcast to subscribe to
+        """
+        flight = Broadcast()
+        flight.reserve()
+        self._flights[key] = flight
+        flight.task = asyncio.ensure_future(self._pump(flight, events))
+        # Done callbacks run even if the task is cancelled before it starts
+        flight.task.add_done_callback(lambda _: self._finish(key, flight, on_close))
+        return flight
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+        }
+
+    async def _pump(self, flight: Broadcast, events: AsyncIterator[str]):
+        try:
+            async for event in events:
+                flight.publish(event)
+        finally:
+            with suppress(RuntimeError):
+                await events.aclose()
+
+    def _finish(self, key: str, flight: Broadcast, on_close: Optional[Callable[[], None]]):
+        flight.close()
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if on_close is not None:
+            on_close()
+
+
+# Global singleflight registry (one per worker process)
+_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    """Get the global singleflight registry."""
+    return _singleflight
@@ -0,0 +1,97 @@
+"""
+Query-Focused Compression
+=========================
+Extractive compression of retrieved passages before they reach the LLM.
+
+Every sentence of a passage is scored against the query embedding (already
+computed for retrieval) using the per-sentence embeddings cached at ingest,
+and only the best sentences are kept, in their original order. Passages keep
+their position in the context, so citation markers still line up with
+sources.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import config
+
+# Shown where sentences were dropped between two kept ones
+GAP_MARKER = " … "
+
+
+def _normalize(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def compress_passage(
+    passage: Dict,
+    query_vector: np.ndarray,
+    sentence_index: Dict[str, Tuple[List[Tuple[int, int]], np.ndarray]],
+    keep_ratio: float = config.COMPRESSION_KEEP_RATIO,
+    min_sentences: int = config.COMPRESSION_MIN_SENTENCES,
+) -> Dict:
+    """
+    Keep the sentences of a passage most similar to the query.
+
+    Args:
+        passage: Merged passage from context_packer.merge_adjacent
+        query_vector: Normalised query embedding
+        sentence_index: {chunk_id: (sentence spans, sentence vectors)}
+        keep_ratio: Fraction of sentences to keep
+        min_sentences: Passages with this many sentences or fewer are untouched
+
+    Returns:
+        The passage, with "doc" compressed when sentence vectors were available
+    """
+    # Map member-chunk sentence spans into passage offsets; overlapping
+    # members repeat sentences, so keep one score per span
+    scored: Dict[Tuple[int, int], float] = {}
+    for chunk_id, offset in passage.get("members", []):
+        if chunk_id not in sentence_index:
+            # Without vectors for every member we can't score the whole passage
+            return passage
+        spans, vectors = sentence_index[chunk_id]
+        if not spans:
+            continue
+        sims = vectors.astype(np.float32) @ query_vector
+        for (start, end), sim in zip(spans, sims):
+            key = (start + offset, end + offset)
+            scored[key] = max(scored.get(key, float("-inf")), float(sim))
+
+    if len(scored) <= min_sentences:
+        return passage
+
+    keep = max(min_sentences, math.ceil(len(scored) * keep_ratio))
+    best = sorted(scored, key=scored.get, reverse=True)[:keep]
+
+    doc = passage["doc"]
+    parts, last_end = [], None
+    for start, end in sorted(best):
+        if last_end is not None and start < last_end:
+            # Partial sentences cut at chunk edges can overlap; extend, don't repeat
+            if end > last_end:
+                parts.append(doc[last_end:end].rstrip())
+                last_end = end
+            continue
+        if parts:
+            gap = doc[last_end:start]
+            parts.append(" " if not gap.strip() else GAP_MARKER)
+        elif start > 0 and doc[:start].strip():
+            parts.append(GAP_MARKER.lstrip())
+        parts.append(doc[start:end].strip())
+        last_end = end
+
+    compressed = "".join(parts)
+    if not compressed or len(compressed) >= len(doc):
+        return passage
+    return {**passage, "doc": compressed, "compressed_from": len(doc)}
+
+
+def make_compressor(query_embedding, sentence_index):
+    """Bind a query embedding and sentence index into a pack_contexts hook."""
+    query_vector = _normalize(query_embedding)
+    return lambda passage: compress_passage(passage, query_vector, sentence_index)
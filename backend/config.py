@@ -7,6 +7,10 @@ from pathlib import Path
 # /app inside the container
 BASE_DIR   = Path(__file__).parent
 DATA_DIR   = BASE_DIR / "chroma_db"   # Chroma persistence dir
+CHUNK_STORE_PATH = DATA_DIR / "chunks.sqlite3"  # compressed chunk text by id
+INDEX_VERSION_PATH = DATA_DIR / "index_version"  # bumped by every ingest
+FACTS_PATH = DATA_DIR / "facts.sqlite3"  # facts extracted from handbook tables
+INTENT_CENTROIDS_PATH = DATA_DIR / "intent_centroids.json"  # per-intent query centroids
 CORPUS_DIR = BASE_DIR / "corpus"      # Put your docs here inside the container
 
 # -----------------------
@@ -41,17 +45,61 @@ else:
 # Retrieval
 # -----------------------
 # In Fast Mode, retrieve fewer chunks for speed
+# CONTEXT_TOKEN_BUDGET caps the packed context (see context_packer.py):
+# overlapping chunks are merged and passages cut on sentence boundaries.
 if FAST_MODE:
     TOP_K = 3  # Fewer chunks for faster processing
-    MAX_CONTEXT_CHARS = 6000  # Reduced for faster LLM processing
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # ~6000 chars
 else:
     TOP_K = 8
-    MAX_CONTEXT_CHARS = None  # no limit
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
 
 BM25_WEIGHT  = 0.7      # Increased boost for keyword overlap (fuzzy matching enhanced)
+VECTOR_WEIGHT = 0.3     # weight of the vector similarity in the fused score
+# Candidates per query variant scored on ids/terms only; chunk text is fetched
+# just for the final TOP_K (see chunk_store.py)
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))
 HYDE         = False    # keep off until everything is stable
 MULTI_QUERY  = False    # re-enable later for recall
 
+# Query-focused extractive compression of retrieved passages (compressor.py).
+# Sentence embeddings are cached at ingest when enabled, so re-ingest after
+# switching it on.
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "0") == "1"
+COMPRESSION_KEEP_RATIO = float(os.getenv("COMPRESSION_KEEP_RATIO", "0.4"))
+COMPRESSION_MIN_SENTENCES = int(os.getenv("COMPRESSION_MIN_SENTENCES", "2"))
+
+# -----------------------
+# Intent Routing
+# -----------------------
+# Classify the question's intent from its retrieval embedding against
+# per-intent centroids (intent_classifier.py). The keyword rules decide when
+# the best intent is below INTENT_MIN_SIMILARITY or ahead of the runner-up
+# by less than INTENT_MIN_MARGIN (cosine similarity).
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "1") == "1"
+INTENT_MIN_SIMILARITY = float(os.getenv("INTENT_MIN_SIMILARITY", "0.3"))
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.05"))
+
+# -----------------------
+# Modules
+# -----------------------
+# Each first-level subdirectory of CORPUS_DIR is ingested as its own module
+# collection; files in the corpus root belong to DEFAULT_MODULE.
+DEFAULT_MODULE = os.getenv("DEFAULT_MODULE", "default")
+# Estimated resident vector memory allowed for open module indexes before the
+# least recently used module is evicted (also passed to Chroma's segment cache)
+MODULE_INDEX_MEMORY_MB = int(os.getenv("MODULE_INDEX_MEMORY_MB", "512"))
+
+# -----------------------
+# Vector Index Quantization
+# -----------------------
+# "none" searches Chroma's float32 index directly. "float16" or "int8" makes
+# ingest.py build a compact side index (see vector_index.py) that is searched
+# instead; only the shortlist is re-scored against full-precision vectors on disk.
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()
+QUANT_INDEX_DIR = DATA_DIR / "quantized"
+QUANT_RESCORE_CANDIDATES = int(os.getenv("QUANT_RESCORE_CANDIDATES", "50"))
+
 # -----------------------
 # LLM Provider Configuration - OpenRouter Only
 # -----------------------
@@ -70,13 +118,129 @@ OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-3.5-turbo")
 OPENROUTER_SITE_URL = os.getenv("OPENROUTER_SITE_URL", "")  # optional: your site/app URL
 OPENROUTER_APP_NAME = os.getenv("OPENROUTER_APP_NAME", "EduMate")
 
+# Optional local Ollama upstream (used first when USE_OPENAI=0, or when
+# listed in LLM_UPSTREAMS)
+USE_OPENAI = os.getenv("USE_OPENAI", "1") == "1"
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
+
+# -----------------------
+# Provider Routing (see provider_router.py)
+# -----------------------
+# Ordered "provider:model" list, e.g.
+#   LLM_UPSTREAMS=openrouter:openai/gpt-4o-mini,openrouter:meta-llama/llama-3.1-8b-instruct,ollama:llama3.2:3b
+# Empty = OPENROUTER_MODEL (or OLLAMA_MODEL when USE_OPENAI=0) plus the
+# comma-separated OPENROUTER_FALLBACK_MODELS
+LLM_UPSTREAMS = os.getenv("LLM_UPSTREAMS", "")
+OPENROUTER_FALLBACK_MODELS = os.getenv("OPENROUTER_FALLBACK_MODELS", "")
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))   # to first token, retries included
+LLM_RETRIES_PER_UPSTREAM = int(os.getenv("LLM_RETRIES_PER_UPSTREAM", "1"))
+LLM_RETRY_BASE_SECONDS = 0.25   # full-jitter exponential backoff
+LLM_RETRY_MAX_SECONDS = 2.0
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))   # consecutive failures
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Hedging: start a backup request when the first token is later than the
+# upstream's recent TTFT p95 (clamped; HEDGE_DEFAULT_SECONDS until enough samples).
+# Backups only go to another provider endpoint, so with a single one
+# (the default OpenRouter setup) nothing is hedged.
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "1") == "1"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_SECONDS = float(os.getenv("HEDGE_DEFAULT_SECONDS", "3"))
+HEDGE_MIN_SECONDS = 0.5
+HEDGE_MAX_SECONDS = 8.0
+
+# -----------------------
+# HTTP Connection Pooling
+# -----------------------
+# Upstream clients are created once per process and reused (see http_clients.py)
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"   # needs the h2 package
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))  # wait for a free connection
+
+# SSE streaming: keep-alive comments for idle proxies, and how often to check
+# whether the student has gone away (so the upstream generation is cancelled)
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+# -----------------------
+# Load-Adaptive Degradation (see degradation.py)
+# -----------------------
+# Step TOP_K, context budget, MAX_TOKENS and query expansion down when the
+# queue backs up or TTFT p95 (over the last DEGRADE_WINDOW_SECONDS) is high
+ADAPTIVE_DEGRADATION = os.getenv("ADAPTIVE_DEGRADATION", "1") == "1"
+DEGRADE_QUEUE_DEPTH = int(os.getenv("DEGRADE_QUEUE_DEPTH", "4"))
+DEGRADE_TTFT_P95_SECONDS = float(os.getenv("DEGRADE_TTFT_P95_SECONDS", "4"))
+DEGRADE_RECOVER_FRACTION = 0.5   # recover once load is below half the thresholds
+DEGRADE_WINDOW_SECONDS = 60
+DEGRADE_DWELL_SECONDS = float(os.getenv("DEGRADE_DWELL_SECONDS", "10"))
+
 # Generation controls (balanced for quality and speed)
 # Reduced to 400 for faster responses (4-6 seconds target)
 MAX_TOKENS   = int(os.getenv("NUM_PREDICT", "400"))
 TEMPERATURE  = float(os.getenv("TEMP", "0.3"))
 
-# Concurrency control for Fast Mode pilot
+# -----------------------
+# Prompt Token Budget (see prompt_budget.py)
+# -----------------------
+# The RAG prompt is sized to the smallest context window among the upstreams
+# (0 = look each model up) and to what the upstream can prefill within the
+# TTFT target; PROMPT_CONTEXT_SHARE of what is left after the system prompt
+# and question goes to retrieved context, the rest to conversation history
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")  # tiktoken, if installed
+MODEL_CONTEXT_WINDOW = int(os.getenv("MODEL_CONTEXT_WINDOW", "0"))
+PROMPT_TARGET_TTFT_SECONDS = float(os.getenv("PROMPT_TARGET_TTFT_SECONDS", "1.5"))
+PREFILL_TOKENS_PER_SECOND = float(os.getenv("PREFILL_TOKENS_PER_SECOND", "3000"))
+PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.7"))
+
+# -----------------------
+# Response Cache (see response_cache.py)
+# -----------------------
+# Exact prompt-level cache of completed answers, shared by workers via SQLite
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_PATH = DATA_DIR / "response_cache.sqlite3"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "20000"))
+
+# -----------------------
+# Semantic Answer Cache (see semantic_cache.py)
+# -----------------------
+# Reuse an answer for a paraphrased question when the query embeddings are
+# close AND retrieval returned (nearly) the same chunks
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_PATH = DATA_DIR / "semantic_cache.sqlite3"
+SEMANTIC_CACHE_AUDIT_LOG = DATA_DIR / "semantic_cache_hits.jsonl"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))   # cosine
+SEMANTIC_CACHE_MIN_OVERLAP = float(os.getenv("SEMANTIC_CACHE_MIN_OVERLAP", "1.0"))  # Jaccard of chunk ids
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+# -----------------------
+# Extractive Fast Path (see extractive.py)
+# -----------------------
+# Answer factual lookups (dates, weightings, contacts) by quoting a line of
+# a top-ranked chunk when it covers most of the question's words; no LLM call
+EXTRACTIVE_ANSWERS = os.getenv("EXTRACTIVE_ANSWERS", "1") == "1"
+EXTRACTIVE_MIN_OVERLAP = float(os.getenv("EXTRACTIVE_MIN_OVERLAP", "0.6"))
+EXTRACTIVE_MAX_CONTEXTS = 2
+# Look questions up in the table facts (facts.py) before retrieval
+FACTS_ENABLED = os.getenv("FACTS_ENABLED", "1") == "1"
+
+# Concurrent identical requests share one upstream generation (coalescing.py)
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "1") == "1"
+
+# -----------------------
+# Admission Control (see admission.py)
+# -----------------------
+# Concurrent upstream generations per worker; extra requests queue fairly
+# per session and get 429 + Retry-After once the queue is full or times out
 MAX_ACTIVE_GENERATIONS = int(os.getenv("MAX_ACTIVE_GENERATIONS", "1"))
+MAX_QUEUED_GENERATIONS = int(os.getenv("MAX_QUEUED_GENERATIONS", "32"))
+MAX_QUEUED_PER_SESSION = int(os.getenv("MAX_QUEUED_PER_SESSION", "2"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "20"))
 
 # -----------------------
 # Conversation Memory Configuration
@@ -86,3 +250,34 @@ MAX_CONVERSATION_HISTORY = int(os.getenv("MAX_CONVERSATION_HISTORY", "10"))
 
 # Enable conversation memory for context-aware responses
 ENABLE_CONVERSATION_MEMORY = os.getenv("ENABLE_CONVERSATION_MEMORY", "1") == "1"
+
+# Bounds on the per-worker session store (memory.py): sessions idle for
+# MEMORY_SESSION_TTL_SECONDS expire, and the least recently used are evicted
+# beyond MEMORY_MAX_SESSIONS sessions or MEMORY_MAX_MB of messages
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "10000"))
+MEMORY_MAX_MB = int(os.getenv("MEMORY_MAX_MB", "64"))
+MEMORY_SESSION_TTL_SECONDS = float(os.getenv("MEMORY_SESSION_TTL_SECONDS", str(2 * 3600)))
+MEMORY_SWEEP_INTERVAL_SECONDS = float(os.getenv("MEMORY_SWEEP_INTERVAL_SECONDS", "60"))
+# Where sessions live (session_store.py): "local" keeps them in each worker
+# process; "sqlite" shares them between all workers on the machine through
+# SESSION_STORE_PATH (WAL), so a conversation survives hopping workers.
+# Appends are written in batches of SESSION_STORE_BATCH_SIZE or after
+# SESSION_STORE_FLUSH_SECONDS, whichever comes first.
+SESSION_STORE = os.getenv("SESSION_STORE", "local").lower()
+SESSION_STORE_PATH = DATA_DIR / "sessions.sqlite3"
+SESSION_STORE_BATCH_SIZE = int(os.getenv("SESSION_STORE_BATCH_SIZE", "32"))
+SESSION_STORE_FLUSH_SECONDS = float(os.getenv("SESSION_STORE_FLUSH_SECONDS", "0.05"))
+SESSION_STORE_CACHE_SESSIONS = int(os.getenv("SESSION_STORE_CACHE_SESSIONS", "1024"))
+
+# Rolling conversation summaries (summarizer.py). Once a session has
+# SUMMARY_EVERY_TURNS turns beyond the last SUMMARY_RECENT_TURNS that are
+# not summarized yet, they are folded into the summary by an LLM call after
+# the response has been sent. Prompts then carry the summary (at most
+# SUMMARY_MAX_TOKENS) plus the unsummarized turns, so their size stays flat
+# however long the session runs. RECENT + EVERY turns, plus one more so a
+# deferred or failed update can be retried, must fit in
+# MAX_CONVERSATION_HISTORY messages; EVERY is lowered otherwise.
+CONVERSATION_SUMMARY = os.getenv("CONVERSATION_SUMMARY", "1") == "1"
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", "3"))
+SUMMARY_RECENT_TURNS = int(os.getenv("SUMMARY_RECENT_TURNS", "2"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
@@ -0,0 +1,174 @@
+"""
+Context Packer
+==============
+Turns ranked retrieval results into the context actually sent to the LLM.
+
+- Chunks from the same file whose stored offsets overlap or touch are merged
+  back into one passage, so CHUNK_OVERLAP text is not sent twice.
+- Passages with identical text (e.g. the same handbook in two places) are
+  sent once.
+- Passages are chosen by relevance per token until the token budget is full,
+  and anything that has to be shortened is cut on a sentence boundary.
+"""
+
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+from chunker import split_sentences
+
+# Rough characters-per-token ratio for English prose with GPT-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Smallest remaining budget worth filling with a shortened passage
+MIN_PARTIAL_TOKENS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def truncate_at_sentence(text: str, max_chars: int) -> str:
+    """
+    Shorten text to at most max_chars, ending on a sentence boundary.
+    Falls back to a word boundary if even the first sentence is too long.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    cut = 0
+    for _, end in split_sentences(text):
+        if end > max_chars:
+            break
+        cut = end
+    if cut:
+        return text[:cut]
+
+    head = text[:max_chars]
+    space = head.rfind(" ")
+    return (head[:space] if space > 0 else head).rstrip() + " ..."
+
+
+def _source_key(meta: Dict) -> Optional[str]:
+    return meta.get("path") or meta.get("file")
+
+
+def merge_adjacent(results: List[Dict]) -> List[Dict]:
+    """
+    Merge results from the same file whose [start, end) offsets overlap or
+    are separated only by the paragraph break.
+
+    Merged passages keep the highest-ranked member's metadata, list their
+    member chunk ids, and score the sum of member scores. "members" maps each
+    member chunk id to the offset of its text within the passage.
+    """
+    passages: List[Dict] = []
+    by_source: Dict[str, List[Dict]] = {}
+
+    for r in results:
+        meta = r.get("meta") or {}
+        key = _source_key(meta)
+        if key is None or "start" not in meta or "end" not in meta:
+            passages.append({**r, "chunk_ids": [r["id"]], "members": [(r["id"], 0)]})
+            continue
+        by_source.setdefault(key, []).append(r)
+
+    for members in by_source.values():
+        members.sort(key=lambda r: r["meta"]["start"])
+        current = None
+        for r in members:
+            start, end = r["meta"]["start"], r["meta"]["end"]
+            # "\n\n" joins paragraphs in the offset space (see chunker.py)
+            if current is not None and start <= current["end"] + 2:
+                if end > current["end"]:
+                    if start >= current["end"]:
+                        current["doc"] += "\n\n"[: start - current["end"]] + r["doc"]
+                    else:
+                        current["doc"] += r["doc"][current["end"] - start:]
+                    current["end"] = end
+                current["score"] += max(r.get("score", 0.0), 0.0)
+                current["chunk_ids"].append(r["id"])
+                current["members"].append((r["id"], start - current["start"]))
+                current["chunks"].append(r["meta"].get("chunk"))
+                if r.get("score", 0.0) > current["best"]:
+                    current["best"] = r.get("score", 0.0)
+                    current["meta"] = dict(r["meta"])
+                continue
+
+            if current is not None:
+                passages.append(current)
+            current = {
+                **r,
+                "meta": dict(r["meta"]),
+                "score": max(r.get("score", 0.0), 0.0),
+                "best": r.get("score", 0.0),
+                "start": start,
+                "end": end,
+                "chunk_ids": [r["id"]],
+                "members": [(r["id"], 0)],
+                "chunks": [r["meta"].get("chunk")],
+            }
+        if current is not None:
+            passages.append(current)
+
+    for p in passages:
+        chunks = [c for c in p.pop("chunks", []) if c is not None]
+        if len(chunks) > 1:
+            p["meta"]["chunk"] = f"{min(chunks)}-{max(chunks)}"
+        p.pop("best", None)
+        p.pop("start", None)
+        p.pop("end", None)
+    return passages
+
+
+def pack_contexts(
+    results: List[Dict],
+    token_budget: int,
+    compress: Optional[Callable[[Dict], Dict]] = None,
+) -> List[Dict]:
+    """
+    Pack ranked results into at most token_budget tokens of context.
+
+    Args:
+        results: Retrieval results with "id", "doc", "meta" and "score"
+        token_budget: Maximum estimated tokens of context text
+        compress: Optional per-passage compression applied after merging
+
+    Returns:
+        Packed passages, most relevant first, each marked "packed": True
+    """
+    passages = merge_adjacent(results)
+    if compress is not None:
+        passages = [compress(p) for p in passages]
+
+    # Drop passages whose text we are already sending
+    seen, unique = set(), []
+    for p in passages:
+        digest = hashlib.sha1(p["doc"].strip().encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        unique.append(p)
+
+    for p in unique:
+        p["tokens"] = estimate_tokens(p["doc"])
+        p["density"] = p.get("score", 0.0) / p["tokens"]
+
+    # Fill the budget by relevance per token
+    chosen, remaining = [], token_budget
+    for p in sorted(unique, key=lambda x: x["density"], reverse=True):
+        if p["tokens"] <= remaining:
+            chosen.append(p)
+            remaining -= p["tokens"]
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            shortened = truncate_at_sentence(p["doc"], remaining * CHARS_PER_TOKEN)
+            tokens = estimate_tokens(shortened)
+            if tokens <= remaining:
+                chosen.append({**p, "doc": shortened, "tokens": tokens})
+                remaining -= tokens
+
+    chosen.sort(key=lambda x: x.get("score", 0.0), reverse=True)
+    for p in chosen:
+        p.pop("density", None)
+        p["packed"] = True
+    return chosen
@@ -0,0 +1,148 @@
+"""
+Load-Adaptive Degradation
+=========================
+Steps retrieval and generation settings down under load and back up when it
+passes, instead of letting requests time out.
+
+Service levels run from 0 (normal: the configured TOP_K, context budget and
+MAX_TOKENS) to 3 (critical: fewest chunks, shortest context, shortest
+answers, no query expansion). The controller looks at the admission queue
+depth and recent time-to-first-token percentiles, moves at most one level
+per evaluation, and waits DEGRADE_DWELL_SECONDS between moves so it does not
+flap.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from admission import get_admission_controller
+from metrics import Metrics, get_metrics
+import config
+
+
+@dataclass(frozen=True)
+class ServiceLevel:
+    """Retrieval/generation settings for one degradation step."""
+    level: int
+    name: str
+    top_k: int
+    context_token_budget: int
+    max_tokens: int
+    expand_queries: bool
+    fast_mode: bool
+
+
+def build_levels() -> List[ServiceLevel]:
+    """Derive the degradation ladder from the configured baseline."""
+    def scaled(value: int, factor: float, floor: int) -> int:
+        return max(floor, int(value * factor))
+
+    ladder = [
+        # name,      chunk factor, context factor, output factor, expand
+        ("normal",   1.0,          1.0,            1.0,           True),
+        ("busy",     0.67,         0.75,           0.8,           True),
+        ("degraded", 0.5,          0.5,            0.6,           False),
+        ("critical", 0.34,         0.33,           0.5,           False),
+    ]
+    return [
+        ServiceLevel(
+            level=i,
+            name=name,
+            top_k=scaled(config.TOP_K, chunks, 2),
+            context_token_budget=scaled(config.CONTEXT_TOKEN_BUDGET, context, 300),
+            max_tokens=scaled(config.MAX_TOKENS, output, 150),
+            expand_queries=expand,
+            fast_mode=config.FAST_MODE or i > 0,
+        )
+        for i, (name, chunks, context, output, expand) in enumerate(ladder)
+    ]
+
+
+LEVELS = build_levels()
+
+
+def default_level() -> ServiceLevel:
+    """Baseline settings, used when adaptive degradation is disabled."""
+    return LEVELS[0]
+
+
+class DegradationController:
+    """Chooses the current service level from queue depth and latency."""
+
+    def __init__(
+        self,
+        queue_depth: Callable[[], int],
+        metrics: Optional[Metrics] = None,
+        levels: Optional[List[ServiceLevel]] = None,
+    ):
+        self.queue_depth = queue_depth
+        self.metrics = metrics or get_metrics()
+        self.levels = levels or LEVELS
+        self.index = 0
+        self.last_change = 0.0
+        self.last_eval = 0.0
+
+    def _overloaded(self, depth: int, ttft_p95: Optional[float]) -> bool:
+        if depth >= config.DEGRADE_QUEUE_DEPTH:
+            return True
+        return ttft_p95 is not None and ttft_p95 > config.DEGRADE_TTFT_P95_SECONDS
+
+    def _relaxed(self, depth: int, ttft_p95: Optional[float]) -> bool:
+        if depth > config.DEGRADE_QUEUE_DEPTH * config.DEGRADE_RECOVER_FRACTION:
+            return False
+        # No recent traffic counts as relaxed
+        return ttft_p95 is None or ttft_p95 < config.DEGRADE_TTFT_P95_SECONDS * config.DEGRADE_RECOVER_FRACTION
+
+    def evaluate(self) -> ServiceLevel:
+        """Re-assess load and move at most one level up or down."""
+        now = time.monotonic()
+        self.last_eval = now
+        depth = self.queue_depth()
+        ttft_p95 = self.metrics.percentile("ttft_seconds", 95, since_seconds=config.DEGRADE_WINDOW_SECONDS)
+
+        if now - self.last_change >= config.DEGRADE_DWELL_SECONDS:
+            previous = self.index
+            if self._overloaded(depth, ttft_p95) and self.index < len(self.levels) - 1:
+                self.index += 1
+            elif self._relaxed(depth, ttft_p95) and self.index > 0:
+                self.index -= 1
+            if self.index != previous:
+                self.last_change = now
+                self.metrics.incr("service_level_changes")
+                print(
+                    f"[INFO] Service level {self.levels[previous].name} -> {self.levels[self.index].name} "
+                    f"(queue={depth}, ttft_p95={ttft_p95})"
+                )
+
+        self.metrics.set_gauge("service_level", self.index)
+        return self.levels[self.index]
+
+    def current(self) -> ServiceLevel:
+        """Current service level, re-evaluated at most once per second."""
+        if time.monotonic() - self.last_eval >= 1.0:
+            return self.evaluate()
+        return self.levels[self.index]
+
+    def stats(self) -> Dict:
+        level = self.levels[self.index]
+        return {"level": level.level, "name": level.name}
+
+
+# Global degradation controller (one per worker process)
+_controller: Optional[DegradationController] = None
+
+
+def get_degradation_controller() -> DegradationController:
+    """Get the global degradation controller, created on first use."""
+    global _controller
+    if _controller is None:
+        _controller = DegradationController(queue_depth=lambda: get_admission_controller().waiting)
+    return _controller
+
+
+def get_service_level() -> ServiceLevel:
+    """Service level to use for a new request."""
+    if not config.ADAPTIVE_DEGRADATION:
+        return default_level()
+    return get_degradation_controller().current()
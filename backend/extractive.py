@@ -0,0 +1,183 @@
+"""
+Extractive Fast Path
+====================
+Answers factual handbook lookups (dates, weightings, contact details, office
+hours, word counts) straight from a retrieved chunk, without an LLM call.
+
+- The question must ask for one of the ANSWER_TYPES, and the answer span
+  must contain a value of that type (an email address, a date, a
+  percentage, ...).
+- Only single lines/sentences from the top EXTRACTIVE_MAX_CONTEXTS contexts
+  are candidates. A candidate must cover at least EXTRACTIVE_MIN_OVERLAP of
+  the question's content words.
+- Numbers and identifiers in the question ("coursework 2", "part b") must
+  appear in the span together with the word they qualify; otherwise the
+  span may be about a sibling item and the question goes to the LLM.
+- If two different spans score about the same, the question is ambiguous
+  and goes to the LLM instead.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+
+from chunker import split_sentences
+from persona import citation_marker
+import config
+
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*"
+_DAY = r"(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+
+# answer type: (question pattern, answer value pattern)
+ANSWER_TYPES: Dict[str, Tuple[Pattern, Pattern]] = {
+    "contact": (
+        re.compile(r"\b(e-?mail|contact|get in touch)\b"),
+        re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"),
+    ),
+    "office_hours": (
+        re.compile(r"\b(office|consultation|drop-in) hours?\b"),
+        re.compile(rf"\b{_DAY}\b.*\d|\d{{1,2}}(?::\d{{2}})?\s*(?:am|pm)\b"),
+    ),
+    "date": (
+        re.compile(r"\b(when|deadline|due|dates?|hand[- ]in)\b"),
+        re.compile(
+            rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH}\b|\b{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?\b"
+            r"|\b\d{1,2}/\d{1,2}/\d{2,4}\b"
+        ),
+    ),
+    "weighting": (
+        re.compile(r"\b(weight\w*|worth|percent\w*|pass mark)\b|%"),
+        re.compile(r"\b\d{1,3}\s?%"),
+    ),
+    "word_count": (
+        re.compile(r"\b(how many words|word (count|limit)|how long)\b"),
+        re.compile(r"\b\d[\d,]*\s*(?:-\s*\d[\d,]*\s*)?words\b"),
+    ),
+}
+
+STOPWORDS: Set[str] = set(
+    "a an and are as at be by can do does for from have how i if in is it me my of on or "
+    "please the there this to was what when where which who will with you your".split()
+)
+
+# Longest span quoted as an answer; anything longer needs explaining
+MAX_SPAN_CHARS = 300
+
+# Scores closer than this with different spans count as a tie
+AMBIGUITY_MARGIN = 0.1
+
+FOLLOW_UP = "Ask me for more detail if you would like a fuller explanation."
+
+
+@dataclass
+class ExtractiveAnswer:
+    """A span quoted from one retrieved context."""
+    span: str
+    answer_type: str
+    context_index: int  # 1-based, matches the citation marker
+    source: str
+    score: float
+
+    @property
+    def marker(self) -> str:
+        return citation_marker(self.context_index)
+
+    @property
+    def text(self) -> str:
+        return f"{self.span} [{self.marker}]\n\n{FOLLOW_UP}"
+
+    def as_dict(self) -> Dict:
+        return {
+            "answer_type": self.answer_type,
+            "marker": self.marker,
+            "source": self.source,
+            "score": round(self.score, 3),
+        }
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _is_identifier(token: str) -> bool:
+    # "2", "cw2", "b" (as in "part b"); "a" and "i" are stopwords
+    return (len(token) == 1 or any(ch.isdigit() for ch in token)) and token not in STOPWORDS
+
+
+def _terms(text: str) -> Set[str]:
+    return {t for t in _tokens(text) if (len(t) > 1 or _is_identifier(t)) and t not in STOPWORDS}
+
+
+def _identifiers(question: str) -> List[Tuple[str, ...]]:
+    """Identifier tokens of question, each with the content word before it."""
+    tokens = _tokens(question)
+    phrases = []
+    for i, token in enumerate(tokens):
+        if not _is_identifier(token):
+            continue
+        before = tokens[i - 1] if i else None
+        if before is not None and before not in STOPWORDS and not _is_identifier(before):
+            phrases.append((before, token))
+        else:
+            phrases.append((token,))
+    return phrases
+
+
+def _mentions(tokens: List[str], phrase: Tuple[str, ...]) -> bool:
+    n = len(phrase)
+    return any(tuple(tokens[i:i + n]) == phrase for i in range(len(tokens) - n + 1))
+
+
+def _spans(doc: str) -> List[str]:
+    """Lines, split further into sentences (handbook chunks are line-oriented)."""
+    spans = []
+    for line in doc.splitlines():
+        line = line.strip()
+        spans.extend(line[start:end].strip() for start, end in split_sentences(line))
+    return [s for s in spans if s and len(s) <= MAX_SPAN_CHARS]
+
+
+def find_extractive_answer(question: str, contexts: List[Dict]) -> Optional[ExtractiveAnswer]:
+    """
+    Best high-confidence extractive answer to question, if there is one.
+
+    Args:
+        question: Student's question
+        contexts: Contexts in prompt order (index i gets citation marker i+1)
+
+    Returns:
+        The answer, or None when the question needs the LLM
+    """
+    q_lower = question.lower()
+    answer_types = [name for name, (asks, _) in ANSWER_TYPES.items() if asks.search(q_lower)]
+    q_terms = _terms(question)
+    if not answer_types or len(q_terms) < 2:
+        return None
+    identifiers = _identifiers(question)
+
+    candidates: List[ExtractiveAnswer] = []
+    for i, c in enumerate(contexts[:config.EXTRACTIVE_MAX_CONTEXTS], start=1):
+        meta = c.get("meta") or {}
+        for span in _spans(c["doc"]):
+            span_lower = span.lower()
+            kind = next((t for t in answer_types if ANSWER_TYPES[t][1].search(span_lower)), None)
+            if kind is None:
+                continue
+            span_tokens = _tokens(span)
+            if not all(_mentions(span_tokens, phrase) for phrase in identifiers):
+                continue
+            matched = q_terms & _terms(span)
+            score = len(matched) / len(q_terms)
+            if len(matched) >= 2 and score >= config.EXTRACTIVE_MIN_OVERLAP:
+                candidates.append(ExtractiveAnswer(span, kind, i, meta.get("file", "Unknown"), score))
+
+    if not candidates:
+        return None
+    candidates.sort(key=lambda a: a.score, reverse=True)
+    best = candidates[0]
+    for other in candidates[1:]:
+        if best.score - other.score >= AMBIGUITY_MARGIN:
+            break
+        if other.span != best.span:
+            return None
+    return best
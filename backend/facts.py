@@ -0,0 +1,296 @@
+"""
+Structured Facts
+================
+Facts extracted at ingest time from handbook tables (assessment schedules,
+weightings, lecture dates), so the commonest lookups are answered from a
+hash table instead of retrieval + generation.
+
+- Each table row becomes (entity, attribute, value, source) facts: the first
+  column names the entity and the header row names the attributes.
+  Two-column tables are read as attribute/value pairs of the section they
+  appear in.
+- Facts are stored per module in SQLite (FACTS_PATH). They are loaded into
+  in-memory dicts keyed by normalised entity name on first use, and again
+  whenever ingest bumps the index version.
+- A lookup hashes the question's word n-grams against the entity keys and
+  picks the attribute from the question's wording, so its cost does not
+  grow with the number of facts.
+- Only lookup-shaped questions (extractive.ANSWER_TYPES question patterns,
+  or a what/which/when question) about exactly one entity, with a question
+  word in ATTRIBUTE_HINTS, are answered; anything else, comparisons
+  included, goes to retrieval and the LLM.
+"""
+
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from extractive import ANSWER_TYPES
+from response_cache import current_index_version
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    module     TEXT NOT NULL,
+    entity     TEXT NOT NULL,
+    attribute  TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    source     TEXT NOT NULL,
+    entity_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS facts_module ON facts(module);
+"""
+
+# Question word -> fragments of the attribute names it asks about
+ATTRIBUTE_HINTS: Dict[str, Tuple[str, ...]] = {
+    "when": ("date", "commencing"),
+    "date": ("date",),
+    "due": ("hand", "deadline"),
+    "deadline": ("hand", "deadline"),
+    "submit": ("hand", "submission"),
+    "submission": ("hand", "submission"),
+    "week": ("week",),
+    "weight": ("weight",),
+    "weighting": ("weight",),
+    "weighted": ("weight",),
+    "worth": ("weight",),
+    "percent": ("weight",),
+    "percentage": ("weight",),
+    "anonymous": ("anon",),
+    "anonymously": ("anon",),
+    "topic": ("topic",),
+    "about": ("title", "topic"),
+    "title": ("title",),
+    "called": ("title",),
+}
+
+# Questions that ask for a value rather than advice or an explanation
+LOOKUP_QUESTION = re.compile(r"^\s*(what|what's|which|when)\b")
+
+# Questions about more than one thing, e.g. "compared to the exam"
+COMPARISON = re.compile(r"\b(compar\w*|versus|vs|differen\w*|than|both|each|all)\b")
+
+# Cell values that mean "nothing here"
+EMPTY_VALUES = {"", "n/a", "na", "-", "tbc", "none"}
+
+
+def normalize(text: str) -> str:
+    """Lower-cased words separated by single spaces (the lookup key form)."""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def clean_cell(text: str) -> str:
+    """Cell text on one line, non-breaking spaces and runs of whitespace collapsed."""
+    return " ".join(text.replace("\xa0", " ").split())
+
+
+@dataclass
+class Fact:
+    """One (entity, attribute, value) triple and where it came from."""
+    entity: str
+    attribute: str
+    value: str
+    source: str
+
+    @property
+    def entity_key(self) -> str:
+        return normalize(self.entity)
+
+    @property
+    def attribute_key(self) -> str:
+        return normalize(self.attribute)
+
+
+def extract_table_facts(rows: Sequence[Sequence[str]], source: str, section: str = "") -> List[Fact]:
+    """
+    Normalise one table into facts.
+
+    Args:
+        rows: Cell texts, row by row (merged cells repeated, as python-docx gives them)
+        source: Citation label, e.g. "Handbook.docx (table 3)"
+        section: Text preceding the table, the entity of two-column tables
+
+    Returns:
+        Facts in table order
+    """
+    rows = [[clean_cell(c) for c in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return []
+
+    facts: List[Fact] = []
+    if max(len(row) for row in rows) < 3:
+        entity = section or source
+        for row in rows:
+            if len(row) == 2 and row[0] and row[1].lower() not in EMPTY_VALUES:
+                facts.append(Fact(entity, row[0].rstrip(":"), row[1], source))
+        return facts
+
+    header, body = rows[0], rows[1:]
+    for row in body:
+        key = row[0]
+        if not key:
+            continue
+        # "1" under a "Lecture" column is "Lecture 1"
+        entity = f"{header[0]} {key}" if key.isdigit() and header[0] else key
+        seen = set()
+        for attribute, value in zip(header[1:], row[1:]):
+            if not attribute or value.lower() in EMPTY_VALUES or (attribute, value) in seen:
+                continue
+            seen.add((attribute, value))
+            facts.append(Fact(entity, attribute, value, source))
+    return facts
+
+
+def read_docx_tables(path: Path) -> List[Tuple[str, List[List[str]]]]:
+    """(section, rows) for each table of a DOCX, section = last short paragraph before it."""
+    from docx import Document  # ingest-only dependency
+    from docx.table import Table
+
+    tables = []
+    section = ""
+    for block in Document(path).iter_inner_content():
+        if isinstance(block, Table):
+            tables.append((section, [[cell.text for cell in row.cells] for row in block.rows]))
+        elif block.text.strip() and len(block.text) <= 80:
+            section = clean_cell(block.text)
+    return tables
+
+
+def extract_docx_facts(path: Path) -> List[Fact]:
+    """All table facts of a DOCX file."""
+    facts = []
+    for n, (section, rows) in enumerate(read_docx_tables(path), start=1):
+        facts.extend(extract_table_facts(rows, f"{path.name} (table {n})", section))
+    return facts
+
+
+class FactStore:
+    """SQLite-backed facts, served from per-module in-memory hash maps."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, List[Fact]]] = {}
+        self._max_words = 0
+        self._version: Optional[str] = None
+
+    # -----------------------
+    # Writes (ingest)
+    # -----------------------
+    def replace_module(self, module_id: str, facts: Sequence[Fact]):
+        """Replace every fact of a module."""
+        rows = [(module_id, f.entity, f.attribute, f.value, f.source, f.entity_key) for f in facts]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM facts WHERE module = ?", (module_id,))
+            self._conn.executemany(
+                "INSERT INTO facts (module, entity, attribute, value, source, entity_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    # -----------------------
+    # Reads (backend)
+    # -----------------------
+    def _entities(self, module_id: str) -> Dict[str, List[Fact]]:
+        version = current_index_version()
+        with self._lock:
+            if version != self._version:
+                index: Dict[str, Dict[str, List[Fact]]] = defaultdict(lambda: defaultdict(list))
+                rows = self._conn.execute(
+                    "SELECT module, entity, attribute, value, source, entity_key FROM facts"
+                ).fetchall()
+                for module, entity, attribute, value, source, entity_key in rows:
+                    index[module][entity_key].append(Fact(entity, attribute, value, source))
+                self._index = {m: dict(entities) for m, entities in index.items()}
+                self._max_words = max((len(k.split()) for e in self._index.values() for k in e), default=0)
+                self._version = version
+            return self._index.get(module_id, {})
+
+    def lookup(self, question: str, module_id: str) -> List[Fact]:
+        """
+        Facts that answer question, or [] if none do unambiguously.
+
+        The question must be a lookup (see is_lookup_question) and name
+        exactly one entity: entity names found inside a longer one don't
+        count, any other second entity makes it ambiguous. Its attributes
+        must match a question word's ATTRIBUTE_HINTS; words shared with the
+        attribute name only break ties. All facts must share one source.
+        """
+        if not is_lookup_question(question):
+            return []
+        entities = self._entities(module_id)
+        if not entities:
+            return []
+        words = normalize(question).split()
+
+        # Entity names at any length, minus those inside a longer match
+        spans: List[Tuple[int, int, str]] = []
+        for n in range(min(self._max_words, len(words)), 0, -1):
+            for i in range(len(words) - n + 1):
+                key = " ".join(words[i:i + n])
+                if key in entities and not any(s <= i and i + n <= e for s, e, _ in spans):
+                    spans.append((i, i + n, key))
+        found = {key for _, _, key in spans}
+        if len(found) != 1:
+            return []
+
+        asked = set(words)
+        hints = {h for w in asked for h in ATTRIBUTE_HINTS.get(w, ())}
+        if not hints:
+            return []
+        scored = []
+        for fact in entities[found.pop()]:
+            hinted = sum(1 for h in hints if h in fact.attribute_key)
+            if hinted:
+                shared = len(asked & set(fact.attribute_key.split()))
+                scored.append((2 * hinted + shared, fact))
+        if not scored:
+            return []
+        best = max(score for score, _ in scored)
+        facts = [fact for score, fact in scored if score == best]
+        return facts if len({f.source for f in facts}) == 1 else []
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "modules": len(self._index),
+                "entities": sum(len(e) for e in self._index.values()),
+                "facts": sum(len(f) for e in self._index.values() for f in e.values()),
+            }
+
+
+def is_lookup_question(question: str) -> bool:
+    """Whether question asks for one value (a date, weighting, ...) and is not a comparison."""
+    q_lower = question.lower()
+    if COMPARISON.search(q_lower):
+        return False
+    return bool(LOOKUP_QUESTION.search(q_lower)) or any(
+        asks.search(q_lower) for asks, _ in ANSWER_TYPES.values()
+    )
+
+
+def format_facts(facts: Sequence[Fact]) -> str:
+    """Facts as answer text: one line, or a bullet per fact."""
+    if len(facts) == 1:
+        f = facts[0]
+        return f"{f.entity} – {f.attribute}: {f.value}"
+    return "\n".join(f"- {f.entity} – {f.attribute}: {f.value}" for f in facts)
+
+
+_store: Optional[FactStore] = None
+
+
+def get_fact_store() -> FactStore:
+    """Get the process-wide fact store at config.FACTS_PATH."""
+    global _store
+    if _store is None:
+        _store = FactStore(config.FACTS_PATH)
+    return _store
@@ -0,0 +1,105 @@
+"""
+Shared HTTP Clients
+===================
+Long-lived, connection-pooled clients for every upstream LLM call.
+
+Creating a client per request pays a TCP + TLS handshake (100-300 ms to
+OpenRouter) before every first token. Instead, one client per upstream is
+created lazily on first use, reused for the life of the process with
+keep-alive (and HTTP/2 when the h2 package is installed), and closed on
+application shutdown via aclose_all().
+"""
+
+from typing import Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_sync_clients: Dict[str, httpx.Client] = {}
+_sessions: Dict[str, requests.Session] = {}
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 if configured and the optional h2 dependency is present."""
+    if not config.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401  # type: ignore
+    except ImportError:
+        return False
+    return True
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(connect=15.0, read=120.0, write=30.0, pool=config.HTTP_POOL_TIMEOUT)
+
+
+# -----------------------
+# httpx (backend /chat proxy, OpenAI SDK transport)
+# -----------------------
+def get_async_client(upstream: str = "openrouter") -> httpx.AsyncClient:
+    """Pooled async client for an upstream, created on first use."""
+    client = _async_clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=_http2_enabled(), limits=_limits(), timeout=_timeout())
+        _async_clients[upstream] = client
+    return client
+
+
+def get_sync_client(upstream: str = "openrouter") -> httpx.Client:
+    """Pooled sync httpx client for an upstream, created on first use."""
+    client = _sync_clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.Client(http2=_http2_enabled(), limits=_limits(), timeout=_timeout())
+        _sync_clients[upstream] = client
+    return client
+
+
+# -----------------------
+# requests (models.py, Ollama blocking calls)
+# -----------------------
+def get_session(upstream: str = "openrouter") -> requests.Session:
+    """Pooled requests session for an upstream, created on first use."""
+    session = _sessions.get(upstream)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config.HTTP_MAX_KEEPALIVE,
+            pool_block=False,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[upstream] = session
+    return session
+
+
+# -----------------------
+# Shutdown
+# -----------------------
+async def aclose_all():
+    """Close every pooled client; call once on application shutdown."""
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+
+    for client in list(_sync_clients.values()):
+        client.close()
+    _sync_clients.clear()
+
+    for session in list(_sessions.values()):
+        session.close()
+    _sessions.clear()
+
@@ -1,6 +1,7 @@
 # backend/ingest.py
 import os
 import hashlib
+from collections import defaultdict
 from pathlib import Path
 
 from chromadb import Client
@@ -9,10 +10,17 @@ from sentence_transformers import SentenceTransformer
 
 from bs4 import BeautifulSoup
 from docx import Document
+from docx.table import Table
 from pptx import Presentation
 from pypdf import PdfReader
 
-from chunker import split_text
+from chunker import split_sentences, split_text_spans
+from chunk_store import get_chunk_store
+from facts import clean_cell, extract_docx_facts, get_fact_store
+from intent_classifier import IntentClassifier
+from module_index import collection_name_for, module_id_for, quant_dir_for
+from response_cache import bump_index_version
+from vector_index import QuantizedIndex, QUANTIZATION_MODES
 import config
 
 # Supported file types to ingest
@@ -22,8 +30,18 @@ SUPPORTED = {".pdf", ".txt", ".md", ".docx", ".pptx", ".html", ".htm"}
 def read_text(path: Path) -> str:
     ext = path.suffix.lower()
     if ext == ".docx":
-        doc = Document(path)
-        return "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+        # Paragraphs and table rows in document order; a row becomes
+        # "cell | cell | ..." so schedules and weightings are retrievable too
+        lines = []
+        for block in Document(path).iter_inner_content():
+            if isinstance(block, Table):
+                for row in block.rows:
+                    cells = list(dict.fromkeys(clean_cell(c.text) for c in row.cells))
+                    if any(cells):
+                        lines.append(" | ".join(cells))
+            elif block.text.strip():
+                lines.append(block.text)
+        return "\n".join(lines)
 
     if ext == ".pptx":
         texts = []
@@ -55,6 +73,22 @@ def doc_id_for(path: Path) -> str:
     return hashlib.sha256(str(path).encode()).hexdigest()[:16]
 
 
+def store_sentence_vectors(chunk_store, embedder, ids, docs):
+    """Embed every sentence of every chunk once, for query-focused compression."""
+    spans = [split_sentences(d) for d in docs]
+    sentences = [d[s:e] for d, chunk_spans in zip(docs, spans) for s, e in chunk_spans]
+    if not sentences:
+        return
+    print(f"Embedding {len(sentences)} sentences for context compression...")
+    vecs = embedder.encode(sentences, normalize_embeddings=True, show_progress_bar=True)
+
+    per_chunk, pos = [], 0
+    for chunk_spans in spans:
+        per_chunk.append(vecs[pos:pos + len(chunk_spans)])
+        pos += len(chunk_spans)
+    chunk_store.put_sentence_vectors(ids, spans, per_chunk)
+
+
 def main():
     # Ensure persistence dir exists
     os.makedirs(config.DATA_DIR, exist_ok=True)
@@ -67,38 +101,75 @@ def main():
             is_persistent=True,
         )
     )
-    collection = client.get_or_create_collection("edumate")
 
     # Use the same embedding model here and in retrieval.py
     embedder = SentenceTransformer(config.EMBEDDING_MODEL)
 
-    # Gather files
-    files = []
+    # Gather files, grouped by module (first-level corpus subdirectory)
+    files_by_module = defaultdict(list)
     for p in Path(config.CORPUS_DIR).glob("**/*"):
         if p.is_file() and p.suffix.lower() in SUPPORTED:
-            files.append(p)
-
-    print(f"Found {len(files)} files in corpus")
-    ids, docs, metas = [], [], []
-
-    for fp in files:
-        text = read_text(fp)
-        if not text or not text.strip():
+            files_by_module[module_id_for(p)].append(p)
+
+    chunk_store = get_chunk_store()
+    fact_store = get_fact_store()
+    print(f"Found {sum(len(v) for v in files_by_module.values())} files in {len(files_by_module)} module(s)")
+    ingested = 0
+
+    for module_id, files in sorted(files_by_module.items()):
+        ids, docs, metas = [], [], []
+        facts = []
+
+        for fp in files:
+            if fp.suffix.lower() == ".docx":
+                facts.extend(extract_docx_facts(fp))
+
+            text = read_text(fp)
+            if not text or not text.strip():
+                continue
+
+            # Offsets let the context packer merge overlapping neighbours
+            chunks = split_text_spans(text, config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+            for i, (start, end, ch) in enumerate(chunks):
+                ids.append(f"{doc_id_for(fp)}-{i}")
+                docs.append(ch)
+                metas.append({
+                    "file": fp.name, "path": str(fp), "chunk": i, "module": module_id,
+                    "start": start, "end": end,
+                })
+
+        fact_store.replace_module(module_id, facts)
+        if facts:
+            print(f"[{module_id}] Stored {len(facts)} table facts")
+
+        if not ids:
             continue
 
-        chunks = split_text(text, config.CHUNK_SIZE, config.CHUNK_OVERLAP)
-        for i, ch in enumerate(chunks):
-            ids.append(f"{doc_id_for(fp)}-{i}")
-            docs.append(ch)
-            metas.append({"file": fp.name, "path": str(fp), "chunk": i})
-
-    if not ids:
+        collection = client.get_or_create_collection(collection_name_for(module_id))
+        print(f"[{module_id}] Upserting {len(ids)} chunks into '{collection.name}'...")
+        embs = embedder.encode(docs, show_progress_bar=True)
+        collection.upsert(ids=ids, documents=docs, embeddings=embs.tolist(), metadatas=metas)
+        # Compressed text by id, so retrieval can rank without pulling documents
+        chunk_store.put_many(module_id, ids, docs, metas)
+        if config.CONTEXT_COMPRESSION:
+            store_sentence_vectors(chunk_store, embedder, ids, docs)
+        ingested += len(ids)
+
+        # Optional compact index searched by retrieval.py instead of Chroma's HNSW
+        if config.EMBEDDING_QUANTIZATION in QUANTIZATION_MODES:
+            index = QuantizedIndex.build(quant_dir_for(module_id), ids, embs, config.EMBEDDING_QUANTIZATION)
+            print(f"[{module_id}] Built {index.mode} index: {len(index)} vectors, {index.nbytes / 1024:.1f} KiB resident")
+
+    if not ingested:
         print("No content found. Place files in ./corpus and rerun.")
         return
 
-    print(f"Upserting {len(ids)} chunks...")
-    embs = embedder.encode(docs, show_progress_bar=True).tolist()
-    collection.upsert(ids=ids, documents=docs, embeddings=embs, metadatas=metas)
+    # Intent centroids for the same embedding model, so the backend needn't build them
+    IntentClassifier.build(embedder).save(config.INTENT_CENTROIDS_PATH)
+    print(f"Saved intent centroids to {config.INTENT_CENTROIDS_PATH}")
+
+    # Invalidates cached answers built on the previous index
+    bump_index_version()
 
     # No client.persist() on chromadb 0.5.x — persisted automatically
     print("Ingestion complete. (Chroma at:", config.DATA_DIR, ")")
@@ -0,0 +1,202 @@
+"""
+Embedding Intent Classifier
+===========================
+Routes a question to an InteractionIntent by comparing the query embedding,
+already computed for retrieval, with one centroid vector per intent. No
+extra model call per request.
+
+- Centroids are the normalised mean embeddings of INTENT_EXAMPLES, built
+  with the retrieval embedder. ingest.py writes them to
+  INTENT_CENTROIDS_PATH. If the file is missing or was built with another
+  EMBEDDING_MODEL, they are built once on first use from the Retriever's
+  embedder and saved.
+- Classification is one small matrix-vector product. If the best intent is
+  less similar than INTENT_MIN_SIMILARITY, or leads the runner-up by less
+  than INTENT_MIN_MARGIN, the keyword rules in persona.detect_intent decide
+  instead.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import get_metrics
+from persona import InteractionIntent, detect_intent
+import config
+
+# A few typical student questions per intent; edit and re-ingest to retrain
+INTENT_EXAMPLES: Dict[InteractionIntent, Sequence[str]] = {
+    InteractionIntent.ASSIGNMENT_HELP: (
+        "How should I structure my essay for the coursework?",
+        "What does the marking rubric expect for the report?",
+        "When is the assignment deadline and how do I submit it?",
+        "Can you check whether my introduction answers the brief?",
+        "How many words should the project report be?",
+        "What counts as a good critical analysis in this assignment?",
+        "Could you give me feedback on my draft?",
+        "Do I need to include a reference list in my submission?",
+    ),
+    InteractionIntent.CONCEPT_CLARIFICATION: (
+        "What is the difference between validity and reliability?",
+        "Can you explain this theory in simpler terms?",
+        "I don't understand what the lecture meant by this term.",
+        "How does this model work in practice?",
+        "Why does the author argue that?",
+        "What is meant by critical realism?",
+        "Could you give me an example of this concept?",
+        "Define the key principle from week three.",
+    ),
+    InteractionIntent.EXAM_PREPARATION: (
+        "How should I revise for the final exam?",
+        "What topics will come up in the test?",
+        "Are there past papers I can practise with?",
+        "How is the exam structured and how long is it?",
+        "What should I focus on when preparing for the quiz?",
+        "Can you give me some practice questions for revision?",
+        "How much of the module does the exam cover?",
+        "What is the best way to memorise the formulas before the exam?",
+    ),
+    InteractionIntent.STUDY_PLANNING: (
+        "How can I organise my week to keep up with the reading?",
+        "Can you help me make a study timetable?",
+        "I keep falling behind, how do I manage my time better?",
+        "What is a good routine for studying alongside a part-time job?",
+        "How many hours a week should I spend on this module?",
+        "How do I plan my reading before each seminar?",
+        "What study techniques work best for this kind of module?",
+        "How should I split my time between the modules this term?",
+    ),
+    InteractionIntent.PROGRESS_FEEDBACK: (
+        "How am I doing in this module so far?",
+        "I'm struggling with the statistics part, what should I do?",
+        "I'm stuck on the second task and losing confidence.",
+        "My last mark was lower than I hoped, how can I do better?",
+        "Am I on track to pass?",
+        "I feel lost in the seminars, is that normal?",
+        "What were the main weaknesses in my last piece of work?",
+        "I got a low grade, can you help me understand why?",
+    ),
+    InteractionIntent.GENERAL_QUERY: (
+        "Hello!",
+        "Thanks, that helps.",
+        "Who is the module convenor?",
+        "Where are the lectures held?",
+        "What are your office hours?",
+        "Is there a reading list for this module?",
+        "How do I contact the teaching team?",
+        "Where can I find the lecture slides?",
+    ),
+}
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IntentClassifier:
+    """Nearest intent centroid by cosine similarity."""
+
+    def __init__(self, model: str, centroids: Dict[InteractionIntent, np.ndarray]):
+        self.model = model
+        self.intents: List[InteractionIntent] = list(centroids)
+        self.matrix = _normalize_rows(np.stack([centroids[i] for i in self.intents]).astype(np.float32))
+
+    @classmethod
+    def build(cls, embedder, model: str = config.EMBEDDING_MODEL) -> "IntentClassifier":
+        """Centroids of INTENT_EXAMPLES embedded with embedder (one batch)."""
+        intents = list(INTENT_EXAMPLES)
+        texts = [text for intent in intents for text in INTENT_EXAMPLES[intent]]
+        vectors = _normalize_rows(np.asarray(embedder.encode(texts), dtype=np.float32))
+        centroids, start = {}, 0
+        for intent in intents:
+            end = start + len(INTENT_EXAMPLES[intent])
+            centroids[intent] = vectors[start:end].mean(axis=0)
+            start = end
+        return cls(model, centroids)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IntentClassifier"]:
+        """Centroids saved by save(), or None if there are none."""
+        try:
+            data = json.loads(Path(path).read_text())
+            centroids = {InteractionIntent(k): np.asarray(v, dtype=np.float32) for k, v in data["centroids"].items()}
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            print(f"[WARNING] Ignoring unreadable intent centroids at {path}: {e}")
+            return None
+        return cls(data.get("model", ""), centroids)
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        centroids = {i.value: [round(float(x), 6) for x in row] for i, row in zip(self.intents, self.matrix)}
+        path.write_text(json.dumps({"model": self.model, "centroids": centroids}))
+
+    def scores(self, embedding: Sequence[float]) -> List[Tuple[InteractionIntent, float]]:
+        """(intent, cosine similarity), best first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != self.matrix.shape[1]:
+            return []
+        sims = self.matrix @ (query / norm)
+        return sorted(zip(self.intents, sims.tolist()), key=lambda s: s[1], reverse=True)
+
+    def classify(self, embedding: Sequence[float]) -> Optional[InteractionIntent]:
+        """Best intent, or None when the embedding does not single one out."""
+        ranked = self.scores(embedding)
+        if len(ranked) < 2:
+            return None
+        (best, top), (_, runner_up) = ranked[0], ranked[1]
+        if top < config.INTENT_MIN_SIMILARITY or top - runner_up < config.INTENT_MIN_MARGIN:
+            return None
+        return best
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(embedder=None) -> Optional[IntentClassifier]:
+    """
+    The process-wide classifier: saved centroids for the current
+    EMBEDDING_MODEL, else built once from embedder (None if there is none).
+    """
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                classifier = IntentClassifier.load(config.INTENT_CENTROIDS_PATH)
+                if (classifier is None or classifier.model != config.EMBEDDING_MODEL) and embedder is not None:
+                    classifier = IntentClassifier.build(embedder)
+                    try:
+                        classifier.save(config.INTENT_CENTROIDS_PATH)
+                    except OSError as e:
+                        print(f"[WARNING] Could not save intent centroids: {e}")
+                if classifier is not None and classifier.model == config.EMBEDDING_MODEL:
+                    _classifier = classifier
+    return _classifier
+
+
+def classify_intent(question: str, embedding: Optional[Sequence[float]], embedder=None) -> InteractionIntent:
+    """
+    Intent from the query embedding, falling back to the keyword rules.
+
+    Args:
+        question: Student's question
+        embedding: Its retrieval embedding (None/empty = keywords only)
+        embedder: Builds the centroids if none are saved for EMBEDDING_MODEL
+    """
+    if config.INTENT_CLASSIFIER and embedding is not None and len(embedding):
+        classifier = get_intent_classifier(embedder)
+        intent = classifier.classify(embedding) if classifier is not None else None
+        if intent is not None:
+            get_metrics().incr("intent_embedding")
+            return intent
+    get_metrics().incr("intent_keywords")
+    return detect_intent(question)
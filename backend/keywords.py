@@ -0,0 +1,102 @@
+"""
+Keyword Matching
+================
+Every keyword table (the intents of persona.detect_intent and the
+conversation patterns of memory.detect_patterns) compiled into one regex,
+so a text is scanned once however many categories and keywords there are.
+
+- Keywords match whole words from their start, with an optional inflection
+  ending ("assignment" matches "assignments" but "test" does not match
+  "contest").
+- A match reports every category of the keyword, and of the shorter
+  keywords inside it ("feedback on my" is also "feedback"), so overlapping
+  keywords of different categories are all found.
+- The matcher is built once per process; keyword_hits() is the hot path.
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Sequence
+
+# Category -> keywords. Intent categories are InteractionIntent values.
+INTENT_KEYWORDS: Dict[str, Sequence[str]] = {
+    "assignment_help": (
+        "assignment", "homework", "coursework", "task", "project",
+        "deadline", "submit", "submission", "rubric", "criteria",
+        "grade", "grading", "marking", "feedback on my", "review my",
+    ),
+    "concept_clarification": (
+        "what is", "explain", "clarify", "understand", "confused",
+        "how does", "why does", "difference between", "mean by",
+        "define", "definition", "concept", "theory", "principle",
+    ),
+    "exam_preparation": (
+        "exam", "test", "assessment", "quiz", "revision",
+        "prepare for", "study for", "practice", "review for",
+    ),
+    "study_planning": (
+        "study plan", "schedule", "organize", "time management",
+        "how to study", "learning strategy", "study tips", "improve",
+    ),
+    "progress_feedback": (
+        "how am i doing", "my progress", "feedback", "struggling with",
+        "difficulty with", "help me with", "stuck on",
+    ),
+}
+
+PATTERN_KEYWORDS: Dict[str, Sequence[str]] = {
+    "assignment_related": ("assignment", "homework", "deadline", "submit", "rubric"),
+    "needs_clarification": ("confused", "don't understand", "unclear", "explain again"),
+}
+
+# Endings a keyword may carry and still match
+INFLECTIONS = r"(?:s|es|d|ed|ing|ted|ting)?"
+
+NO_HITS: FrozenSet[str] = frozenset()
+
+
+class KeywordMatcher:
+    """All categories' keywords in one compiled pattern."""
+
+    def __init__(self, tables: Iterable[Mapping[str, Sequence[str]]]):
+        categories: Dict[str, set] = {}
+        for table in tables:
+            for category, words in table.items():
+                for word in words:
+                    categories.setdefault(word.lower(), set()).add(category)
+
+        # A keyword also stands for every keyword found inside it
+        words = sorted(categories, key=len, reverse=True)
+        self._categories: Dict[str, FrozenSet[str]] = {}
+        for word in words:
+            hits = set(categories[word])
+            for inner in words:
+                if len(inner) < len(word) and re.search(rf"\b{re.escape(inner)}{INFLECTIONS}\b", word):
+                    hits |= categories[inner]
+            self._categories[word] = frozenset(hits)
+
+        # Zero-width lookahead: one match attempt per word start, longest keyword first
+        alternation = "|".join(re.escape(w) for w in words)
+        self._pattern = re.compile(rf"\b(?=({alternation}){INFLECTIONS}\b)")
+
+    def hits(self, text: str) -> FrozenSet[str]:
+        """Every category with a keyword in text."""
+        found = NO_HITS
+        for match in self._pattern.finditer(text.lower()):
+            found = found | self._categories[match.group(1)]
+        return found
+
+
+_matcher: Optional[KeywordMatcher] = None
+
+
+def get_matcher() -> KeywordMatcher:
+    """Get the global matcher over INTENT_KEYWORDS and PATTERN_KEYWORDS."""
+    global _matcher
+    if _matcher is None:
+        _matcher = KeywordMatcher([INTENT_KEYWORDS, PATTERN_KEYWORDS])
+    return _matcher
+
+
+def keyword_hits(text: str) -> FrozenSet[str]:
+    """Every keyword category (intent value or pattern name) found in text."""
+    return get_matcher().hits(text)
@@ -1,7 +1,12 @@
 """
 Minimal FastAPI backend for EduMate.
 - GET /health: Health check
-- POST /chat: Streams LLM responses from OpenRouter (SSE)
+- GET /metrics: Queue depth, wait times and latency percentiles (JSON)
+- POST /rag: Grounded answers (retrieval + memory + persona prompt) as SSE,
+  with a "sources" event first and a "timings" event last
+- POST /chat: Streams LLM responses (SSE) via the provider router
+  (OpenRouter first, failover and hedging across configured upstreams); the
+  upstream request is cancelled if the client disconnects
 - Secrets:
     * Prefers OPENROUTER_API_KEY from environment (Fly secrets)
     * Falls back to Google Secret Manager if configured (optional)
@@ -9,13 +14,31 @@ Minimal FastAPI backend for EduMate.
 
 import os
 import json
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import httpx
+from starlette.background import BackgroundTask
+
+from admission import AdmissionRejected, get_admission_controller
+from coalescing import get_singleflight
+from degradation import get_degradation_controller, get_service_level
+from facts import get_fact_store
+from http_clients import aclose_all
+from memory import get_memory
+from metrics import get_metrics
+from module_index import UnknownModuleError
+from provider_router import AllUpstreamsFailed, UpstreamError, get_provider_router
+from rag import prepare_answer, stream_answer
+from response_cache import cache_key, delta_chunk, get_response_cache, replay_sse
+from semantic_cache import get_semantic_cache
+from sse import guard_stream
+import config
 
 # --- Optional Google Secret Manager imports ---
 try:
@@ -26,10 +49,7 @@ except Exception:  # pragma: no cover
     service_account = None
 
 # --- Config ---
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
-DEFAULT_FRONTEND_URL = "https://edumate.streamlit.app"
 PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
-API_TIMEOUT = httpx.Timeout(connect=15.0, read=120.0, write=30.0, pool=None)
 
 # Cache for the API key after first successful load
 OPENROUTER_API_KEY: Optional[str] = None
@@ -77,6 +97,7 @@ def get_openrouter_key() -> str:
 
             resp = client.access_secret_version(request={"name": name})
             OPENROUTER_API_KEY = resp.payload.data.decode("UTF-8")
+            config.OPENROUTER_API_KEY = OPENROUTER_API_KEY  # read by provider_router.py
             return OPENROUTER_API_KEY
         except Exception as e:  # do not log sensitive details
             print(f"[WARNING] GCP Secret Manager lookup failed: {type(e).__name__}")
@@ -84,11 +105,39 @@ def get_openrouter_key() -> str:
     raise RuntimeError("OPENROUTER_API_KEY not configured. Set Fly secret or GCP Secret Manager.")
 
 
+# --- Process start/stop (also called by app/main.py, which mounts this app:
+# Starlette does not run the lifespan of mounted sub-apps) ---
+async def startup():
+    """Open the caches and start background maintenance for this worker."""
+    # Opening the caches scans their tables (dropping entries from older
+    # index versions, loading embeddings), so do it once here, off the
+    # event loop, rather than on the first /chat or /rag request
+    await asyncio.to_thread(get_response_cache)
+    await asyncio.to_thread(get_semantic_cache)
+    if config.ENABLE_CONVERSATION_MEMORY:
+        get_memory().start_sweeper(config.MEMORY_SWEEP_INTERVAL_SECONDS)
+
+
+async def shutdown():
+    """Stop background work, write out buffered state and close pooled clients."""
+    get_memory().stop_sweeper()
+    # Upstream clients are pooled for the life of the process (http_clients.py)
+    await aclose_all()
+
+
 # --- FastAPI app ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    yield
+    await shutdown()
+
+
 app = FastAPI(
     title="EduMate API",
     version="1.0.0",
     description="Backend API that streams chat completions via OpenRouter",
+    lifespan=lifespan,
 )
 
 # CORS: keep permissive for initial setup; restrict in production
@@ -106,6 +155,26 @@ class ChatRequest(BaseModel):
     model: str = "openrouter/openai/gpt-4o-mini"
     messages: List[Dict[str, Any]]
     temperature: float = 0.2
+    session_id: Optional[str] = None  # fair queuing (and memory) per student
+
+
+class RagRequest(BaseModel):
+    question: str
+    model: Optional[str] = None  # None = primary configured upstream
+    temperature: float = config.TEMPERATURE
+    module_id: Optional[str] = None
+    session_id: Optional[str] = None
+    detail: bool = False  # always generate; skip the extractive fast path
+
+
+def _join_flight(http_request: Request, flight, sse_headers: Dict[str, str]) -> StreamingResponse:
+    """Stream an in-flight generation (buffered prefix first) to another client."""
+    get_metrics().incr("coalesced_requests")
+    return StreamingResponse(
+        guard_stream(http_request, flight.subscribe()),
+        media_type="text/event-stream",
+        headers={**sse_headers, "X-EduMate-Coalesced": "joined"},
+    )
 
 
 # --- Health ---
@@ -114,71 +183,219 @@ def health():
     return {"ok": True}
 
 
+# --- Metrics ---
+@app.get("/metrics")
+def metrics():
+    snapshot = get_metrics().snapshot()
+    snapshot["admission"] = get_admission_controller().stats()
+    snapshot["service_level"] = get_degradation_controller().stats()
+    snapshot["coalescing"] = get_singleflight().stats()
+    snapshot["providers"] = get_provider_router().stats()
+    semantic = get_semantic_cache()
+    if semantic is not None:
+        snapshot["semantic_cache"] = semantic.stats()
+    cache = get_response_cache()
+    if cache is not None:
+        snapshot["response_cache"] = cache.stats()
+    if config.FACTS_ENABLED:
+        snapshot["facts"] = get_fact_store().stats()
+    if config.ENABLE_CONVERSATION_MEMORY:
+        snapshot["memory"] = get_memory().stats()
+    return snapshot
+
+
 # --- Chat (SSE streaming) ---
 @app.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     # Validate
     if not request.messages:
         raise HTTPException(status_code=400, detail="No messages provided")
 
     # Load key lazily (works even when app is mounted under /api)
     try:
-        api_key = get_openrouter_key()
+        get_openrouter_key()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        # OpenRouter recommends these (non-sensitive):
-        "HTTP-Referer": os.getenv("FRONTEND_ORIGIN", DEFAULT_FRONTEND_URL),
-        "X-Title": "EduMate",
-    }
+    # Under load, cap answer length (see degradation.py)
+    level = get_service_level()
+    max_tokens = level.max_tokens if level.level > 0 else None
 
-    payload = {
-        "model": request.model,
-        "messages": request.messages,
-        "temperature": request.temperature,
-        "stream": True,  # request SSE stream
+    sse_headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-EduMate-Service-Level": level.name,
     }
 
+    # Identical prompt already answered: replay it without an upstream call
+    cache = get_response_cache()
+    key = cache_key(request.model, request.temperature, max_tokens, request.messages)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            get_metrics().incr("response_cache_hits")
+            return StreamingResponse(
+                guard_stream(http_request, replay_sse(cached)),
+                media_type="text/event-stream",
+                headers={**sse_headers, "X-EduMate-Cache": "hit"},
+            )
+        get_metrics().incr("response_cache_misses")
+
+    # Same question already being generated: attach to it (needs no slot)
+    flights = get_singleflight()
+    flight = flights.join(key) if config.REQUEST_COALESCING else None
+    if flight is not None:
+        return _join_flight(http_request, flight, sse_headers)
+
+    # Wait for a generation slot (fair across sessions); 429 if the queue is full
+    admission = get_admission_controller()
+    try:
+        ticket = await admission.acquire(request.session_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({e.reason}), please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    # An identical request may have started while this one was queued
+    flight = flights.join(key) if config.REQUEST_COALESCING else None
+    if flight is not None:
+        ticket.release()
+        return _join_flight(http_request, flight, sse_headers)
+
     async def stream_tokens():
+        started = time.monotonic()
+        first_token = None
+        answer_parts: List[str] = []
         try:
-            async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
-                async with client.stream(
-                    "POST",
-                    OPENROUTER_API_URL,
-                    headers=headers,
-                    json=payload,
-                ) as response:
-                    if response.status_code != 200:
-                        # avoid leaking details; front-end can show a generic message
-                        print(f"[ERROR] OpenRouter error status={response.status_code}")
-                        yield f"data: {json.dumps({'error':'Upstream API error'})}\n\n"
-                        return
-
-                    async for line in response.aiter_lines():
-                        if not line:
-                            continue
-                        if line.startswith("data: "):
-                            data_str = line[6:].strip()
-                            if data_str == "[DONE]":
-                                yield "data: [DONE]\n\n"
-                                break
-                            # pass through the chunk as-is (client will parse it)
-                            yield f"data: {data_str}\n\n"
-
-        except httpx.TimeoutException:
-            print("[ERROR] OpenRouter API timeout")
-            yield f"data: {json.dumps({'error':'Request timeout'})}\n\n"
+            # Ordered upstreams with failover, circuit breakers and hedging
+            async for text in get_provider_router().stream(
+                request.messages,
+                model=request.model,
+                temperature=request.temperature,
+                max_tokens=max_tokens,
+            ):
+                if first_token is None:
+                    first_token = time.monotonic()
+                    get_metrics().observe("ttft_seconds", first_token - started)
+                answer_parts.append(text)
+                yield delta_chunk(text)
+
+            # Only complete answers are cached
+            if cache is not None and answer_parts:
+                await asyncio.to_thread(cache.put, key, "".join(answer_parts))
+            yield "data: [DONE]\n\n"
+
+        except AllUpstreamsFailed as e:
+            # avoid leaking details; front-end can show a generic message
+            print(f"[ERROR] No LLM upstream available: {e}")
+            yield f"data: {json.dumps({'error':'Upstream API error'})}\n\n"
+        except UpstreamError as e:
+            print(f"[ERROR] Upstream failed mid-stream: {e}")
+            yield f"data: {json.dumps({'error':'Streaming error'})}\n\n"
         except Exception as e:
             print(f"[ERROR] Streaming error: {type(e).__name__}")
             yield f"data: {json.dumps({'error':'Streaming error'})}\n\n"
+        finally:
+            get_metrics().observe("generation_seconds", time.monotonic() - started)
+            ticket.release()
+
+    if config.REQUEST_COALESCING:
+        # Generation runs in its own task; it is cancelled (and the slot
+        # freed) once the last client attached to it disconnects. The
+        # background task drops this client's reserved subscription if the
+        # stream never started.
+        flight = flights.start(key, stream_tokens(), on_close=ticket.release)
+
+        # Async so it runs on the event loop with the rest of the flight
+        async def cancel_reservation():
+            flight.cancel_reservation()
+
+        return StreamingResponse(
+            guard_stream(http_request, flight.subscribe(reserved=True)),
+            media_type="text/event-stream",
+            headers=sse_headers,
+            background=BackgroundTask(cancel_reservation),
+        )
+
+    # Async so Starlette runs it on the event loop, not in its threadpool:
+    # releasing hands the slot to queued waiters (asyncio futures)
+    async def release():
+        ticket.release()
+
+    # Cancels the upstream read as soon as the student disconnects; the
+    # background task frees the slot even if the stream never started
+    return StreamingResponse(
+        guard_stream(http_request, stream_tokens()),
+        media_type="text/event-stream",
+        headers=sse_headers,
+        background=BackgroundTask(release),
+    )
+
+
+# --- RAG chat (SSE streaming) ---
+@app.post("/rag")
+async def rag_chat(request: RagRequest, http_request: Request):
+    """
+    Grounded answer: retrieval + memory + prompt assembly, then streaming.
+    Emits a "sources" event before the first token and a "timings" event
+    after the answer (see rag.py).
+    """
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="No question provided")
+
+    try:
+        get_openrouter_key()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    level = get_service_level()
+    try:
+        prepared = await prepare_answer(
+            request.question, request.session_id, request.module_id, level,
+            model=request.model, detail=request.detail,
+        )
+    except UnknownModuleError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown module: {e.args[0]}")
+    except ImportError as e:
+        print(f"[ERROR] Retrieval unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Retrieval is not available on this server")
+
+    # Only generation needs a slot: fact, extractive and cached answers never queue
+    ticket = None
+    if prepared.cached_answer is None and prepared.extractive is None:
+        try:
+            ticket = await get_admission_controller().acquire(request.session_id)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many requests ({e.reason}), please retry shortly",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+    # Async so the background task frees the slot on the event loop
+    async def release():
+        if ticket is not None:
+            ticket.release()
+
+    async def events():
+        try:
+            async for event in stream_answer(prepared, request.model, request.temperature):
+                yield event
+        finally:
+            await release()
 
     return StreamingResponse(
-        stream_tokens(),
+        guard_stream(http_request, events()),
         media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-EduMate-Service-Level": level.name,
+            **({"X-EduMate-Cache": "semantic"} if prepared.cached_answer is not None else {}),
+        },
+        background=BackgroundTask(release),
     )
 
 
@@ -3,29 +3,72 @@ Conversation Memory Module
 ===========================
 Maintains short-term conversation context to enable personalized academic guidance.
 Stores anonymized conversation history for context-aware responses.
+
+Sessions live in a session store (session_store.py): in this process, or
+in a SQLite file shared by every worker so a conversation survives requests
+landing on different workers. The public methods return plain dicts with
+ISO timestamps whichever store is used.
 """
 
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import json
 
+from keywords import NO_HITS, keyword_hits
+from session_store import LocalSessionStore, Message, make_session_store
+import config
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def _as_dict(msg: Message) -> Dict:
+    return {
+        "role": msg.role,
+        "content": msg.content,
+        "timestamp": _iso(msg.timestamp),
+        "metadata": dict(msg.metadata),
+    }
+
 
 class ConversationMemory:
     """
     Manages conversation context and student interaction history.
     Provides context for tailored academic guidance.
+    
+    Sessions are bounded: a session idle for longer than idle_ttl_seconds
+    expires, and the least recently used sessions are evicted once there
+    are more than max_sessions or their messages exceed max_bytes. A
+    background sweeper (start_sweeper) removes expired sessions even if
+    nobody touches them again.
     """
     
-    def __init__(self, max_history: int = 10):
+    def __init__(
+        self,
+        max_history: int = 10,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl_seconds: float = 2 * 3600,
+        store=None
+    ):
         """
         Initialize conversation memory.
         
         Args:
             max_history: Maximum number of conversation turns to retain
+            max_sessions: Maximum number of sessions kept (LRU beyond that)
+            max_bytes: Approximate memory cap for all stored messages
+            idle_ttl_seconds: Sessions idle for longer than this expire
+            store: Session store to use (default: an in-process LocalSessionStore
+                with these limits)
         """
         self.max_history = max_history
-        self.conversations: Dict[str, List[Dict]] = {}
-        self.metadata: Dict[str, Dict] = {}
+        self.store = store or LocalSessionStore(max_history, max_sessions, max_bytes, idle_ttl_seconds)
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
     
     def add_message(self, session_id: str, role: str, content: str, metadata: Optional[Dict] = None):
         """
@@ -37,28 +80,9 @@ class ConversationMemory:
             content: Message content
             metadata: Optional metadata (sources, intent, etc.)
         """
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-            self.metadata[session_id] = {
-                "created_at": datetime.now().isoformat(),
-                "last_updated": datetime.now().isoformat(),
-                "interaction_count": 0
-            }
-        
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "metadata": metadata or {}
-        }
-        
-        self.conversations[session_id].append(message)
-        self.metadata[session_id]["last_updated"] = datetime.now().isoformat()
-        self.metadata[session_id]["interaction_count"] += 1
-        
-        # Trim history to max_history
-        if len(self.conversations[session_id]) > self.max_history:
-            self.conversations[session_id] = self.conversations[session_id][-self.max_history:]
+        # Keyword patterns are matched once here, not on every detect_patterns()
+        tags = keyword_hits(content) if role == "user" else NO_HITS
+        self.store.append(session_id, Message(role, content, time.time(), metadata, tags))
     
     def get_conversation(self, session_id: str) -> List[Dict]:
         """
@@ -66,11 +90,30 @@ class ConversationMemory:
         
         Args:
             session_id: Unique session identifier
-            
+        
         Returns:
             List of conversation messages
         """
-        return self.conversations.get(session_id, [])
+        return [_as_dict(msg) for msg in self._recent(session_id)]
+    
+    def get_session_metadata(self, session_id: str) -> Dict:
+        """
+        Session bookkeeping: created_at, last_updated (ISO) and interaction_count.
+        
+        Args:
+            session_id: Unique session identifier
+        
+        Returns:
+            Metadata dict, empty if the session does not exist
+        """
+        info = self.store.info(session_id)
+        if info is None:
+            return {}
+        return {
+            "created_at": _iso(info["created_at"]),
+            "last_updated": _iso(info["last_updated"]),
+            "interaction_count": info["interaction_count"],
+        }
     
     def get_recent_context(self, session_id: str, num_messages: int = 4) -> str:
         """
@@ -79,34 +122,83 @@ class ConversationMemory:
         Args:
             session_id: Unique session identifier
             num_messages: Number of recent messages to include
-            
+        
         Returns:
             Formatted conversation context
         """
-        history = self.conversations.get(session_id, [])
-        if not history:
+        summary, _, unsummarized = self.store.summarized(session_id)
+        recent = unsummarized[-num_messages:] if summary else self._recent(session_id, num_messages)
+        if not recent and not summary:
             return ""
         
-        recent = history[-num_messages:]
-        context_lines = []
+        context_lines = [f"Earlier: {summary}"] if summary else []
         
         for msg in recent:
-            role = "Student" if msg["role"] == "user" else "You"
-            context_lines.append(f"{role}: {msg['content'][:200]}")
+            role = "Student" if msg.role == "user" else "You"
+            context_lines.append(f"{role}: {msg.content[:200]}")
         
         return "\n".join(context_lines)
     
+    def get_recent_messages(
+        self,
+        session_id: str,
+        num_messages: int = 4,
+        max_chars: Optional[int] = 200
+    ) -> List[Dict]:
+        """
+        Get recent conversation turns as chat messages.
+        
+        Args:
+            session_id: Unique session identifier
+            num_messages: Number of recent messages to include
+            max_chars: Truncate each message to this length (None = full text,
+                e.g. when prompt_budget.py decides how much history fits)
+        
+        Returns:
+            List of {"role", "content"} messages, oldest first
+        """
+        return [
+            {"role": msg.role, "content": msg.content[:max_chars]}
+            for msg in self._recent(session_id, num_messages)
+        ]
+    
+    def get_summarized_history(self, session_id: str) -> Tuple[str, int, List[Dict]]:
+        """
+        The session's rolling summary and the turns it does not cover yet.
+        
+        Args:
+            session_id: Unique session identifier
+        
+        Returns:
+            (summary, number of the last message it covers, later messages as
+            {"role", "content"} oldest first); the summary is "" until
+            summarizer.py writes one
+        """
+        summary, base, messages = self.store.summarized(session_id)
+        return summary, base, [{"role": msg.role, "content": msg.content} for msg in messages]
+    
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        """
+        Replace the session's rolling summary, unless it already covers as much.
+        
+        Args:
+            session_id: Unique session identifier
+            summary: New summary text
+            covered: Number of the last message folded into it
+        """
+        self.store.set_summary(session_id, summary, covered)
+    
     def detect_patterns(self, session_id: str) -> Dict[str, any]:
         """
         Analyze conversation patterns to identify student needs.
         
         Args:
             session_id: Unique session identifier
-            
+        
         Returns:
             Dictionary of detected patterns and insights
         """
-        history = self.conversations.get(session_id, [])
+        history = self._recent(session_id)
         if not history:
             return {}
         
@@ -118,32 +210,79 @@ class ConversationMemory:
             "assignment_related": False
         }
         
-        # Analyze recent messages
+        # Analyze recent messages (tags from keywords.PATTERN_KEYWORDS, set by add_message)
         for msg in history[-5:]:
-            if msg["role"] == "user":
-                content_lower = msg["content"].lower()
+            if msg.role == "user":
                 patterns["questions_asked"] += 1
                 
                 # Detect assignment-related queries
-                if any(keyword in content_lower for keyword in ["assignment", "homework", "deadline", "submit", "rubric"]):
+                if "assignment_related" in msg.tags:
                     patterns["assignment_related"] = True
                 
                 # Detect confusion/clarification needs
-                if any(keyword in content_lower for keyword in ["confused", "don't understand", "unclear", "explain again"]):
+                if "needs_clarification" in msg.tags:
                     patterns["needs_clarification"] = True
         
         return patterns
     
     def clear_session(self, session_id: str):
         """Clear conversation history for a session."""
-        if session_id in self.conversations:
-            del self.conversations[session_id]
-        if session_id in self.metadata:
-            del self.metadata[session_id]
+        self.store.clear(session_id)
+    
+    # -----------------------
+    # Bounds and eviction
+    # -----------------------
+    def sweep(self) -> int:
+        """
+        Remove every session idle for longer than idle_ttl_seconds (and, for
+        a shared store, the least recently used beyond the limits).
+        
+        Returns:
+            Number of sessions removed
+        """
+        return self.store.sweep()
+    
+    def start_sweeper(self, interval_seconds: float = 60.0):
+        """Sweep expired sessions every interval_seconds in a daemon thread."""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"[WARNING] Session sweep failed: {e}")
+        
+        self._sweeper = threading.Thread(target=run, name="memory-sweeper", daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self):
+        """Stop the background sweeper, if running, and write out buffered messages."""
+        self._stop.set()
+        self.store.close()
+    
+    def stats(self) -> Dict:
+        """Store backend, session count, stored bytes and eviction counters."""
+        return self.store.stats()
+    
+    def _recent(self, session_id: str, num_messages: Optional[int] = None) -> List[Message]:
+        """The session's last num_messages messages (all if None), oldest first."""
+        messages = self.store.messages(session_id)
+        return messages if num_messages is None else messages[-num_messages:]
 
 
 # Global memory instance
-_memory = ConversationMemory(max_history=10)
+_memory = ConversationMemory(
+    max_history=config.MAX_CONVERSATION_HISTORY,
+    store=make_session_store(
+        max_history=config.MAX_CONVERSATION_HISTORY,
+        max_sessions=config.MEMORY_MAX_SESSIONS,
+        max_bytes=config.MEMORY_MAX_MB * 1024 * 1024,
+        idle_ttl_seconds=config.MEMORY_SESSION_TTL_SECONDS
+    )
+)
 
 
 def get_memory() -> ConversationMemory:
@@ -0,0 +1,95 @@
+"""
+Metrics
+=======
+Minimal in-process metrics registry: counters, gauges and sliding windows of
+recent observations (for latency percentiles). Exposed as JSON by the
+backend's /metrics endpoint.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Observations kept per window for percentile estimates
+WINDOW_SIZE = 512
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0-100) of values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Metrics:
+    """Thread-safe counters, gauges and latency windows."""
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.window_size = window_size
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._windows: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None:
+                window = self._windows[name] = deque(maxlen=self.window_size)
+            window.append((time.monotonic(), value))
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> float:
+        with self._lock:
+            return self._gauges.get(name, 0)
+
+    def values(self, name: str, since_seconds: Optional[float] = None) -> List[float]:
+        """Recent observations of a window, optionally only the last since_seconds."""
+        cutoff = time.monotonic() - since_seconds if since_seconds is not None else None
+        with self._lock:
+            return [v for t, v in self._windows.get(name, ()) if cutoff is None or t >= cutoff]
+
+    def percentile(self, name: str, p: float, since_seconds: Optional[float] = None) -> Optional[float]:
+        """Percentile of the recent observations of a window."""
+        return percentile(self.values(name, since_seconds), p)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """All metrics, with p50/p95/p99 summaries for each window."""
+        with self._lock:
+            windows = {name: [v for _, v in obs] for name, obs in self._windows.items()}
+            snap = {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+        snap["latencies"] = {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for name, values in windows.items()
+        }
+        return snap
+
+
+# Global metrics instance
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get the global metrics registry."""
+    return _metrics
@@ -5,6 +5,7 @@ import requests
 from typing import Iterator, List, Dict, Optional
 
 import config
+from http_clients import get_session
 
 # ============================================================================
 # OpenRouter API Integration (Cloud LLM - Zero Local Setup)
@@ -44,7 +45,7 @@ def ollama_complete(messages: List[Dict]) -> str:
     url = f"{config.OPENROUTER_BASE_URL}/chat/completions"
     
     try:
-        resp = requests.post(
+        resp = get_session("openrouter").post(
             url,
             headers=_openrouter_headers(),
             json=_openrouter_chat_payload(messages, stream=False),
@@ -78,7 +79,7 @@ def ollama_complete_stream(messages: List[Dict]) -> Iterator[str]:
     url = f"{config.OPENROUTER_BASE_URL}/chat/completions"
     
     try:
-        with requests.post(
+        with get_session("openrouter").post(
             url,
             headers=_openrouter_headers(),
             json=_openrouter_chat_payload(messages, stream=True),
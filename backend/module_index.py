@@ -0,0 +1,171 @@
+"""
+Per-Module Indexes
+==================
+Each module's corpus lives in its own Chroma collection (and optional
+quantized index), derived from the first-level subdirectory of the corpus.
+Files placed directly in the corpus root belong to the default module.
+
+Indexes are opened lazily on first query and evicted least-recently-used once
+their estimated resident size exceeds the configured memory budget.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from vector_index import QuantizedIndex, QUANTIZATION_MODES
+import config
+
+
+class UnknownModuleError(KeyError):
+    """Raised when a request names a module that has no ingested index."""
+
+
+def normalize_module_id(module_id: Optional[str]) -> str:
+    """Map a user-supplied module id onto the canonical slug form."""
+    if not module_id:
+        return config.DEFAULT_MODULE
+    slug = re.sub(r"[^a-z0-9_-]+", "-", module_id.strip().lower()).strip("-_")
+    return slug or config.DEFAULT_MODULE
+
+
+def module_id_for(path: Path, corpus_dir: Path = config.CORPUS_DIR) -> str:
+    """Derive the module id of a corpus file from its first-level subdirectory."""
+    rel = Path(path).relative_to(corpus_dir)
+    if len(rel.parts) > 1:
+        return normalize_module_id(rel.parts[0])
+    return config.DEFAULT_MODULE
+
+
+def collection_name_for(module_id: str) -> str:
+    """Chroma collection name for a module (default module keeps the legacy name)."""
+    if module_id == config.DEFAULT_MODULE:
+        return "edumate"
+    name = f"edumate-{module_id}"
+    if len(name) <= 63:
+        return name
+    # Chroma names are limited to 63 characters; the hash keeps truncated ones apart
+    digest = hashlib.sha1(module_id.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:54].rstrip('-_')}-{digest}"
+
+
+def quant_dir_for(module_id: str) -> Path:
+    """Directory holding a module's quantized index."""
+    return config.QUANT_INDEX_DIR / module_id
+
+
+@dataclass
+class ModuleIndex:
+    """Handles for one opened module."""
+    module_id: str
+    collection: Any
+    qindex: Optional[QuantizedIndex]
+    nbytes: int
+
+
+class ModuleIndexCache:
+    """
+    Lazily opened, LRU-evicted set of module indexes.
+
+    Resident size is estimated per module (compact codes for quantized
+    indexes, float32 vectors for Chroma's own index) and modules are evicted
+    oldest-first until the total fits in memory_budget_bytes. The module just
+    requested is never evicted.
+    """
+
+    def __init__(self, client, embedding_dim: int, memory_budget_bytes: int):
+        self.client = client
+        self.embedding_dim = embedding_dim
+        self.memory_budget_bytes = memory_budget_bytes
+        self._open: "OrderedDict[str, ModuleIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per module being opened, so a cold module only blocks its own requests
+        self._loading: Dict[str, threading.Lock] = {}
+        self.evictions = 0
+
+    def _load(self, module_id: str) -> ModuleIndex:
+        try:
+            collection = self.client.get_collection(collection_name_for(module_id))
+        except Exception:
+            raise UnknownModuleError(module_id)
+
+        qindex = None
+        if config.EMBEDDING_QUANTIZATION in QUANTIZATION_MODES:
+            qindex = QuantizedIndex.load(quant_dir_for(module_id))
+            if qindex is None:
+                print(f"[WARNING] No quantized index for module '{module_id}'; using Chroma search")
+
+        if qindex is not None:
+            nbytes = qindex.nbytes
+        else:
+            nbytes = collection.count() * self.embedding_dim * 4
+
+        print(f"[INFO] Opened module index '{module_id}' (~{nbytes / 1024:.0f} KiB)")
+        return ModuleIndex(module_id=module_id, collection=collection, qindex=qindex, nbytes=nbytes)
+
+    def get(self, module_id: Optional[str] = None) -> ModuleIndex:
+        """
+        Return the index for a module, opening it on first use.
+
+        Args:
+            module_id: Module identifier (None selects the default module)
+
+        Returns:
+            The opened module index
+
+        Raises:
+            UnknownModuleError: If the module has not been ingested
+        """
+        module_id = normalize_module_id(module_id)
+        with self._lock:
+            entry = self._open.get(module_id)
+            if entry is not None:
+                self._open.move_to_end(module_id)
+                return entry
+            loading = self._loading.setdefault(module_id, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._open.get(module_id)
+                if entry is not None:
+                    # Opened by the request we waited for
+                    self._open.move_to_end(module_id)
+                    return entry
+            entry = None
+            try:
+                entry = self._load(module_id)
+            finally:
+                with self._lock:
+                    if entry is not None:
+                        self._open[module_id] = entry
+                        self._evict(keep=module_id)
+                    self._loading.pop(module_id, None)
+            return entry
+
+    def _evict(self, keep: str):
+        while self.resident_bytes > self.memory_budget_bytes and len(self._open) > 1:
+            oldest = next(iter(self._open))
+            if oldest == keep:
+                self._open.move_to_end(oldest)
+                continue
+            self._open.pop(oldest)
+            self.evictions += 1
+            print(f"[INFO] Evicted module index '{oldest}' (memory budget)")
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._open.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of open modules and eviction counters."""
+        with self._lock:
+            return {
+                "open_modules": list(self._open.keys()),
+                "resident_bytes": self.resident_bytes,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "evictions": self.evictions,
+            }
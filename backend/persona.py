@@ -5,9 +5,12 @@ Defines the AI Module Convenor Assistant persona and intelligent prompt template
 for different types of academic guidance and student interactions.
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
+from context_packer import truncate_at_sentence
+from keywords import keyword_hits
+
 
 class InteractionIntent(Enum):
     """Different types of student interaction intents"""
@@ -19,6 +22,16 @@ class InteractionIntent(Enum):
     STUDY_PLANNING = "study_planning"
 
 
+# Order in which keyword intents take precedence
+INTENT_PRIORITY = (
+    InteractionIntent.ASSIGNMENT_HELP,
+    InteractionIntent.EXAM_PREPARATION,
+    InteractionIntent.STUDY_PLANNING,
+    InteractionIntent.PROGRESS_FEEDBACK,
+    InteractionIntent.CONCEPT_CLARIFICATION,
+)
+
+
 def detect_intent(query: str, conversation_history: Optional[List[Dict]] = None) -> InteractionIntent:
     """
     Detect the student's interaction intent from their query.
@@ -30,53 +43,12 @@ def detect_intent(query: str, conversation_history: Optional[List[Dict]] = None)
     Returns:
         Detected interaction intent
     """
-    query_lower = query.lower()
-    
-    # Assignment-related keywords
-    assignment_keywords = [
-        "assignment", "homework", "coursework", "task", "project",
-        "deadline", "submit", "submission", "rubric", "criteria",
-        "grade", "grading", "marking", "feedback on my", "review my"
-    ]
-    
-    # Concept clarification keywords
-    concept_keywords = [
-        "what is", "explain", "clarify", "understand", "confused",
-        "how does", "why does", "difference between", "mean by",
-        "define", "definition", "concept", "theory", "principle"
-    ]
-    
-    # Exam preparation keywords
-    exam_keywords = [
-        "exam", "test", "assessment", "quiz", "revision",
-        "prepare for", "study for", "practice", "review for"
-    ]
-    
-    # Study planning keywords
-    planning_keywords = [
-        "study plan", "schedule", "organize", "time management",
-        "how to study", "learning strategy", "study tips", "improve"
-    ]
-    
-    # Progress/feedback keywords
-    progress_keywords = [
-        "how am i doing", "my progress", "feedback", "struggling with",
-        "difficulty with", "help me with", "stuck on"
-    ]
-    
-    # Check intent based on keywords
-    if any(keyword in query_lower for keyword in assignment_keywords):
-        return InteractionIntent.ASSIGNMENT_HELP
-    elif any(keyword in query_lower for keyword in exam_keywords):
-        return InteractionIntent.EXAM_PREPARATION
-    elif any(keyword in query_lower for keyword in planning_keywords):
-        return InteractionIntent.STUDY_PLANNING
-    elif any(keyword in query_lower for keyword in progress_keywords):
-        return InteractionIntent.PROGRESS_FEEDBACK
-    elif any(keyword in query_lower for keyword in concept_keywords):
-        return InteractionIntent.CONCEPT_CLARIFICATION
-    else:
-        return InteractionIntent.GENERAL_QUERY
+    hits = keyword_hits(query)
+    # First matching intent wins (keywords in keywords.INTENT_KEYWORDS)
+    for intent in INTENT_PRIORITY:
+        if intent.value in hits:
+            return intent
+    return InteractionIntent.GENERAL_QUERY
 
 
 class ModuleConvenorPersona:
@@ -102,6 +74,70 @@ class ModuleConvenorPersona:
         "Provide structured guidance with clear action steps."
     )
     
+    # Intent-specific guidance appended to the base persona
+    INTENT_GUIDANCE = {
+        InteractionIntent.ASSIGNMENT_HELP: (
+            "\n\nFor assignment help:\n"
+            "- First, understand what the student is struggling with\n"
+            "- Reference the assignment brief and rubric from the course materials\n"
+            "- Provide structured guidance (e.g., outline, approach, key points)\n"
+            "- Suggest what to focus on, but don't write the assignment for them\n"
+            "- Encourage critical thinking and independent work\n"
+            "- Remind them of deadlines and submission requirements if relevant"
+        ),
+        InteractionIntent.CONCEPT_CLARIFICATION: (
+            "\n\nFor concept clarification:\n"
+            "- Start with a clear, concise explanation using course terminology\n"
+            "- Use examples or analogies to illustrate the concept\n"
+            "- Connect the concept to other topics they've learned\n"
+            "- Check understanding by suggesting how they might apply this\n"
+            "- Point to relevant sections in the course materials for deeper study"
+        ),
+        InteractionIntent.EXAM_PREPARATION: (
+            "\n\nFor exam preparation:\n"
+            "- Identify key topics and learning objectives from the course\n"
+            "- Suggest focused study strategies for different topic areas\n"
+            "- Recommend practice activities and self-testing approaches\n"
+            "- Provide time management advice for exam preparation\n"
+            "- Build confidence while setting realistic expectations"
+        ),
+        InteractionIntent.STUDY_PLANNING: (
+            "\n\nFor study planning:\n"
+            "- Help create realistic, achievable study schedules\n"
+            "- Suggest evidence-based study techniques\n"
+            "- Prioritize topics based on course structure and deadlines\n"
+            "- Encourage regular review and active learning\n"
+            "- Provide motivational support and practical tips"
+        ),
+        InteractionIntent.PROGRESS_FEEDBACK: (
+            "\n\nFor progress feedback:\n"
+            "- Acknowledge their effort and any progress made\n"
+            "- Provide constructive, specific feedback\n"
+            "- Identify areas for improvement with actionable steps\n"
+            "- Encourage reflection on their learning process\n"
+            "- Suggest resources or strategies to address difficulties"
+        ),
+        InteractionIntent.GENERAL_QUERY: (
+            "\n\nFor general queries:\n"
+            "- Provide clear, accurate information from course materials\n"
+            "- Be concise but comprehensive\n"
+            "- Anticipate follow-up questions\n"
+            "- Encourage deeper engagement with the material"
+        ),
+    }
+
+    # Context handling note, keyed by whether course material was retrieved
+    CONTEXT_NOTES = {
+        True: (
+            "\n\nYou have access to relevant course materials (lectures, readings, assignment briefs). "
+            "Base your responses on this content and cite sources using the provided markers [①, ②, ...]."
+        ),
+        False: (
+            "\n\nNote: No specific course materials were found for this query. "
+            "Provide general academic guidance based on your educational expertise."
+        ),
+    }
+
     @staticmethod
     def get_system_prompt(
         intent: InteractionIntent,
@@ -119,74 +155,8 @@ class ModuleConvenorPersona:
         Returns:
             Tailored system prompt
         """
-        base = ModuleConvenorPersona.BASE_PERSONA
-        
-        if intent == InteractionIntent.ASSIGNMENT_HELP:
-            specific_guidance = (
-                "\n\nFor assignment help:\n"
-                "- First, understand what the student is struggling with\n"
-                "- Reference the assignment brief and rubric from the course materials\n"
-                "- Provide structured guidance (e.g., outline, approach, key points)\n"
-                "- Suggest what to focus on, but don't write the assignment for them\n"
-                "- Encourage critical thinking and independent work\n"
-                "- Remind them of deadlines and submission requirements if relevant"
-            )
-        elif intent == InteractionIntent.CONCEPT_CLARIFICATION:
-            specific_guidance = (
-                "\n\nFor concept clarification:\n"
-                "- Start with a clear, concise explanation using course terminology\n"
-                "- Use examples or analogies to illustrate the concept\n"
-                "- Connect the concept to other topics they've learned\n"
-                "- Check understanding by suggesting how they might apply this\n"
-                "- Point to relevant sections in the course materials for deeper study"
-            )
-        elif intent == InteractionIntent.EXAM_PREPARATION:
-            specific_guidance = (
-                "\n\nFor exam preparation:\n"
-                "- Identify key topics and learning objectives from the course\n"
-                "- Suggest focused study strategies for different topic areas\n"
-                "- Recommend practice activities and self-testing approaches\n"
-                "- Provide time management advice for exam preparation\n"
-                "- Build confidence while setting realistic expectations"
-            )
-        elif intent == InteractionIntent.STUDY_PLANNING:
-            specific_guidance = (
-                "\n\nFor study planning:\n"
-                "- Help create realistic, achievable study schedules\n"
-                "- Suggest evidence-based study techniques\n"
-                "- Prioritize topics based on course structure and deadlines\n"
-                "- Encourage regular review and active learning\n"
-                "- Provide motivational support and practical tips"
-            )
-        elif intent == InteractionIntent.PROGRESS_FEEDBACK:
-            specific_guidance = (
-                "\n\nFor progress feedback:\n"
-                "- Acknowledge their effort and any progress made\n"
-                "- Provide constructive, specific feedback\n"
-                "- Identify areas for improvement with actionable steps\n"
-                "- Encourage reflection on their learning process\n"
-                "- Suggest resources or strategies to address difficulties"
-            )
-        else:  # GENERAL_QUERY
-            specific_guidance = (
-                "\n\nFor general queries:\n"
-                "- Provide clear, accurate information from course materials\n"
-                "- Be concise but comprehensive\n"
-                "- Anticipate follow-up questions\n"
-                "- Encourage deeper engagement with the material"
-            )
-        
-        # Add context handling
-        if context_available:
-            context_note = (
-                "\n\nYou have access to relevant course materials (lectures, readings, assignment briefs). "
-                "Base your responses on this content and cite sources using the provided markers [①, ②, ...]."
-            )
-        else:
-            context_note = (
-                "\n\nNote: No specific course materials were found for this query. "
-                "Provide general academic guidance based on your educational expertise."
-            )
+        persona = ModuleConvenorPersona
+        base = persona.BASE_PERSONA + persona.INTENT_GUIDANCE[intent] + persona.CONTEXT_NOTES[context_available]
         
         # Add conversation context if available
         conversation_note = ""
@@ -196,7 +166,7 @@ class ModuleConvenorPersona:
                 "Use this context to provide continuity and personalized responses."
             )
         
-        return base + specific_guidance + context_note + conversation_note + "\n\n" + ModuleConvenorPersona.TONE_GUIDELINES
+        return base + conversation_note + "\n\n" + persona.TONE_GUIDELINES
     
     @staticmethod
     def format_academic_response(
@@ -246,6 +216,35 @@ class ModuleConvenorPersona:
         return formatted
 
 
+def citation_marker(index: int) -> str:
+    """Circled-number marker (①, ②, ...) for the 1-based context index."""
+    return chr(9311 + index)
+
+
+def _format_contexts(
+    contexts: List[Dict],
+    fast_mode: bool,
+    max_contexts: Optional[int] = None
+) -> Tuple[List[str], List[str]]:
+    """Marked context snippets ([①] ...) and their source labels."""
+    sources = []
+    ctx_text = []
+    
+    if max_contexts is None:
+        max_contexts = 3 if fast_mode else 4
+    max_snippet_len = 800 if fast_mode else 1200
+    
+    for i, c in enumerate(contexts[:max_contexts], start=1):
+        marker = citation_marker(i)
+        # Packed contexts are already sized to the token budget
+        snippet = c["doc"] if c.get("packed") else truncate_at_sentence(c["doc"], max_snippet_len)
+        ctx_text.append(f"[{marker}] {snippet}")
+        meta = c.get("meta") or {}
+        sources.append(f"{marker} {meta.get('file', 'Unknown')} (chunk {meta.get('chunk', 'N/A')})")
+    
+    return ctx_text, sources
+
+
 def compose_convenor_prompt(
     contexts: List[Dict],
     user_msg: str,
@@ -268,18 +267,7 @@ def compose_convenor_prompt(
     intent = detect_intent(user_msg)
     
     # Prepare context from documents
-    sources = []
-    ctx_text = []
-    
-    max_contexts = 3 if fast_mode else 4
-    max_snippet_len = 800 if fast_mode else 1200
-    
-    for i, c in enumerate(contexts[:max_contexts], start=1):
-        marker = chr(9311 + i)  # ①, ②, ...
-        snippet = c["doc"][:max_snippet_len]
-        ctx_text.append(f"[{marker}] {snippet}")
-        meta = c.get("meta") or {}
-        sources.append(f"{marker} {meta.get('file', 'Unknown')} (chunk {meta.get('chunk', 'N/A')})")
+    ctx_text, sources = _format_contexts(contexts, fast_mode)
     
     # Get appropriate system prompt
     system_prompt = ModuleConvenorPersona.get_system_prompt(
@@ -299,3 +287,68 @@ def compose_convenor_prompt(
     )
     
     return prompt, sources, intent
+
+
+# Byte-stable system prompts, built once per (intent, context available).
+# Nothing request-specific goes in here, so upstream prompt/prefix caches can
+# reuse the tokens across every student asking the same kind of question.
+SYSTEM_PREFIXES: Dict[Tuple[InteractionIntent, bool], str] = {
+    (intent, has_context): ModuleConvenorPersona.get_system_prompt(intent, context_available=has_context)
+    for intent in InteractionIntent
+    for has_context in (True, False)
+}
+
+
+def summary_message(summary: str) -> str:
+    """System message carrying the summary of the conversation so far."""
+    return f"Summary of your conversation with this student so far:\n{summary}"
+
+
+def compose_convenor_messages(
+    contexts: List[Dict],
+    user_msg: str,
+    history: Optional[List[Dict]] = None,
+    fast_mode: bool = False,
+    max_contexts: Optional[int] = None,
+    summary: str = "",
+    intent: Optional[InteractionIntent] = None
+) -> Tuple[List[Dict], List[str], InteractionIntent]:
+    """
+    Build the Module Convenor chat messages in cache-friendly order.
+    
+    Layout, from most to least shared: the precomputed system prompt for
+    the intent (identical across students), the session's rolling summary
+    and earlier turns (stable across that session's requests until the
+    summary is next updated), then one user message with this turn's course
+    materials and question.
+    
+    Args:
+        contexts: Retrieved document chunks
+        user_msg: Student's question
+        history: Earlier turns as {"role", "content"} messages, oldest first
+        fast_mode: Whether to use faster, more concise prompting
+        max_contexts: Snippets to include (None = 3 in fast mode, else 4);
+            prompt_budget.py passes the number that fit its token budget
+        summary: Rolling summary of the turns before history (summarizer.py)
+        intent: Already classified intent (None = detect from user_msg)
+        
+    Returns:
+        (messages, sources, detected_intent)
+    """
+    intent = intent or detect_intent(user_msg)
+    
+    ctx_text, sources = _format_contexts(contexts, fast_mode, max_contexts)
+    context_block = "\n".join(ctx_text) if ctx_text else "(No specific course materials found)"
+    
+    messages = [{"role": "system", "content": SYSTEM_PREFIXES[(intent, bool(ctx_text))]}]
+    if summary:
+        messages.append({"role": "system", "content": summary_message(summary)})
+    for msg in history or []:
+        if msg.get("role") in ("user", "assistant") and msg.get("content"):
+            messages.append({"role": msg["role"], "content": msg["content"]})
+    messages.append({
+        "role": "user",
+        "content": f"Course Materials Context:\n{context_block}\n\nStudent Question: {user_msg}",
+    })
+    
+    return messages, sources, intent
@@ -0,0 +1,253 @@
+"""
+Prompt Token Budget
+===================
+One token budget for the whole RAG prompt instead of separate knobs for
+snippet length, history truncation and output length.
+
+- Tokens are counted with tiktoken when it is installed (TOKENIZER_ENCODING),
+  otherwise with the CHARS_PER_TOKEN estimate from context_packer.py.
+- The prompt budget is the smallest of what fits the context window of every
+  upstream that might serve the request (after reserving the answer) and
+  what can be prefilled within PROMPT_TARGET_TTFT_SECONDS.
+- The budget is spent by priority: system prompt, conversation summary and
+  question (always sent), then retrieved context, then history, newest turns first. History is
+  guaranteed up to (1 - PROMPT_CONTEXT_SHARE) of what is left, and context
+  gets the rest.
+- The allocation is returned with the messages so it can be reported per
+  request.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from context_packer import MIN_PARTIAL_TOKENS, estimate_tokens, truncate_at_sentence
+from persona import SYSTEM_PREFIXES, InteractionIntent, compose_convenor_messages, detect_intent, summary_message
+import config
+
+# Context windows by model name fragment (longest match wins)
+CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "claude-3": 200000,
+    "llama-3.1": 131072,
+    "llama-3.2": 131072,
+    "llama-3": 8192,
+    "mistral-7b": 32768,
+    "mixtral": 32768,
+    "gemma": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Ollama truncates prompts to its num_ctx (2048 by default), whatever the model supports
+OLLAMA_CONTEXT_WINDOW = 2048
+
+# Per-message framing tokens in the chat format, and per-snippet marker tokens
+MESSAGE_OVERHEAD = 4
+SNIPPET_OVERHEAD = 4
+
+# Slack for tokenizer differences between us and the upstream
+SAFETY_MARGIN = 64
+
+
+class Tokenizer:
+    """Local token counter: tiktoken if available, else a character estimate."""
+
+    def __init__(self, encoding_name: str = ""):
+        self.name = "estimate"
+        self._encoding = None
+        if not encoding_name:
+            return
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+            self.name = encoding_name
+        except ImportError:
+            pass
+        except Exception as e:  # e.g. encoding file not downloadable
+            print(f"[WARNING] tiktoken encoding {encoding_name} unavailable, estimating tokens: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Shorten text to about max_tokens, ending on a sentence boundary."""
+        tokens = self.count(text)
+        if tokens <= max_tokens:
+            return text
+        max_chars = len(text) * max_tokens // tokens
+        shortened = truncate_at_sentence(text, max_chars)
+        while shortened and self.count(shortened) > max_tokens and max_chars > 0:
+            max_chars = max_chars * 9 // 10
+            shortened = truncate_at_sentence(text, max_chars)
+        return shortened
+
+
+_tokenizer: Optional[Tokenizer] = None
+
+
+def get_tokenizer() -> Tokenizer:
+    """Get the global tokenizer."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = Tokenizer(config.TOKENIZER_ENCODING)
+    return _tokenizer
+
+
+def context_window(model: str, provider: str = "openrouter") -> int:
+    """Context window in tokens for a model (MODEL_CONTEXT_WINDOW overrides)."""
+    if config.MODEL_CONTEXT_WINDOW > 0:
+        return config.MODEL_CONTEXT_WINDOW
+    if provider == "ollama":
+        return OLLAMA_CONTEXT_WINDOW
+    name = model.lower().replace("llama3", "llama-3")
+    matches = [key for key in CONTEXT_WINDOWS if key in name]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def prompt_token_budget(window: int, max_output_tokens: int) -> int:
+    """Prompt tokens allowed by the context window and the TTFT target."""
+    budget = window - max_output_tokens - SAFETY_MARGIN
+    if config.PROMPT_TARGET_TTFT_SECONDS > 0 and config.PREFILL_TOKENS_PER_SECOND > 0:
+        budget = min(budget, int(config.PROMPT_TARGET_TTFT_SECONDS * config.PREFILL_TOKENS_PER_SECOND))
+    return max(0, budget)
+
+
+@dataclass
+class BudgetAllocation:
+    """How one prompt's token budget was spent."""
+    tokenizer: str
+    context_window: int
+    budget: int
+    max_output_tokens: int
+    system: int = 0
+    summary: int = 0
+    question: int = 0
+    context: int = 0
+    history: int = 0
+    contexts_kept: int = 0
+    contexts_dropped: int = 0
+    contexts_truncated: int = 0
+    history_kept: int = 0
+    history_dropped: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.system + self.summary + self.question + self.context + self.history
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "total": self.total}
+
+
+def _fit_contexts(
+    contexts: List[Dict],
+    limit: int,
+    tokenizer: Tokenizer,
+    allocation: BudgetAllocation,
+) -> List[Dict]:
+    """Contexts in rank order until limit; the first that does not fit is shortened."""
+    kept = []
+    used = 0
+    for c in contexts:
+        tokens = tokenizer.count(c["doc"]) + SNIPPET_OVERHEAD
+        if used + tokens <= limit:
+            kept.append({**c, "packed": True})
+            used += tokens
+            continue
+        room = limit - used - SNIPPET_OVERHEAD
+        if room >= MIN_PARTIAL_TOKENS:
+            doc = tokenizer.truncate(c["doc"], room)
+            kept.append({**c, "doc": doc, "packed": True})
+            used += tokenizer.count(doc) + SNIPPET_OVERHEAD
+            allocation.contexts_truncated += 1
+        break
+    allocation.context = used
+    allocation.contexts_kept = len(kept)
+    allocation.contexts_dropped = len(contexts) - len(kept)
+    return kept
+
+
+def _fit_history(
+    history: List[Dict],
+    costs: List[int],
+    limit: int,
+    allocation: BudgetAllocation,
+) -> List[Dict]:
+    """The longest run of most recent turns that fits in limit."""
+    used = 0
+    start = len(history)
+    while start > 0 and used + costs[start - 1] <= limit:
+        start -= 1
+        used += costs[start]
+    allocation.history = used
+    allocation.history_kept = len(history) - start
+    allocation.history_dropped = start
+    return history[start:]
+
+
+def build_convenor_messages(
+    contexts: List[Dict],
+    user_msg: str,
+    history: Optional[List[Dict]],
+    models: Sequence[Tuple[str, str]],
+    max_output_tokens: int,
+    fast_mode: bool = False,
+    summary: str = "",
+    intent: Optional[InteractionIntent] = None,
+) -> Tuple[List[Dict], List[str], InteractionIntent, BudgetAllocation]:
+    """
+    Build the Module Convenor chat messages within the prompt token budget.
+
+    Args:
+        contexts: Retrieved document chunks, best first
+        user_msg: Student's question
+        history: Earlier turns as {"role", "content"} messages, oldest first
+        models: (provider, model) of every upstream that may serve the request
+        max_output_tokens: Answer length to reserve in the context window
+        fast_mode: Whether to use faster, more concise prompting
+        summary: Rolling summary of the turns before history ("" = none)
+        intent: Already classified intent (None = keyword detection)
+
+    Returns:
+        (messages, sources, detected_intent, allocation)
+    """
+    tokenizer = get_tokenizer()
+    window = min((context_window(model, provider) for provider, model in models), default=DEFAULT_CONTEXT_WINDOW)
+    # Never reserve more for the answer than half the window
+    max_output_tokens = min(max_output_tokens, window // 2)
+    allocation = BudgetAllocation(
+        tokenizer=tokenizer.name,
+        context_window=window,
+        budget=prompt_token_budget(window, max_output_tokens),
+        max_output_tokens=max_output_tokens,
+    )
+
+    # Required: system prompt, summary and the question with its framing
+    intent = intent or detect_intent(user_msg)
+    allocation.system = tokenizer.count(SYSTEM_PREFIXES[(intent, bool(contexts))]) + MESSAGE_OVERHEAD
+    if summary:
+        allocation.summary = tokenizer.count(summary_message(summary)) + MESSAGE_OVERHEAD
+    allocation.question = tokenizer.count(
+        f"Course Materials Context:\n\n\nStudent Question: {user_msg}"
+    ) + MESSAGE_OVERHEAD
+    remaining = max(0, allocation.budget - allocation.system - allocation.summary - allocation.question)
+
+    turns = [m for m in history or [] if m.get("role") in ("user", "assistant") and m.get("content")]
+    costs = [tokenizer.count(m["content"]) + MESSAGE_OVERHEAD for m in turns]
+    history_reserve = min(sum(costs), int(remaining * (1 - config.PROMPT_CONTEXT_SHARE)))
+
+    kept_contexts = _fit_contexts(contexts, remaining - history_reserve, tokenizer, allocation)
+    kept_turns = _fit_history(turns, costs, remaining - allocation.context, allocation)
+
+    messages, sources, intent = compose_convenor_messages(
+        kept_contexts, user_msg, history=kept_turns, fast_mode=fast_mode, max_contexts=len(kept_contexts),
+        summary=summary, intent=intent,
+    )
+    # The no-context system prompt is used if every snippet was dropped
+    allocation.system = tokenizer.count(messages[0]["content"]) + MESSAGE_OVERHEAD
+    return messages, sources, intent, allocation
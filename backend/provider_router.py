@@ -0,0 +1,452 @@
+"""
+Provider Router
+===============
+Routes LLM calls over an ordered list of upstreams (provider + model) so a
+slow or failing provider does not become "EduMate is broken".
+
+- Each upstream has a circuit breaker: after BREAKER_FAILURE_THRESHOLD
+  consecutive failures it is skipped for BREAKER_RESET_SECONDS, then a
+  single trial request decides whether it closes again.
+- Failed attempts fail over to the next upstream at once; an upstream is
+  retried (after a full-jitter async backoff) only once every other one has
+  been tried, and everything happens within LLM_DEADLINE_SECONDS to first
+  token.
+- Hedging: if an attempt has produced no token after the upstream's recent
+  TTFT p95, a backup attempt is started on the next upstream served by a
+  different provider endpoint, and whichever answers first wins; the loser
+  is cancelled. With a single endpoint there is no hedging: a second request
+  to a struggling provider only adds to its load.
+- Once tokens are flowing the stream is committed to that upstream;
+  a failure after that point is raised to the caller.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from http_clients import get_async_client, get_sync_client
+from metrics import get_metrics
+import config
+
+
+# OpenRouter attribution header when neither FRONTEND_ORIGIN nor OPENROUTER_SITE_URL is set
+DEFAULT_FRONTEND_URL = "https://edumate.streamlit.app"
+
+
+class UpstreamError(RuntimeError):
+    """A single upstream attempt failed."""
+
+
+class AllUpstreamsFailed(RuntimeError):
+    """No upstream produced an answer within the deadline."""
+
+
+@dataclass
+class Upstream:
+    """One provider/model pair to route to."""
+    provider: str  # "openrouter" (any OpenAI-compatible API) or "ollama"
+    model: str
+    base_url: str
+    api_key: str = ""  # "" = config.OPENROUTER_API_KEY, read per call
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+def build_upstreams() -> List[Upstream]:
+    """Ordered upstream list from LLM_UPSTREAMS (or the legacy settings)."""
+    if config.LLM_UPSTREAMS:
+        specs = [s.strip() for s in config.LLM_UPSTREAMS.split(",") if s.strip()]
+    else:
+        fallbacks = [m.strip() for m in config.OPENROUTER_FALLBACK_MODELS.split(",") if m.strip()]
+        specs = [f"openrouter:{m}" for m in [config.OPENROUTER_MODEL] + fallbacks]
+        if not config.USE_OPENAI:
+            specs.insert(0, f"ollama:{config.OLLAMA_MODEL}")
+
+    referer = os.getenv("FRONTEND_ORIGIN") or config.OPENROUTER_SITE_URL or DEFAULT_FRONTEND_URL
+    upstreams = []
+    for spec in specs:
+        provider, _, model = spec.partition(":")
+        if provider == "ollama":
+            upstreams.append(Upstream("ollama", model, config.OLLAMA_HOST.rstrip("/")))
+        elif provider == "openrouter":
+            headers = {"X-Title": config.OPENROUTER_APP_NAME}
+            if referer:
+                headers["HTTP-Referer"] = referer
+            upstreams.append(Upstream("openrouter", model, config.OPENROUTER_BASE_URL.rstrip("/"), headers=headers))
+        else:
+            print(f"[WARNING] Ignoring unknown LLM upstream '{spec}'")
+    return upstreams
+
+
+def delta_text(data_str: str) -> str:
+    """Text content of one OpenAI-style streaming chunk ("" if none)."""
+    try:
+        return json.loads(data_str)["choices"][0]["delta"].get("content") or ""
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return ""
+
+
+# -----------------------
+# Circuit breaker
+# -----------------------
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial."""
+
+    def __init__(
+        self,
+        failure_threshold: int = config.BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = config.BREAKER_RESET_SECONDS,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+# -----------------------
+# Upstream adapters (one attempt each, raising UpstreamError)
+# -----------------------
+def _request(upstream: Upstream, messages: List[Dict], temperature: float, max_tokens: Optional[int], stream: bool) -> Tuple[str, Dict, Dict]:
+    """URL, headers and JSON body for one call to an upstream."""
+    if upstream.provider == "ollama":
+        options = {"temperature": temperature}
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        body = {"model": upstream.model, "messages": messages, "stream": stream,
+                "options": options, "keep_alive": "2h"}
+        return f"{upstream.base_url}/api/chat", {}, body
+
+    api_key = upstream.api_key or config.OPENROUTER_API_KEY
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json", **upstream.headers}
+    body = {"model": upstream.model, "messages": messages, "temperature": temperature, "stream": stream}
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    return f"{upstream.base_url}/chat/completions", headers, body
+
+
+async def _stream_upstream(upstream: Upstream, messages: List[Dict], temperature: float, max_tokens: Optional[int]) -> AsyncIterator[str]:
+    """Yield text deltas from one upstream; raise UpstreamError on any failure."""
+    url, headers, body = _request(upstream, messages, temperature, max_tokens, stream=True)
+    client = get_async_client(upstream.provider)
+    try:
+        async with client.stream("POST", url, headers=headers, json=body) as response:
+            if response.status_code != 200:
+                raise UpstreamError(f"{upstream.name} returned HTTP {response.status_code}")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                if upstream.provider == "ollama":
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        continue
+                    text = (data.get("message") or {}).get("content")
+                    if text:
+                        yield text
+                    if data.get("done"):
+                        return
+                elif line.startswith("data: "):
+                    data_str = line[6:].strip()
+                    if data_str == "[DONE]":
+                        return
+                    text = delta_text(data_str)
+                    if text:
+                        yield text
+    except httpx.HTTPError as e:
+        raise UpstreamError(f"{upstream.name}: {type(e).__name__}") from e
+    raise UpstreamError(f"{upstream.name}: stream ended before completion")
+
+
+def _complete_upstream(upstream: Upstream, messages: List[Dict], temperature: float, max_tokens: Optional[int], timeout: float) -> str:
+    """Blocking non-streaming completion from one upstream."""
+    url, headers, body = _request(upstream, messages, temperature, max_tokens, stream=False)
+    try:
+        r = get_sync_client(upstream.provider).post(url, headers=headers, json=body, timeout=timeout)
+    except httpx.HTTPError as e:
+        raise UpstreamError(f"{upstream.name}: {type(e).__name__}") from e
+    if r.status_code != 200:
+        raise UpstreamError(f"{upstream.name} returned HTTP {r.status_code}")
+    try:
+        data = r.json()
+        if upstream.provider == "ollama":
+            text = data["message"]["content"]
+        else:
+            text = data["choices"][0]["message"]["content"]
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise UpstreamError(f"{upstream.name}: malformed response") from e
+    if not (text or "").strip():
+        raise UpstreamError(f"{upstream.name}: empty response")
+    return text.strip()
+
+
+# -----------------------
+# Router
+# -----------------------
+class ProviderRouter:
+    """Failover, retries, circuit breaking and hedging over ordered upstreams."""
+
+    def __init__(self, upstreams: List[Upstream]):
+        self.upstreams = upstreams
+        self.breakers: Dict[str, CircuitBreaker] = {u.name: CircuitBreaker() for u in upstreams}
+        self.metrics = get_metrics()
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    async def stream(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        temperature: float = config.TEMPERATURE,
+        max_tokens: Optional[int] = config.MAX_TOKENS,
+        deadline_seconds: float = config.LLM_DEADLINE_SECONDS,
+    ) -> AsyncIterator[str]:
+        """
+        Stream an answer from the first upstream that responds.
+
+        Args:
+            messages: Chat messages (OpenAI format)
+            model: Overrides the model of the primary upstream
+            temperature: Sampling temperature
+            max_tokens: Answer length cap (None = provider default)
+            deadline_seconds: Budget for getting the first token, retries included
+
+        Yields:
+            Text deltas
+
+        Raises:
+            AllUpstreamsFailed: If no upstream produced a token in time
+            UpstreamError: If the chosen upstream fails mid-stream
+        """
+        plan = self._plan(model)
+        upstream, first, tokens = await self._first_token(
+            plan, messages, temperature, max_tokens, time.monotonic() + deadline_seconds
+        )
+        breaker = self.breakers[upstream.name]
+        try:
+            yield first
+            async for text in tokens:
+                yield text
+        except UpstreamError:
+            breaker.record_failure()
+            self.metrics.incr("upstream_failures")
+            raise
+        finally:
+            await tokens.aclose()
+
+    async def complete(self, messages: List[Dict], **kwargs) -> str:
+        """Full answer text via stream() (same routing, hedging included)."""
+        return "".join([text async for text in self.stream(messages, **kwargs)])
+
+    def complete_sync(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        temperature: float = config.TEMPERATURE,
+        max_tokens: Optional[int] = config.MAX_TOKENS,
+        deadline_seconds: float = config.LLM_DEADLINE_SECONDS * 3,
+    ) -> str:
+        """Blocking completion with failover, retries and breakers (no hedging)."""
+        deadline_at = time.monotonic() + deadline_seconds
+        errors: List[str] = []
+        tried: Dict[str, int] = {}
+        for upstream in self._plan(model):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            breaker = self.breakers[upstream.name]
+            if not breaker.allow():
+                continue
+            if tried.get(upstream.name):
+                time.sleep(min(self._backoff(tried[upstream.name]), remaining))
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    breaker.trial_in_flight = False
+                    break
+            tried[upstream.name] = tried.get(upstream.name, 0) + 1
+            try:
+                text = _complete_upstream(upstream, messages, temperature, max_tokens, remaining)
+            except UpstreamError as e:
+                breaker.record_failure()
+                self.metrics.incr("upstream_failures")
+                print(f"[WARNING] {e}")
+                errors.append(str(e))
+                continue
+            breaker.record_success()
+            return text
+        raise AllUpstreamsFailed("; ".join(errors) or "no upstream available")
+
+    def models(self, model: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(provider, model) of every upstream that may serve a request."""
+        models = [(u.provider, u.model) for u in self.upstreams]
+        if model and models:
+            models[0] = (models[0][0], model)
+        return models
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: {"state": b.state, "failures": b.failures} for name, b in self.breakers.items()}
+
+    # -----------------------
+    # Internals
+    # -----------------------
+    def _plan(self, model: Optional[str]) -> List[Upstream]:
+        """Attempt order: every upstream once, then the retries, in order."""
+        upstreams = list(self.upstreams)
+        if model and upstreams and model != upstreams[0].model:
+            primary = upstreams[0]
+            override = Upstream(primary.provider, model, primary.base_url, primary.api_key, primary.headers)
+            self.breakers.setdefault(override.name, CircuitBreaker())
+            upstreams[0] = override
+        return upstreams * (1 + max(0, config.LLM_RETRIES_PER_UPSTREAM))
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before re-trying an upstream."""
+        cap = min(config.LLM_RETRY_MAX_SECONDS, config.LLM_RETRY_BASE_SECONDS * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    def _hedge_delay(self, upstream: Upstream) -> float:
+        """Seconds without a first token before hedging (recent TTFT p95)."""
+        samples = self.metrics.values(f"upstream_ttft_seconds.{upstream.name}")
+        if len(samples) < config.HEDGE_MIN_SAMPLES:
+            return config.HEDGE_DEFAULT_SECONDS
+        p = self.metrics.percentile(f"upstream_ttft_seconds.{upstream.name}", config.HEDGE_PERCENTILE)
+        return min(config.HEDGE_MAX_SECONDS, max(config.HEDGE_MIN_SECONDS, p))
+
+    async def _attempt(self, upstream: Upstream, delay: float, messages, temperature, max_tokens):
+        """Open a stream on one upstream and wait for its first token."""
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        tokens = _stream_upstream(upstream, messages, temperature, max_tokens)
+        try:
+            first = await tokens.__anext__()
+        except StopAsyncIteration:
+            raise UpstreamError(f"{upstream.name}: empty response")
+        except BaseException:
+            await tokens.aclose()
+            raise
+        self.metrics.observe(f"upstream_ttft_seconds.{upstream.name}", time.monotonic() - started)
+        return upstream, first, tokens
+
+    async def _first_token(self, plan: List[Upstream], messages, temperature, max_tokens, deadline_at: float):
+        """Race attempts over the plan (failover + hedging) until one yields a token."""
+        running: Dict[asyncio.Task, Tuple[Upstream, float]] = {}
+        tried: Dict[str, int] = {}
+        errors: List[str] = []
+        queue = list(plan)
+
+        def launch(hedge: bool = False) -> bool:
+            # Hedges only go to an endpoint that is not already being waited on
+            busy = {u.base_url for u, _ in running.values()} if hedge else set()
+            for i in range(len(queue)):
+                upstream = queue[i]
+                if upstream.base_url in busy:
+                    continue
+                breaker = self.breakers[upstream.name]
+                if not breaker.allow():
+                    continue
+                del queue[i]
+                attempt = tried.get(upstream.name, 0)
+                tried[upstream.name] = attempt + 1
+                delay = self._backoff(attempt) if attempt and not hedge else 0.0
+                task = asyncio.ensure_future(self._attempt(upstream, delay, messages, temperature, max_tokens))
+                running[task] = (upstream, time.monotonic() + delay)
+                if hedge:
+                    self.metrics.incr("hedges_fired")
+                return True
+            return False
+
+        hedging = config.HEDGING_ENABLED and len({u.base_url for u in plan}) > 1
+        try:
+            while True:
+                if not running and not launch():
+                    break
+                now = time.monotonic()
+                if now >= deadline_at:
+                    errors.append("deadline exceeded")
+                    break
+
+                # Hedge once the newest attempt is overdue for its first token
+                timeout = deadline_at - now
+                hedge_at = None
+                if hedging and queue:
+                    upstream, started = max(running.values(), key=lambda r: r[1])
+                    hedge_at = started + self._hedge_delay(upstream)
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    upstream, _ = running.pop(task)
+                    breaker = self.breakers[upstream.name]
+                    try:
+                        result = task.result()
+                    except UpstreamError as e:
+                        breaker.record_failure()
+                        self.metrics.incr("upstream_failures")
+                        print(f"[WARNING] {e}; failing over")
+                        errors.append(str(e))
+                        continue
+                    breaker.record_success()
+                    if result[0].name != plan[0].name:
+                        self.metrics.incr("upstream_failovers")
+                    return result
+
+                if not done and hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedging = launch(hedge=True)  # nothing left to hedge with: stop trying
+        finally:
+            # Cancel the losers (their streams are closed by _attempt)
+            for task, (upstream, _) in running.items():
+                task.cancel()
+                self.breakers[upstream.name].trial_in_flight = False
+            await asyncio.gather(*running, return_exceptions=True)
+
+        raise AllUpstreamsFailed("; ".join(errors) or "no upstream available")
+
+
+_router: Optional[ProviderRouter] = None
+
+
+def get_provider_router() -> ProviderRouter:
+    """Get the global provider router, built from config on first use."""
+    global _router
+    if _router is None:
+        _router = ProviderRouter(build_upstreams())
+    return _router
@@ -0,0 +1,341 @@
+"""
+RAG Chat Pipeline
+=================
+Grounded answers for the /rag endpoint: retrieval, conversation memory and
+prompt assembly in front of a streamed generation.
+
+- Retrieval (query embedding + search, in a worker thread) and the memory
+  lookup run concurrently; the prompt is assembled once both are done.
+- The Retriever (embedding model + Chroma) is created lazily on first use,
+  so the backend starts fast and /chat works without the RAG dependencies.
+- The prompt is sized by prompt_budget.py: system prompt, question,
+  retrieved context and history share one token budget derived from the
+  upstreams' context windows and the TTFT target.
+- With CONVERSATION_SUMMARY, history is the session's rolling summary plus
+  the turns it does not cover yet; the summary is updated in the
+  background after the answer has been sent (summarizer.py).
+- The intent (persona template) is classified from the query embedding
+  against per-intent centroids, with the keyword rules as fallback
+  (intent_classifier.py); it is known before the search runs.
+- The semantic answer cache is consulted with the query embedding and the
+  retrieved chunk ids before any generation. Only answers given without
+  conversation history are stored, so cached answers stand on their own.
+- Questions answered by a handbook table fact (facts.py) skip retrieval
+  altogether. Factual lookups that a single line of a top context answers
+  are quoted from it without an LLM call (extractive.py). Neither fast path
+  is used when the client asked for detail.
+- The stream is: a "sources" event, a "prompt" event with the token budget
+  allocation, the answer as OpenAI-style chunks, a trailing "timings" event
+  with per-stage milliseconds, then [DONE].
+"""
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from degradation import ServiceLevel
+from extractive import ExtractiveAnswer, find_extractive_answer
+from facts import format_facts, get_fact_store
+from intent_classifier import classify_intent
+from memory import get_memory
+from metrics import get_metrics
+from module_index import normalize_module_id
+from persona import InteractionIntent, detect_intent
+from prompt_budget import BudgetAllocation, build_convenor_messages
+from provider_router import AllUpstreamsFailed, UpstreamError, get_provider_router
+from response_cache import delta_chunk, replay_sse
+from semantic_cache import get_semantic_cache
+from sse import sse_event
+from summarizer import get_summarizer
+import config
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """The process-wide Retriever, created on first use (loads the embedder)."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                from retrieval import Retriever  # heavy imports, deferred
+                _retriever = Retriever()
+    return _retriever
+
+
+@dataclass
+class PreparedAnswer:
+    """Everything needed to stream a grounded answer."""
+    question: str
+    session_id: Optional[str]
+    module_id: Optional[str]
+    query_embedding: List[float]
+    contexts: List[Dict]
+    history: List[Dict]
+    messages: List[Dict]
+    sources: List[str]
+    intent: InteractionIntent
+    summary: str = ""
+    budget: Optional[BudgetAllocation] = None  # None when no prompt was built
+    cached_answer: Optional[str] = None
+    extractive: Optional[ExtractiveAnswer] = None
+    started: float = field(default_factory=time.monotonic)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [cid for c in self.contexts for cid in c.get("chunk_ids", [c.get("id")]) if cid]
+
+    @property
+    def standalone(self) -> bool:
+        """Whether the answer depends on nothing but the question (no history or summary)."""
+        return not (self.history or self.summary)
+
+    def mark(self, stage: str, seconds: float):
+        self.timings[stage] = round(seconds * 1000, 1)
+        get_metrics().observe(f"rag_{stage}_seconds", seconds)
+
+
+def _retrieve(question: str, module_id: Optional[str], level: ServiceLevel):
+    retriever = get_retriever()
+    t0 = time.monotonic()
+    embedding = retriever.embed_query(question)
+    intent = classify_intent(question, embedding, retriever.embedder)
+    t1 = time.monotonic()
+    contexts = retriever.retrieve(question, None, module_id=module_id, level=level, query_embedding=embedding)
+    return embedding, intent, contexts, t1 - t0, time.monotonic() - t1
+
+
+def _recall(session_id: Optional[str]) -> Tuple[str, List[Dict]]:
+    """(summary, history) for the prompt."""
+    if not (config.ENABLE_CONVERSATION_MEMORY and session_id):
+        return "", []
+    if config.CONVERSATION_SUMMARY:
+        summary, _, history = get_memory().get_summarized_history(session_id)
+        return summary, history
+    # Whole messages: prompt_budget.py decides how many of them fit
+    return "", get_memory().get_recent_messages(session_id, config.MAX_CONVERSATION_HISTORY, max_chars=None)
+
+
+def _fact_answer(
+    question: str,
+    session_id: Optional[str],
+    module_id: Optional[str],
+    started: float,
+) -> Optional[PreparedAnswer]:
+    """A prepared answer straight from the table facts, if they answer question."""
+    facts = get_fact_store().lookup(question, normalize_module_id(module_id))
+    if not facts:
+        return None
+    answer = ExtractiveAnswer(format_facts(facts), "fact", 1, facts[0].source, 1.0)
+    return PreparedAnswer(
+        question=question,
+        session_id=session_id,
+        module_id=module_id,
+        query_embedding=[],
+        contexts=[],
+        history=[],
+        messages=[],
+        sources=[f"{answer.marker} {answer.source}"],
+        intent=detect_intent(question),
+        extractive=answer,
+        started=started,
+    )
+
+
+async def prepare_answer(
+    question: str,
+    session_id: Optional[str],
+    module_id: Optional[str],
+    level: ServiceLevel,
+    model: Optional[str] = None,
+    detail: bool = False,
+) -> PreparedAnswer:
+    """
+    Run retrieval and memory lookup concurrently, then assemble the prompt.
+
+    A question answered by the table facts returns at once, without
+    retrieval.
+
+    Args:
+        question: Student's question
+        session_id: Conversation memory session (None = no memory)
+        module_id: Module whose index to search (None = DEFAULT_MODULE, the corpus root files)
+        level: Current service level (retrieval depth, answer length)
+        model: Overrides the primary upstream's model (None = configured)
+        detail: Always generate a full answer (skip the fact and extractive fast paths)
+
+    Raises:
+        UnknownModuleError: If module_id has not been ingested
+        ImportError: If the retrieval dependencies are not installed
+    """
+    started = time.monotonic()
+
+    if config.FACTS_ENABLED and not detail:
+        # SQLite (and a reload after a re-ingest): off the event loop
+        prepared = await asyncio.to_thread(_fact_answer, question, session_id, module_id, started)
+        if prepared is not None:
+            prepared.mark("facts", time.monotonic() - started)
+            get_metrics().incr("fact_answers")
+            return prepared
+
+    async def recall():
+        t = time.monotonic()
+        recalled = await asyncio.to_thread(_recall, session_id)
+        return recalled, time.monotonic() - t
+
+    (embedding, intent, contexts, t_embed, t_search), ((summary, history), t_memory) = await asyncio.gather(
+        asyncio.to_thread(_retrieve, question, module_id, level),
+        recall(),
+    )
+
+    t = time.monotonic()
+    # Stable system prefix per intent, then history, then this turn
+    messages, sources, intent, budget = build_convenor_messages(
+        contexts, question, history, get_provider_router().models(model), level.max_tokens,
+        fast_mode=level.fast_mode, summary=summary, intent=intent,
+    )
+    t_prompt = time.monotonic() - t
+
+    prepared = PreparedAnswer(
+        question=question,
+        session_id=session_id,
+        module_id=module_id,
+        query_embedding=embedding,
+        contexts=contexts,
+        history=history,
+        messages=messages,
+        sources=sources,
+        intent=intent,
+        summary=summary,
+        budget=budget,
+        started=started,
+    )
+    prepared.mark("embedding", t_embed)
+    prepared.mark("retrieval", t_search)
+    prepared.mark("memory", t_memory)
+    prepared.mark("prompt", t_prompt)
+    get_metrics().observe("prompt_tokens", budget.total)
+
+    cache = get_semantic_cache()
+    # Cached answers stand alone: a follow-up may need this conversation
+    if cache is not None and prepared.standalone:
+        t = time.monotonic()
+        prepared.cached_answer = await asyncio.to_thread(
+            cache.lookup, question, embedding, prepared.chunk_ids, normalize_module_id(module_id)
+        )
+        prepared.mark("semantic_cache", time.monotonic() - t)
+        get_metrics().incr("semantic_cache_hits" if prepared.cached_answer else "semantic_cache_misses")
+
+    if prepared.cached_answer is None and config.EXTRACTIVE_ANSWERS and not detail:
+        t = time.monotonic()
+        # Only contexts that made it into the prompt, so markers match the sources
+        prepared.extractive = find_extractive_answer(question, contexts[:budget.contexts_kept])
+        prepared.mark("extractive", time.monotonic() - t)
+        if prepared.extractive is not None:
+            get_metrics().incr("extractive_answers")
+    return prepared
+
+
+def _store_turn(prepared: PreparedAnswer, answer: str):
+    memory = get_memory()
+    memory.add_message(prepared.session_id, "user", prepared.question, {"intent": prepared.intent.value})
+    memory.add_message(prepared.session_id, "assistant", answer, {"sources": prepared.sources})
+
+
+async def _remember(prepared: PreparedAnswer, answer: str):
+    if not (config.ENABLE_CONVERSATION_MEMORY and prepared.session_id):
+        return
+    # A shared session store may write (and wait on) SQLite here: keep it off the event loop
+    await asyncio.to_thread(_store_turn, prepared, answer)
+    if config.CONVERSATION_SUMMARY:
+        get_summarizer().schedule(prepared.session_id)
+
+
+async def _replay(prepared: PreparedAnswer, answer: str, tag: Dict[str, str]) -> AsyncIterator[str]:
+    """Stream an answer that needed no generation, then timings and [DONE]."""
+    async for event in replay_sse(answer):
+        if event != "data: [DONE]\n\n":
+            yield event
+    await _remember(prepared, answer)
+    prepared.mark("total", time.monotonic() - prepared.started)
+    yield sse_event("timings", {**prepared.timings, **tag})
+    yield "data: [DONE]\n\n"
+
+
+async def stream_answer(
+    prepared: PreparedAnswer,
+    model: Optional[str],
+    temperature: float,
+) -> AsyncIterator[str]:
+    """
+    SSE events for a prepared answer: sources, prompt, answer chunks, timings, [DONE].
+
+    Extractive answers send an "extractive" event (answer type, marker,
+    source) before the quoted span; re-asking with detail=True gets the full
+    generated answer.
+
+    Args:
+        prepared: Output of prepare_answer()
+        model: Overrides the primary upstream's model (None = configured)
+        temperature: Sampling temperature
+    """
+    yield sse_event("sources", {"sources": prepared.sources, "intent": prepared.intent.value})
+    if prepared.budget is not None:
+        yield sse_event("prompt", prepared.budget.as_dict())
+
+    if prepared.cached_answer is not None:
+        async for event in _replay(prepared, prepared.cached_answer, {"cache": "semantic"}):
+            yield event
+        return
+
+    if prepared.extractive is not None:
+        yield sse_event("extractive", prepared.extractive.as_dict())
+        async for event in _replay(prepared, prepared.extractive.text, {"answer": "extractive"}):
+            yield event
+        return
+
+    generation_started = time.monotonic()
+    first_token = None
+    parts: List[str] = []
+    try:
+        async for text in get_provider_router().stream(
+            prepared.messages, model=model, temperature=temperature, max_tokens=prepared.budget.max_output_tokens
+        ):
+            if first_token is None:
+                first_token = time.monotonic()
+                get_metrics().observe("ttft_seconds", first_token - generation_started)
+                prepared.mark("ttft", first_token - prepared.started)
+            parts.append(text)
+            yield delta_chunk(text)
+    except AllUpstreamsFailed as e:
+        print(f"[ERROR] No LLM upstream available: {e}")
+        yield f"data: {json.dumps({'error': 'Upstream API error'})}\n\n"
+        return
+    except UpstreamError as e:
+        print(f"[ERROR] Upstream failed mid-stream: {e}")
+        yield f"data: {json.dumps({'error': 'Streaming error'})}\n\n"
+        return
+    except Exception as e:
+        print(f"[ERROR] Streaming error: {type(e).__name__}")
+        yield f"data: {json.dumps({'error': 'Streaming error'})}\n\n"
+        return
+    finally:
+        get_metrics().observe("generation_seconds", time.monotonic() - generation_started)
+
+    answer = "".join(parts)
+    prepared.mark("generation", time.monotonic() - generation_started)
+    await _remember(prepared, answer)
+    cache = get_semantic_cache()
+    if cache is not None and answer and prepared.standalone:
+        await asyncio.to_thread(
+            cache.put, prepared.question, prepared.query_embedding, prepared.chunk_ids, answer,
+            normalize_module_id(prepared.module_id),
+        )
+    prepared.mark("total", time.monotonic() - prepared.started)
+    yield sse_event("timings", prepared.timings)
+    yield "data: [DONE]\n\n"
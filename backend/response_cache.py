@@ -0,0 +1,201 @@
+"""
+Response Cache
+==============
+Exact prompt-level cache of completed LLM answers, persisted in SQLite so it
+is shared by all workers on a machine and survives restarts.
+
+- Key: SHA-256 of (model, temperature, max tokens, final messages).
+- Entries expire after RESPONSE_CACHE_TTL_SECONDS.
+- Least recently used entries are evicted beyond RESPONSE_CACHE_MAX_MB or
+  RESPONSE_CACHE_MAX_ENTRIES.
+- Entries are tagged with the index version written by ingest.py, so
+  re-ingesting the corpus invalidates every cached answer.
+- Cached answers are replayed through the same SSE format as live streams.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key           TEXT PRIMARY KEY,
+    answer        TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    created       REAL NOT NULL,
+    expires       REAL NOT NULL,
+    last_access   REAL NOT NULL,
+    hits          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access);
+"""
+
+# Words per replayed SSE chunk
+REPLAY_WORDS_PER_CHUNK = 4
+
+
+# -----------------------
+# Index version
+# -----------------------
+_version_cache = {"mtime": None, "version": ""}
+
+
+def current_index_version() -> str:
+    """Version tag written by the last ingest ("" if never ingested)."""
+    path = config.INDEX_VERSION_PATH
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return ""
+    if mtime != _version_cache["mtime"]:
+        _version_cache["version"] = path.read_text(encoding="utf-8").strip()
+        _version_cache["mtime"] = mtime
+    return _version_cache["version"]
+
+
+def bump_index_version() -> str:
+    """Record a new index version (called by ingest.py after writing)."""
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    config.INDEX_VERSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+    config.INDEX_VERSION_PATH.write_text(version, encoding="utf-8")
+    return version
+
+
+# -----------------------
+# Keys and replay
+# -----------------------
+def cache_key(model: str, temperature: float, max_tokens: Optional[int], messages: List[Dict]) -> str:
+    """Stable hash of everything that determines a generation."""
+    material = json.dumps(
+        {"model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": messages},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def delta_chunk(text: str) -> str:
+    """One SSE event in the OpenAI streaming format the UI parses."""
+    return f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}\n\n"
+
+
+async def replay_sse(answer: str) -> AsyncIterator[str]:
+    """Stream a cached answer as OpenAI-style SSE chunks ending in [DONE]."""
+    words = answer.split(" ")
+    for i in range(0, len(words), REPLAY_WORDS_PER_CHUNK):
+        piece = " ".join(words[i:i + REPLAY_WORDS_PER_CHUNK])
+        if i + REPLAY_WORDS_PER_CHUNK < len(words):
+            piece += " "
+        yield delta_chunk(piece)
+    yield "data: [DONE]\n\n"
+
+
+# -----------------------
+# Store
+# -----------------------
+class ResponseCache:
+    """SQLite-backed (WAL) exact response cache."""
+
+    def __init__(
+        self,
+        path: Path,
+        ttl_seconds: float = config.RESPONSE_CACHE_TTL_SECONDS,
+        max_bytes: int = config.RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+        max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached answer for key, or None if missing, expired or stale."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, index_version, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            answer, version, expires = row
+            with self._conn:
+                if expires < now or version != current_index_version():
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                self._conn.execute(
+                    "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+        return answer
+
+    def put(self, key: str, answer: str):
+        """Store a completed answer, evicting LRU entries beyond the limits."""
+        now = time.time()
+        size = len(answer.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, answer, index_version, size, created, expires, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, answer, current_index_version(), size, now, now + self.ttl_seconds, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Walk from least recently used, deleting until both limits hold
+        excess_count, excess_bytes = count - self.max_entries, total - self.max_bytes
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if excess_count <= 0 and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_count -= 1
+            excess_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def invalidate_stale(self) -> int:
+        """Drop entries from older index versions; returns how many."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM responses WHERE index_version != ?", (current_index_version(),)
+            )
+            return cur.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "hits": hits}
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The process-wide response cache, or None when disabled."""
+    global _cache
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResponseCache(config.RESPONSE_CACHE_PATH)
+        _cache.invalidate_stale()
+    return _cache
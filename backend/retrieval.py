@@ -1,5 +1,5 @@
 # backend/retrieval.py
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
 import re
 from difflib import SequenceMatcher
 
@@ -7,6 +7,11 @@ from chromadb import Client
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 
+from chunk_store import get_chunk_store
+from compressor import make_compressor
+from context_packer import CHARS_PER_TOKEN, pack_contexts
+from degradation import ServiceLevel, default_level
+from module_index import ModuleIndexCache
 import config
 
 
@@ -18,19 +23,14 @@ def fuzzy_similarity(s1: str, s2: str) -> float:
     return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
 
 
-def simple_bm25_like_score(query: str, doc: str) -> float:
+def term_overlap_score(q_set: Set[str], d_set: Set[str]) -> float:
     """
-    Enhanced BM25-like score with fuzzy matching support.
+    BM25-like overlap score between a query term set and a document term set.
     """
-    q_terms = re.findall(r"\w+", query.lower())
-    d_terms = re.findall(r"\w+", doc.lower())
-    
-    if not q_terms or not d_terms:
+    if not q_set or not d_set:
         return 0.0
     
     # Exact matches
-    q_set = set(q_terms)
-    d_set = set(d_terms)
     exact_matches = len(q_set & d_set)
     
     # Fuzzy matches for terms not exactly matched
@@ -42,6 +42,9 @@ def simple_bm25_like_score(query: str, doc: str) -> float:
         best_match = 0.0
         for d_term in d_set:
             if len(q_term) >= 4 and len(d_term) >= 4:  # Only fuzzy match longer terms
+                # Ratio can't exceed 0.8 when lengths differ this much; skip SequenceMatcher
+                if 2 * min(len(q_term), len(d_term)) <= 0.8 * (len(q_term) + len(d_term)):
+                    continue
                 similarity = fuzzy_similarity(q_term, d_term)
                 if similarity > 0.8:  # High threshold for fuzzy matches
                     best_match = max(best_match, similarity * 0.5)  # Weight fuzzy matches lower
@@ -52,19 +55,87 @@ def simple_bm25_like_score(query: str, doc: str) -> float:
     return total_score
 
 
+def simple_bm25_like_score(query: str, doc: str) -> float:
+    """
+    Enhanced BM25-like score with fuzzy matching support.
+    """
+    q_set = set(re.findall(r"\w+", query.lower()))
+    d_set = set(re.findall(r"\w+", doc.lower()))
+    return term_overlap_score(q_set, d_set)
+
+
 class Retriever:
     def __init__(self):
-        # Must match ingest settings so we read the same persisted DB
+        # Must match ingest settings so we read the same persisted DB.
+        # Chroma's LRU segment cache keeps resident HNSW indexes within budget.
+        memory_budget = config.MODULE_INDEX_MEMORY_MB * 1024 * 1024
         self.client = Client(
             Settings(
                 persist_directory=str(config.DATA_DIR),
                 allow_reset=True,
                 is_persistent=True,
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=memory_budget,
             )
         )
-        self.collection = self.client.get_or_create_collection("edumate")
         # Use SAME embedding lib/model as ingest
         self.embedder = SentenceTransformer(config.EMBEDDING_MODEL)
+        # Module collections are opened lazily and evicted LRU
+        self.modules = ModuleIndexCache(
+            self.client,
+            embedding_dim=self.embedder.get_sentence_embedding_dimension(),
+            memory_budget_bytes=memory_budget,
+        )
+        # Chunk text lives outside the vector index and is fetched by id
+        self.chunks = get_chunk_store()
+
+    @property
+    def collection(self):
+        """Collection of the default module (kept for backward compatibility)."""
+        return self.modules.get().collection
+
+    def search(self, embedding: List[float], n_results: int, module_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Nearest-neighbour search within one module returning ids and scores only.
+        Uses the module's quantized index when available, else Chroma's own index.
+
+        Returns:
+            List of (chunk_id, vector_similarity), best first
+        """
+        module = self.modules.get(module_id)
+        if module.qindex is not None:
+            return module.qindex.search(embedding, n_results, rescore=config.QUANT_RESCORE_CANDIDATES)
+
+        res = module.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            include=["distances"],
+        )
+        ids = res.get("ids", [[]])[0]
+        dists = res.get("distances", [[]])[0]
+        # Squared L2 on normalised embeddings: cosine = 1 - d / 2
+        return [(i, 1.0 - d / 2.0) for i, d in zip(ids, dists)]
+
+    def _lexical_view(self, module_id: Optional[str], ids: List[str]) -> Dict[str, Dict]:
+        """Term sets and lengths for candidates, read without chunk text when possible."""
+        view = self.chunks.get_terms(ids)
+        missing = [i for i in ids if i not in view]
+        if missing:
+            # Index ingested before the chunk store existed: fall back to Chroma
+            got = self.modules.get(module_id).collection.get(ids=missing, include=["documents"])
+            for i, d in zip(got.get("ids", []), got.get("documents", [])):
+                view[i] = {"terms": set(re.findall(r"\w+", d.lower())), "length": len(d)}
+        return view
+
+    def _fetch_chunks(self, module_id: Optional[str], ids: List[str]) -> Dict[str, Dict]:
+        """Chunk text and metadata for the final results only."""
+        chunks = self.chunks.get_chunks(ids)
+        missing = [i for i in ids if i not in chunks]
+        if missing:
+            got = self.modules.get(module_id).collection.get(ids=missing, include=["documents", "metadatas"])
+            for i, d, m in zip(got.get("ids", []), got.get("documents", []), got.get("metadatas", [])):
+                chunks[i] = {"doc": d, "meta": m}
+        return chunks
 
     def expand_queries(self, q: str, model_call) -> List[str]:
         """
@@ -105,59 +176,80 @@ class Retriever:
         
         return expanded
 
-    def retrieve(self, query: str, model_call) -> List[Dict]:
-        queries = self.expand_queries(query, model_call)
-
-        candidates: List[Dict] = []
-        for q in queries:
-            e = self.embedder.encode(q).tolist()
-            res = self.collection.query(
-                query_embeddings=[e],
-                n_results=max(1, config.TOP_K),
-                include=["documents", "metadatas"],
-            )
-            ids = res.get("ids", [[]])[0]
-            docs = res.get("documents", [[]])[0]
-            metas = res.get("metadatas", [[]])[0]
-
-            for i, d in enumerate(docs):
-                # guard against empty returns
-                if i < len(ids) and i < len(metas):
-                    candidates.append({"id": ids[i], "doc": d, "meta": metas[i]})
-
-        # Deduplicate by id
-        seen, dedup = set(), []
-        for r in candidates:
-            if r["id"] in seen:
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query with the ingest model (shared with the semantic cache)."""
+        return self.embedder.encode(query).tolist()
+
+    def retrieve(
+        self,
+        query: str,
+        model_call,
+        module_id: Optional[str] = None,
+        level: Optional[ServiceLevel] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[Dict]:
+        # Load-dependent settings (degradation.py); baseline config when not given
+        level = level or default_level()
+        queries = self.expand_queries(query, model_call) if level.expand_queries else [query]
+        pool = max(level.top_k, config.RETRIEVAL_CANDIDATES, 1)
+
+        # Stage 1: candidate generation on ids and vector scores only
+        vector_scores: Dict[str, float] = {}
+        for i, q in enumerate(queries):
+            if i == 0 and query_embedding is not None:
+                e = query_embedding  # already embedded by the caller
+            else:
+                e = self.embed_query(q)
+            if query_embedding is None:
+                query_embedding = e  # original query comes first
+            for chunk_id, sim in self.search(e, pool, module_id):
+                if sim > vector_scores.get(chunk_id, float("-inf")):
+                    vector_scores[chunk_id] = sim
+
+        if not vector_scores:
+            return []
+
+        # Stage 2: BM25-like re-rank fused with vector similarity, on term sets
+        q_set = set(re.findall(r"\w+", query.lower()))
+        view = self._lexical_view(module_id, list(vector_scores))
+        ranked: List[Dict] = []
+        for chunk_id, sim in vector_scores.items():
+            if chunk_id not in view:
                 continue
-            seen.add(r["id"])
-            dedup.append(r)
-
-        # Light BM25-like re-rank
-        for r in dedup:
-            r["bm25"] = simple_bm25_like_score(query, r["doc"])
-            r["score"] = r["bm25"] * config.BM25_WEIGHT
-
-        dedup.sort(key=lambda x: x["score"], reverse=True)
-        results = dedup[: config.TOP_K]
-        
-        # In Fast Mode, trim context to MAX_CONTEXT_CHARS
-        if config.FAST_MODE and config.MAX_CONTEXT_CHARS:
-            total_chars = 0
-            trimmed_results = []
-            for r in results:
-                doc_len = len(r["doc"])
-                if total_chars + doc_len <= config.MAX_CONTEXT_CHARS:
-                    trimmed_results.append(r)
-                    total_chars += doc_len
-                elif total_chars < config.MAX_CONTEXT_CHARS:
-                    # Partial include to reach limit
-                    remaining = config.MAX_CONTEXT_CHARS - total_chars
-                    r["doc"] = r["doc"][:remaining]
-                    trimmed_results.append(r)
-                    break
-            return trimmed_results
-        
-        return results
-
-
+            bm25 = term_overlap_score(q_set, view[chunk_id]["terms"])
+            ranked.append({
+                "id": chunk_id,
+                "bm25": bm25,
+                "vector": sim,
+                "score": bm25 * config.BM25_WEIGHT + sim * config.VECTOR_WEIGHT,
+                "length": view[chunk_id]["length"],
+            })
+
+        ranked.sort(key=lambda x: x["score"], reverse=True)
+        results = ranked[: level.top_k]
+
+        # Stage 3: fetch text only for the chunks that can fit the context
+        # budget (merging overlaps only shrinks them), then pack them
+        budget_chars = level.context_token_budget * CHARS_PER_TOKEN
+        survivors, total_chars = [], 0
+        for r in results:
+            if total_chars >= budget_chars:
+                break
+            survivors.append(r)
+            total_chars += r.pop("length")
+
+        chunks = self._fetch_chunks(module_id, [r["id"] for r in survivors])
+        final = [
+            {**r, "doc": chunks[r["id"]]["doc"], "meta": chunks[r["id"]]["meta"]}
+            for r in survivors
+            if r["id"] in chunks
+        ]
+
+        # Optional query-focused compression, reusing the query embedding
+        compress = None
+        if config.CONTEXT_COMPRESSION:
+            sentence_index = self.chunks.get_sentence_vectors([r["id"] for r in final])
+            if sentence_index:
+                compress = make_compressor(query_embedding, sentence_index)
+
+        return pack_contexts(final, level.context_token_budget, compress=compress)
@@ -0,0 +1,316 @@
+"""
+Semantic Answer Cache
+=====================
+Serves paraphrased questions ("when is CW1 due" / "coursework 1 deadline?")
+from previously generated answers, without an LLM call.
+
+- Lookup reuses the query embedding the Retriever already computed, and
+  finds cached queries by cosine similarity (brute-force nearest-neighbour
+  search over an in-memory matrix of normalised vectors).
+- A neighbour only counts as a hit if it is at least
+  SEMANTIC_CACHE_THRESHOLD similar AND its answer was grounded in (nearly)
+  the same retrieved chunks: Jaccard overlap of chunk ids of at least
+  SEMANTIC_CACHE_MIN_OVERLAP. Two questions that embed closely but pull
+  different handbook sections therefore never share an answer.
+- Entries persist in SQLite (survive restarts), expire after
+  SEMANTIC_CACHE_TTL_SECONDS, are evicted least recently used beyond
+  SEMANTIC_CACHE_MAX_ENTRIES, and are dropped when the index version
+  written by ingest.py changes.
+- SQLite is the source of truth shared by the workers; each worker's matrix
+  is a copy. Every lookup first loads rows added since the highest id it
+  has seen; a hit whose row another worker deleted is dropped instead of
+  served, and the whole id set is reconciled every RECONCILE_SECONDS.
+- Every hit is appended to SEMANTIC_CACHE_AUDIT_LOG (JSON lines) so served
+  answers can be reviewed against the question that produced them.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from response_cache import current_index_version
+import config
+
+# How often a worker drops entries other workers have deleted
+RECONCILE_SECONDS = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    module        TEXT NOT NULL,
+    query         TEXT NOT NULL,
+    vector        BLOB NOT NULL,
+    chunk_ids     TEXT NOT NULL,
+    answer        TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    created       REAL NOT NULL,
+    expires       REAL NOT NULL,
+    last_access   REAL NOT NULL,
+    hits          INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def chunk_overlap(a: Iterable[str], b: Iterable[str]) -> float:
+    """Jaccard overlap of two chunk id sets (1.0 = identical)."""
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _normalise(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm > 0 else v
+
+
+class SemanticCache:
+    """Nearest-neighbour answer cache keyed on query embedding + chunk set."""
+
+    def __init__(
+        self,
+        path: Path,
+        threshold: float = config.SEMANTIC_CACHE_THRESHOLD,
+        min_overlap: float = config.SEMANTIC_CACHE_MIN_OVERLAP,
+        ttl_seconds: float = config.SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = config.SEMANTIC_CACHE_MAX_ENTRIES,
+        audit_log: Optional[Path] = config.SEMANTIC_CACHE_AUDIT_LOG,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.audit_log = Path(audit_log) if audit_log else None
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        # In-memory index: entry id -> metadata, plus a stacked vector matrix
+        self._entries: Dict[int, Dict] = {}
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._row_ids: List[int] = []
+        self._max_id = 0
+        self._reconciled = 0.0
+        self._load()
+
+    # -----------------------
+    # Public API
+    # -----------------------
+    def lookup(
+        self,
+        query: str,
+        query_embedding,
+        chunk_ids: Iterable[str],
+        module_id: str = config.DEFAULT_MODULE,
+    ) -> Optional[str]:
+        """
+        Cached answer for a paraphrase of a previously answered query.
+
+        Args:
+            query: The student's question (for the audit log)
+            query_embedding: Embedding of the question, as computed by the Retriever
+            chunk_ids: Ids of the chunks retrieved for this question
+            module_id: Module the question was asked in
+
+        Returns:
+            The cached answer, or None if no neighbour qualifies
+        """
+        q = _normalise(query_embedding)
+        chunk_ids = list(chunk_ids)
+        version = current_index_version()
+        now = time.time()
+
+        with self._lock:
+            self._sync(now)
+            matrix = self._index()
+            if matrix is None or matrix.shape[1] != q.shape[0]:
+                return None
+            sims = matrix @ q
+            for row in np.argsort(-sims):
+                similarity = float(sims[row])
+                if similarity < self.threshold:
+                    break
+                entry_id = self._row_ids[row]
+                entry = self._entries[entry_id]
+                if entry["expires"] < now or entry["index_version"] != version:
+                    self._remove([entry_id])
+                    continue
+                if entry["module"] != module_id:
+                    continue
+                overlap = chunk_overlap(chunk_ids, entry["chunk_ids"])
+                if overlap < self.min_overlap:
+                    continue
+
+                with self._conn:
+                    updated = self._conn.execute(
+                        "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE id = ?", (now, entry_id)
+                    ).rowcount
+                if not updated:
+                    # Evicted or expired by another worker
+                    self._forget([entry_id])
+                    continue
+                entry["last_access"] = now
+                self._audit(query, entry_id, entry, similarity, overlap, module_id)
+                return entry["answer"]
+        return None
+
+    def put(
+        self,
+        query: str,
+        query_embedding,
+        chunk_ids: Iterable[str],
+        answer: str,
+        module_id: str = config.DEFAULT_MODULE,
+    ):
+        """Store a completed answer together with its query vector and chunk set."""
+        if not answer:
+            return
+        v = _normalise(query_embedding)
+        chunk_ids = sorted(set(chunk_ids))
+        version = current_index_version()
+        now = time.time()
+
+        with self._lock:
+            with self._conn:
+                cur = self._conn.execute(
+                    "INSERT INTO entries "
+                    "(module, query, vector, chunk_ids, answer, index_version, created, expires, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (module_id, query, v.tobytes(), json.dumps(chunk_ids), answer, version,
+                     now, now + self.ttl_seconds, now),
+                )
+            self._add(cur.lastrowid, module_id, query, v, chunk_ids, answer, version, now + self.ttl_seconds, now)
+            self._evict(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self._conn.execute("SELECT COALESCE(SUM(hits), 0) FROM entries").fetchone()[0]
+            return {"entries": len(self._entries), "hits": hits}
+
+    # -----------------------
+    # Internals
+    # -----------------------
+    def _load(self):
+        """Load live entries from disk, dropping expired and stale ones."""
+        now, version = time.time(), current_index_version()
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM entries WHERE expires < ? OR index_version != ?", (now, version)
+            )
+        self._sync(now)
+        self._evict(now)
+
+    def _sync(self, now: float):
+        """Pick up entries other workers added, and periodically forget those they deleted."""
+        rows = self._conn.execute(
+            "SELECT id, module, query, vector, chunk_ids, answer, index_version, expires, last_access "
+            "FROM entries WHERE id > ?",
+            (self._max_id,),
+        ).fetchall()
+        for entry_id, module, query, blob, chunk_ids, answer, ver, expires, last_access in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self._add(entry_id, module, query, vector, json.loads(chunk_ids), answer, ver, expires, last_access)
+
+        if now - self._reconciled >= RECONCILE_SECONDS:
+            self._reconciled = now
+            on_disk = {entry_id for (entry_id,) in self._conn.execute("SELECT id FROM entries")}
+            gone = [entry_id for entry_id in self._entries if entry_id not in on_disk]
+            if gone:
+                self._forget(gone)
+
+    def _add(self, entry_id, module, query, vector, chunk_ids, answer, version, expires, last_access):
+        self._entries[entry_id] = {
+            "module": module,
+            "query": query,
+            "chunk_ids": frozenset(chunk_ids),
+            "answer": answer,
+            "index_version": version,
+            "expires": expires,
+            "last_access": last_access,
+        }
+        self._vectors[entry_id] = vector
+        self._max_id = max(self._max_id, entry_id)
+        self._matrix = None  # rebuilt on next lookup
+
+    def _forget(self, entry_ids: List[int]):
+        """Drop entries from this worker's copy only."""
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+            self._vectors.pop(entry_id, None)
+        self._matrix = None
+
+    def _remove(self, entry_ids: List[int]):
+        self._forget(entry_ids)
+        with self._conn:
+            self._conn.executemany("DELETE FROM entries WHERE id = ?", [(i,) for i in entry_ids])
+
+    def _index(self) -> Optional[np.ndarray]:
+        """Stacked (n, dim) matrix of cached query vectors, rebuilt lazily."""
+        if self._matrix is None and self._vectors:
+            dims = {v.shape[0] for v in self._vectors.values()}
+            if len(dims) > 1:
+                # Embedding model changed: keep only the most recent dimension
+                newest = max(self._entries, key=lambda i: self._entries[i]["last_access"])
+                dim = self._vectors[newest].shape[0]
+                self._remove([i for i, v in self._vectors.items() if v.shape[0] != dim])
+            self._row_ids = list(self._vectors)
+            self._matrix = np.stack([self._vectors[i] for i in self._row_ids])
+        return self._matrix
+
+    def _evict(self, now: float):
+        doomed = [i for i, e in self._entries.items() if e["expires"] < now]
+        excess = len(self._entries) - len(doomed) - self.max_entries
+        if excess > 0:
+            live = sorted(
+                (i for i, e in self._entries.items() if e["expires"] >= now),
+                key=lambda i: self._entries[i]["last_access"],
+            )
+            doomed.extend(live[:excess])
+        if doomed:
+            self._remove(doomed)
+
+    def _audit(self, query: str, entry_id: int, entry: Dict, similarity: float, overlap: float, module_id: str):
+        print(f"[INFO] Semantic cache hit (sim={similarity:.3f}, overlap={overlap:.2f}): {query!r} ~ {entry['query']!r}")
+        if self.audit_log is None:
+            return
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "module": module_id,
+            "query": query,
+            "matched_query": entry["query"],
+            "entry_id": entry_id,
+            "similarity": round(similarity, 4),
+            "chunk_overlap": round(overlap, 4),
+        }
+        try:
+            with open(self.audit_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[WARNING] Could not write semantic cache audit log: {e}")
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """The process-wide semantic cache, or None when disabled."""
+    global _cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(config.SEMANTIC_CACHE_PATH)
+    return _cache
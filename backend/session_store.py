@@ -0,0 +1,526 @@
+"""
+Session Stores
+==============
+Where ConversationMemory keeps its sessions. Both stores have the same
+small interface: append, messages, summarized, set_summary, info, clear,
+sweep, stats, flush, close.
+
+- LocalSessionStore: in-process, per worker. Compact slotted records, a
+  bounded deque per session, LRU/TTL eviction on every write.
+- SQLiteSessionStore: one SQLite file in WAL mode shared by every worker on
+  the machine, so consecutive turns of a student may land on any worker.
+  Each append-and-trim is one transaction. Appends are buffered and
+  written in batches (SESSION_STORE_BATCH_SIZE, or after
+  SESSION_STORE_FLUSH_SECONDS). Reads are cached per session and
+  revalidated against the session's interaction count with one indexed
+  lookup. Expiry and LRU limits are enforced with every batch write and
+  by sweep().
+
+A session also carries its rolling summary (summarizer.py) and how many
+messages are folded into it; messages are numbered 1.. in append order.
+
+Messages are kept compactly: float timestamps, interned role strings, one
+shared empty metadata mapping, and shared frozensets for the keyword tags
+(keywords.py) computed once when a message is added.
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from types import MappingProxyType
+from typing import Deque, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import config
+
+# Approximate per-message bookkeeping on top of the content string
+# (slotted record and its float timestamp)
+MESSAGE_OVERHEAD_BYTES = 100
+
+# Per-session bookkeeping (Session record, deque block, id key); measured
+# with tracemalloc at ~770 bytes on CPython 3.11
+SESSION_OVERHEAD_BYTES = 768
+
+# Shared by every message stored without metadata
+_NO_METADATA: Mapping = MappingProxyType({})
+
+# One shared frozenset per distinct tag combination
+_TAGSETS: Dict[FrozenSet[str], FrozenSet[str]] = {}
+
+
+class Message:
+    """One stored conversation message."""
+    __slots__ = ("role", "content", "timestamp", "metadata", "tags")
+
+    def __init__(
+        self,
+        role: str,
+        content: str,
+        timestamp: float,
+        metadata: Optional[Mapping] = None,
+        tags: FrozenSet[str] = frozenset(),
+    ):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+        self.metadata = metadata or _NO_METADATA
+        self.tags = _TAGSETS.setdefault(tags, tags)
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.content) + MESSAGE_OVERHEAD_BYTES
+
+
+# -----------------------
+# In-process store
+# -----------------------
+class Session:
+    """A session's messages plus its bookkeeping."""
+    __slots__ = (
+        "messages", "created_at", "last_updated", "interaction_count", "last_seen", "nbytes",
+        "summary", "summary_covered",
+    )
+
+    def __init__(self, max_history: int, now: float):
+        self.messages: Deque[Message] = deque(maxlen=max_history)
+        self.created_at = now
+        self.last_updated = now
+        self.interaction_count = 0
+        self.last_seen = time.monotonic()
+        self.nbytes = SESSION_OVERHEAD_BYTES
+        self.summary = ""
+        self.summary_covered = 0
+
+
+class LocalSessionStore:
+    """Sessions in this process, least recently used first."""
+
+    def __init__(self, max_history: int, max_sessions: int, max_bytes: int, idle_ttl_seconds: float):
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = {"expired": 0, "sessions": 0, "bytes": 0}
+        self._lock = threading.RLock()
+
+    def append(self, session_id: str, message: Message):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(self.max_history, message.timestamp)
+                self.total_bytes += session.nbytes
+
+            # The deque drops the oldest message itself; just account for it
+            added = message.nbytes
+            if len(session.messages) == session.messages.maxlen:
+                added -= session.messages[0].nbytes
+            session.messages.append(message)
+            session.nbytes += added
+            self.total_bytes += added
+            session.last_updated = message.timestamp
+            session.interaction_count += 1
+
+            self._enforce_limits(keep=session_id)
+
+    def messages(self, session_id: str) -> List[Message]:
+        with self._lock:
+            session = self._touch(session_id)
+            return list(session.messages) if session is not None else []
+
+    def summarized(self, session_id: str) -> Tuple[str, int, List[Message]]:
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return "", 0, []
+            return _split_summarized(
+                session.summary, session.summary_covered, session.interaction_count, list(session.messages)
+            )
+
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or covered <= session.summary_covered:
+                return
+            added = sys.getsizeof(summary) - sys.getsizeof(session.summary)
+            session.summary = summary
+            session.summary_covered = covered
+            session.nbytes += added
+            self.total_bytes += added
+
+    def info(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return None
+            return {
+                "created_at": session.created_at,
+                "last_updated": session.last_updated,
+                "interaction_count": session.interaction_count,
+            }
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def sweep(self) -> int:
+        removed = 0
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        with self._lock:
+            # LRU order is last-seen order: stop at the first live session
+            for session_id, session in list(self._sessions.items()):
+                if session.last_seen > cutoff:
+                    break
+                self._drop(session_id)
+                removed += 1
+            self.evictions["expired"] += removed
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "local",
+                "sessions": len(self._sessions),
+                "bytes": self.total_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _touch(self, session_id: str) -> Optional[Session]:
+        """Mark a session as used; None if it does not exist (or just expired)."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.last_seen > self.idle_ttl_seconds:
+            self._drop(session_id)
+            self.evictions["expired"] += 1
+            return None
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.nbytes
+
+    def _enforce_limits(self, keep: str):
+        """Evict least recently used sessions (never keep) until within bounds."""
+        while len(self._sessions) > 1:
+            if len(self._sessions) > self.max_sessions:
+                reason = "sessions"
+            elif self.total_bytes > self.max_bytes:
+                reason = "bytes"
+            else:
+                return
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                return
+            self._drop(oldest)
+            self.evictions[reason] += 1
+
+
+def _split_summarized(
+    summary: str, covered: int, count: int, messages: List[Message]
+) -> Tuple[str, int, List[Message]]:
+    """
+    (summary, base, messages numbered after base), given the session's last
+    messages and how many were ever appended. base is where the summary
+    ends, or later if unsummarized messages were already trimmed.
+    """
+    first = count - len(messages)  # messages[0] is number first + 1
+    base = max(covered, first)
+    return summary, base, messages[base - first:]
+
+
+# -----------------------
+# Shared SQLite store
+# -----------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id                TEXT PRIMARY KEY,
+    created_at        REAL NOT NULL,
+    last_updated      REAL NOT NULL,
+    interaction_count INTEGER NOT NULL,
+    nbytes            INTEGER NOT NULL,
+    summary           TEXT NOT NULL DEFAULT '',
+    summary_covered   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_lru ON sessions(last_updated);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    role       TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    timestamp  REAL NOT NULL,
+    metadata   TEXT,
+    tags       TEXT,
+    nbytes     INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file (WAL) shared by all workers on a machine.
+
+    Idle time is measured from the last message (reads do not write), and
+    buffered appends not yet flushed are lost if the worker dies.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_history: int,
+        max_sessions: int,
+        max_bytes: int,
+        idle_ttl_seconds: float,
+        batch_size: int = config.SESSION_STORE_BATCH_SIZE,
+        flush_seconds: float = config.SESSION_STORE_FLUSH_SECONDS,
+        cache_sessions: int = config.SESSION_STORE_CACHE_SESSIONS,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.cache_sessions = cache_sessions
+        self.evictions = {"expired": 0, "sessions": 0, "bytes": 0}
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._pending: List[Tuple[str, Message]] = []
+        self._timer: Optional[threading.Timer] = None
+        # session id -> ((created_at, interaction count), messages) as last
+        # read from the database; created_at tells a recreated session apart
+        self._cache: "OrderedDict[str, Tuple[Tuple[float, int], List[Message]]]" = OrderedDict()
+
+    def append(self, session_id: str, message: Message):
+        with self._lock:
+            self._pending.append((session_id, message))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def messages(self, session_id: str) -> List[Message]:
+        return self._load(session_id)[3]
+
+    def summarized(self, session_id: str) -> Tuple[str, int, List[Message]]:
+        count, summary, covered, messages = self._load(session_id)
+        return _split_summarized(summary, covered, count, messages)
+
+    def set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT summary FROM sessions WHERE id = ? AND summary_covered < ?", (session_id, covered)
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, summary_covered = ?, nbytes = nbytes + ? WHERE id = ?",
+                (summary, covered, sys.getsizeof(summary) - sys.getsizeof(row[0]), session_id),
+            )
+
+    def info(self, session_id: str) -> Optional[Dict]:
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, last_updated, interaction_count FROM sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.idle_ttl_seconds:
+            return None
+        return {"created_at": row[0], "last_updated": row[1], "interaction_count": row[2]}
+
+    def clear(self, session_id: str):
+        with self._lock, self._conn:
+            self._pending = [(sid, m) for sid, m in self._pending if sid != session_id]
+            self._cache.pop(session_id, None)
+            self._delete_sessions([session_id])
+
+    def flush(self):
+        """Write buffered appends, all in one transaction."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+            if timer is not None:
+                timer.cancel()
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            with self._conn:
+                for session_id, message in pending:
+                    self._append_row(session_id, message)
+                self._evict()
+
+    def sweep(self) -> int:
+        """Delete expired sessions, then LRU sessions beyond the limits; returns how many."""
+        self.flush()
+        with self._lock, self._conn:
+            return self._evict()
+
+    def _evict(self) -> int:
+        """
+        Delete expired sessions, then LRU sessions beyond the limits, within the
+        caller's transaction. When nothing is due this is one indexed lookup
+        and one count/byte query.
+        """
+        expired = [sid for (sid,) in self._conn.execute(
+            "SELECT id FROM sessions WHERE last_updated < ?", (time.time() - self.idle_ttl_seconds,)
+        )]
+        self._delete_sessions(expired)
+        self.evictions["expired"] += len(expired)
+
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM sessions"
+        ).fetchone()
+        excess_count, excess_bytes = count - self.max_sessions, total - self.max_bytes
+        doomed = []
+        if excess_count > 0 or excess_bytes > 0:
+            for sid, nbytes in self._conn.execute("SELECT id, nbytes FROM sessions ORDER BY last_updated"):
+                if excess_count <= 0 and excess_bytes <= 0:
+                    break
+                self.evictions["sessions" if excess_count > 0 else "bytes"] += 1
+                doomed.append(sid)
+                excess_count -= 1
+                excess_bytes -= nbytes
+            self._delete_sessions(doomed)
+        return len(expired) + len(doomed)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM sessions"
+            ).fetchone()
+            return {
+                "backend": "sqlite",
+                "sessions": count,
+                "bytes": total,
+                "pending_writes": len(self._pending),
+                "cached_sessions": len(self._cache),
+                "evictions": dict(self.evictions),
+            }
+
+    def close(self):
+        self.flush()
+
+    def _load(self, session_id: str) -> Tuple[int, str, int, List[Message]]:
+        """(messages ever appended, summary, messages it covers, last max_history messages)."""
+        with self._lock:
+            pending = [m for sid, m in self._pending if sid == session_id]
+            row = self._conn.execute(
+                "SELECT interaction_count, last_updated, summary, summary_covered, created_at "
+                "FROM sessions WHERE id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None or row[1] < time.time() - self.idle_ttl_seconds:
+                self._cache.pop(session_id, None)
+                return len(pending), "", 0, pending[-self.max_history:]
+
+            count, _, summary, covered, created_at = row
+            version = (created_at, count)
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[0] == version:
+                stored = cached[1]
+                self._cache.move_to_end(session_id)
+            else:
+                stored = [
+                    Message(
+                        role, content, timestamp,
+                        json.loads(metadata) if metadata else None,
+                        frozenset(tags.split(",")) if tags else frozenset(),
+                    )
+                    for role, content, timestamp, metadata, tags in self._conn.execute(
+                        "SELECT role, content, timestamp, metadata, tags FROM messages "
+                        "WHERE session_id = ? ORDER BY seq",
+                        (session_id,),
+                    )
+                ]
+                self._cache[session_id] = (version, stored)
+                self._cache.move_to_end(session_id)
+                while len(self._cache) > self.cache_sessions:
+                    self._cache.popitem(last=False)
+        return count + len(pending), summary, covered, (stored + pending)[-self.max_history:]
+
+    def _append_row(self, session_id: str, message: Message):
+        """Append one message and trim the session to max_history (caller holds the transaction)."""
+        now = message.timestamp
+        # A session idle past the TTL starts over
+        if self._conn.execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND last_updated < ?",
+            (session_id, now - self.idle_ttl_seconds),
+        ).fetchone():
+            self._delete_sessions([session_id])
+            self.evictions["expired"] += 1
+
+        nbytes = message.nbytes
+        self._conn.execute(
+            "INSERT INTO sessions (id, created_at, last_updated, interaction_count, nbytes) "
+            "VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_updated = excluded.last_updated, "
+            "interaction_count = interaction_count + 1, nbytes = nbytes + ?",
+            (session_id, now, now, SESSION_OVERHEAD_BYTES + nbytes, nbytes),
+        )
+        (seq,) = self._conn.execute(
+            "SELECT interaction_count FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO messages (session_id, seq, role, content, timestamp, metadata, tags, nbytes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                session_id, seq, message.role, message.content, now,
+                json.dumps(dict(message.metadata)) if message.metadata else None,
+                ",".join(sorted(message.tags)) or None, nbytes,
+            ),
+        )
+        (trimmed,) = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM messages WHERE session_id = ? AND seq <= ?",
+            (session_id, seq - self.max_history),
+        ).fetchone()
+        if trimmed:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND seq <= ?", (session_id, seq - self.max_history)
+            )
+            self._conn.execute("UPDATE sessions SET nbytes = nbytes - ? WHERE id = ?", (trimmed, session_id))
+
+    def _delete_sessions(self, session_ids: List[str]):
+        rows = [(sid,) for sid in session_ids]
+        self._conn.executemany("DELETE FROM messages WHERE session_id = ?", rows)
+        self._conn.executemany("DELETE FROM sessions WHERE id = ?", rows)
+        for sid in session_ids:
+            self._cache.pop(sid, None)
+
+
+def make_session_store(
+    max_history: int,
+    max_sessions: int,
+    max_bytes: int,
+    idle_ttl_seconds: float,
+    backend: str = config.SESSION_STORE,
+):
+    """The session store named by backend ("local" or "sqlite")."""
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            config.SESSION_STORE_PATH, max_history, max_sessions, max_bytes, idle_ttl_seconds
+        )
+    if backend != "local":
+        print(f"[WARNING] Unknown SESSION_STORE '{backend}', using the in-process store")
+    return LocalSessionStore(max_history, max_sessions, max_bytes, idle_ttl_seconds)
@@ -0,0 +1,89 @@
+"""
+SSE Stream Guard
+================
+Wraps a server-sent-events generator so that:
+
+- a client disconnect (closed tab, "New Chat") is noticed within
+  DISCONNECT_POLL_SECONDS and the upstream generation is cancelled at once,
+  releasing its connection instead of reading on until [DONE];
+- an SSE comment is sent whenever the stream has been idle for
+  SSE_KEEPALIVE_SECONDS, so proxies do not cut long generations.
+"""
+
+import asyncio
+import json
+from contextlib import suppress
+from typing import Any, AsyncIterator
+
+from starlette.requests import Request
+
+import config
+
+# SSE comment line: ignored by EventSource and by our UI's "data: " parser
+KEEPALIVE_COMMENT = ": keep-alive\n\n"
+
+
+def sse_event(event: str, data: Any) -> str:
+    """A named SSE event; its payload has no "choices", so token parsers skip it."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _wait_for_disconnect(request: Request, poll_interval: float):
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_interval)
+
+
+async def guard_stream(
+    request: Request,
+    events: AsyncIterator[str],
+    keepalive_interval: float = config.SSE_KEEPALIVE_SECONDS,
+    poll_interval: float = config.DISCONNECT_POLL_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Relay SSE events from an async generator, adding keep-alives and
+    cancelling the generator if the client goes away.
+
+    Args:
+        request: Incoming request (used to detect disconnects)
+        events: Async generator yielding SSE-formatted strings
+        keepalive_interval: Idle seconds before a keep-alive comment is sent
+        poll_interval: Seconds between disconnect checks
+
+    Yields:
+        SSE-formatted strings
+    """
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request, poll_interval))
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+
+            done, _ = await asyncio.wait(
+                {pending, watcher},
+                timeout=keepalive_interval,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            if watcher in done:
+                print("[INFO] Client disconnected; cancelling upstream stream")
+                return
+
+            if pending in done:
+                task, pending = pending, None
+                try:
+                    item = task.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+            else:
+                yield KEEPALIVE_COMMENT
+    finally:
+        watcher.cancel()
+        if pending is not None and not pending.done():
+            # Cancelling the in-flight read unwinds the upstream request
+            pending.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await pending
+        with suppress(RuntimeError):
+            await events.aclose()
@@ -0,0 +1,146 @@
+"""
+Rolling Conversation Summaries
+==============================
+Keeps a short summary per session so prompts carry summary + last few turns
+instead of a history that grows with the session.
+
+- After a response has been sent, schedule() starts a background task (off
+  the request path). The task does nothing until SUMMARY_EVERY_TURNS turns
+  beyond the last SUMMARY_RECENT_TURNS are unsummarized.
+- Then the previous summary and those turns go to the LLM, which returns an
+  updated summary of at most SUMMARY_MAX_TOKENS. The store keeps it with the
+  number of the last message it covers, so every update is incremental and
+  each message is summarized once.
+- One update per session at a time in this process. With a shared session
+  store, two workers may race; the store keeps whichever summary covers more.
+- Updates are generations like any other: they take an admission slot
+  (admission.py) and are deferred to a later turn while the service is
+  degraded (degradation.py) or the queue is full.
+- Failures are logged and counted; the turns are retried on the next turn.
+  The interval is shortened if needed so that one retry still finds them
+  in memory (they are trimmed at MAX_CONVERSATION_HISTORY).
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+
+from admission import AdmissionRejected, get_admission_controller
+from degradation import get_service_level
+from memory import ConversationMemory, get_memory
+from metrics import get_metrics
+from prompt_budget import get_tokenizer
+from provider_router import AllUpstreamsFailed, UpstreamError, get_provider_router
+import config
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep a running summary of a tutoring conversation between a student and their "
+    "module convenor. Update the summary with the new turns. Keep what the student is "
+    "working on, what they asked, where they struggled, and any advice, deadlines or facts "
+    "they were given. Drop greetings and repetition. Write in the third person, at most "
+    "{words} words, and reply with the summary only."
+)
+
+# Longest a single message may be when it is shown to the summarizer
+MAX_MESSAGE_TOKENS = 400
+
+# Low temperature: summaries should be stable, not creative
+SUMMARY_TEMPERATURE = 0.2
+
+
+def summary_prompt(summary: str, turns: List[Dict], max_tokens: int) -> List[Dict]:
+    """Chat messages asking for the previous summary updated with turns."""
+    tokenizer = get_tokenizer()
+    lines = [
+        f"{'Student' if m['role'] == 'user' else 'Convenor'}: {tokenizer.truncate(m['content'], MAX_MESSAGE_TOKENS)}"
+        for m in turns
+    ]
+    return [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(words=max_tokens * 3 // 4)},
+        {
+            "role": "user",
+            "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew turns:\n"
+                       + "\n".join(lines) + "\n\nUpdated summary:",
+        },
+    ]
+
+
+class ConversationSummarizer:
+    """Schedules and runs incremental summary updates for sessions."""
+
+    def __init__(
+        self,
+        memory: ConversationMemory,
+        every_turns: int = 3,
+        recent_turns: int = 2,
+        max_tokens: int = 200,
+    ):
+        self.memory = memory
+        self.keep = 2 * recent_turns
+        # The turns must still be in memory when their update runs, and
+        # again one turn later if it was deferred or failed
+        room = memory.max_history - self.keep - 2
+        self.every = max(2, min(2 * every_turns, room - room % 2))
+        self.max_tokens = max_tokens
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, session_id: str):
+        """Update the session's summary in the background if enough turns are due."""
+        if session_id in self._running:
+            return
+        self._running.add(session_id)
+        task = asyncio.get_running_loop().create_task(self._update(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, session_id: str):
+        try:
+            summary, base, messages = await asyncio.to_thread(self.memory.get_summarized_history, session_id)
+            if len(messages) < self.keep + self.every:
+                return
+            if get_service_level().level > 0:
+                get_metrics().incr("summaries_deferred")
+                return
+            turns = messages[:-self.keep] if self.keep else messages
+            try:
+                ticket = await get_admission_controller().acquire(session_id)
+            except AdmissionRejected:
+                get_metrics().incr("summaries_deferred")
+                return
+            started = time.monotonic()
+            try:
+                text = await get_provider_router().complete(
+                    summary_prompt(summary, turns, self.max_tokens),
+                    temperature=SUMMARY_TEMPERATURE,
+                    max_tokens=self.max_tokens,
+                )
+            except (AllUpstreamsFailed, UpstreamError) as e:
+                print(f"[WARNING] Conversation summary failed: {e}")
+                get_metrics().incr("summary_failures")
+                return
+            finally:
+                ticket.release()
+            get_metrics().observe("summary_seconds", time.monotonic() - started)
+            text = text.strip()
+            if text:
+                await asyncio.to_thread(self.memory.set_summary, session_id, text, base + len(turns))
+                get_metrics().incr("summaries")
+        finally:
+            self._running.discard(session_id)
+
+
+_summarizer: Optional[ConversationSummarizer] = None
+
+
+def get_summarizer() -> ConversationSummarizer:
+    """Get the global summarizer for the global conversation memory."""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = ConversationSummarizer(
+            get_memory(),
+            every_turns=config.SUMMARY_EVERY_TURNS,
+            recent_turns=config.SUMMARY_RECENT_TURNS,
+            max_tokens=config.SUMMARY_MAX_TOKENS,
+        )
+    return _summarizer
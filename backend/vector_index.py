@@ -0,0 +1,197 @@
+"""
+Quantized Vector Index
+======================
+Compact embedding index that sits alongside the Chroma collection.
+
+Embeddings are stored as float16 or int8 (scalar quantization with
+per-dimension scales) and searched in that compact form. Only the shortlist
+is re-scored against the full-precision vectors, which stay on disk and are
+memory-mapped so just the touched rows are paged in.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+QUANTIZATION_MODES = {"float16", "int8"}
+
+# Rows scored per block when searching, so the temporary float32 copy of the
+# codes stays small no matter how large the index grows.
+SEARCH_BLOCK_ROWS = 4096
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise rows so that a dot product equals cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class QuantizedIndex:
+    """
+    Searchable compact copy of a collection's embeddings.
+
+    Files in the index directory:
+        meta.json   - mode, dimension and chunk ids (row order)
+        codes.npy   - float16 or int8 codes, kept in memory
+        scales.npy  - per-dimension scale (int8 only)
+        offsets.npy - per-dimension minimum (int8 only)
+        full.npy    - normalised float32 vectors, memory-mapped for re-scoring
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        mode: str,
+        ids: List[str],
+        codes: np.ndarray,
+        full: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        offsets: Optional[np.ndarray] = None,
+    ):
+        self.directory = Path(directory)
+        self.mode = mode
+        self.ids = ids
+        self.codes = codes
+        self.full = full
+        self.scales = scales
+        self.offsets = offsets
+
+    # -----------------------
+    # Build / load
+    # -----------------------
+    @classmethod
+    def build(
+        cls,
+        directory: Path,
+        ids: Sequence[str],
+        embeddings: np.ndarray,
+        mode: str,
+    ) -> "QuantizedIndex":
+        """
+        Quantize embeddings and persist the index to directory.
+
+        Args:
+            directory: Target directory (created if missing)
+            ids: Chunk ids in the same order as embeddings
+            embeddings: (n, dim) array of raw embeddings
+            mode: "float16" or "int8"
+
+        Returns:
+            The freshly built index
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        full = _normalize(np.asarray(embeddings, dtype=np.float32))
+        scales = offsets = None
+
+        if mode == "float16":
+            codes = full.astype(np.float16)
+        else:
+            # Per-dimension affine mapping of [min, max] onto [-128, 127]
+            offsets = full.min(axis=0)
+            scales = (full.max(axis=0) - offsets) / 255.0
+            scales[scales == 0] = 1.0
+            codes = (np.rint((full - offsets) / scales) - 128).clip(-128, 127).astype(np.int8)
+            np.save(directory / "scales.npy", scales.astype(np.float32))
+            np.save(directory / "offsets.npy", offsets.astype(np.float32))
+
+        np.save(directory / "codes.npy", codes)
+        np.save(directory / "full.npy", full)
+        with open(directory / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "dim": int(full.shape[1]), "ids": list(ids)}, f)
+
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["QuantizedIndex"]:
+        """Load an index from directory, or return None if none was built."""
+        directory = Path(directory)
+        meta_path = directory / "meta.json"
+        if not meta_path.exists():
+            return None
+
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+
+        mode = meta["mode"]
+        scales = offsets = None
+        if mode == "int8":
+            scales = np.load(directory / "scales.npy")
+            offsets = np.load(directory / "offsets.npy")
+
+        return cls(
+            directory=directory,
+            mode=mode,
+            ids=meta["ids"],
+            codes=np.load(directory / "codes.npy"),
+            full=np.load(directory / "full.npy", mmap_mode="r"),
+            scales=scales,
+            offsets=offsets,
+        )
+
+    # -----------------------
+    # Search
+    # -----------------------
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the compact codes (full vectors stay on disk)."""
+        size = self.codes.nbytes
+        if self.scales is not None:
+            size += self.scales.nbytes + self.offsets.nbytes
+        return size
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Score every row against the query using the compact codes."""
+        if self.mode == "int8":
+            # q . x ~= (codes + 128) . (q * scales) + q . offsets
+            weights = query * self.scales
+            bias = 128.0 * weights.sum() + float(query @ self.offsets)
+        else:
+            weights, bias = query, 0.0
+
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SEARCH_BLOCK_ROWS):
+            block = self.codes[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + SEARCH_BLOCK_ROWS] = block @ weights + bias
+        return scores
+
+    def search(self, query_embedding, top_k: int, rescore: int = 50) -> List[Tuple[str, float]]:
+        """
+        Find the top_k most similar chunks to a query embedding.
+
+        Args:
+            query_embedding: Raw query embedding (normalised here)
+            top_k: Number of results to return
+            rescore: Shortlist size re-scored in full precision
+
+        Returns:
+            List of (chunk_id, cosine_similarity), best first
+        """
+        if not self.ids or top_k <= 0:
+            return []
+
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        approx = self._approximate_scores(query)
+
+        shortlist_size = min(len(self.ids), max(top_k, rescore))
+        if shortlist_size < len(self.ids):
+            shortlist = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+        else:
+            shortlist = np.arange(len(self.ids))
+
+        # Exact re-score: fancy indexing on the memmap reads only these rows
+        shortlist = np.sort(shortlist)
+        exact = np.asarray(self.full[shortlist]) @ query
+
+        order = np.argsort(-exact)[:top_k]
+        return [(self.ids[shortlist[i]], float(exact[i])) for i in order]
@@ -0,0 +1,217 @@
+"""
+Load Test Harness
+=================
+Drives the EduMate backend with concurrent student-like sessions and reports
+throughput, time to first token and total latency percentiles as JSON.
+
+- --endpoint chat: POST /chat with an OpenAI-style messages list (the UI path)
+- --endpoint rag:  POST /rag with a question (retrieval + memory + generation)
+- --repeat-ratio re-asks earlier questions to exercise the response cache
+  and request coalescing; responses are tagged with the cache headers
+- 429s are counted separately from errors (admission control working as
+  intended is not a failure)
+
+Usage (with bench/mock_llm.py as the upstream):
+    python bench/mock_llm.py --port 9100 &
+    OPENROUTER_BASE_URL=http://localhost:9100/v1 OPENROUTER_API_KEY=mock \\
+        uvicorn main:app --app-dir backend --port 8000 &
+    python bench/loadtest.py --url http://localhost:8000 --concurrency 32 --requests 500 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+# Reuse the backend's percentile definition so reports match /metrics
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from metrics import percentile  # noqa: E402
+
+DEFAULT_QUESTIONS = [
+    "When is coursework 1 due?",
+    "What is the late submission policy?",
+    "How is the module assessed?",
+    "Can I get an extension for my report?",
+    "What are the learning outcomes of this module?",
+    "How many words should the portfolio be?",
+    "Where can I find the marking rubric?",
+    "What happens if I miss the exam?",
+    "How do I reference sources in my report?",
+    "When are the convenor's office hours?",
+    "Is the group project weighted more than the exam?",
+    "What should I revise for the final exam?",
+]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p90": round(percentile(values, 90), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4),
+    }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, questions: List[str]):
+        self.args = args
+        self.questions = questions
+        self.asked: List[str] = []
+        self.results: List[Dict] = []
+        self.issued = 0
+
+    def next_question(self) -> str:
+        if self.asked and random.random() < self.args.repeat_ratio:
+            return random.choice(self.asked)
+        question = random.choice(self.questions)
+        if self.args.unique:
+            question = f"{question} (#{self.issued})"
+        self.asked.append(question)
+        return question
+
+    def request_body(self, question: str, session_id: str) -> Dict:
+        if self.args.endpoint == "rag":
+            body = {"question": question, "session_id": session_id}
+            if self.args.module:
+                body["module_id"] = self.args.module
+        else:
+            body = {"messages": [{"role": "user", "content": question}], "session_id": session_id}
+        if self.args.model:
+            body["model"] = self.args.model
+        return body
+
+    async def one_request(self, client: httpx.AsyncClient, session_id: str):
+        question = self.next_question()
+        result = {"status": None, "ttft": None, "latency": None, "chunks": 0, "error": None}
+        started = time.monotonic()
+        try:
+            async with client.stream(
+                "POST",
+                f"{self.args.url.rstrip('/')}/{self.args.endpoint}",
+                json=self.request_body(question, session_id),
+            ) as response:
+                result["status"] = response.status_code
+                result["cache"] = response.headers.get("X-EduMate-Cache")
+                result["coalesced"] = response.headers.get("X-EduMate-Coalesced")
+                result["service_level"] = response.headers.get("X-EduMate-Service-Level")
+                if response.status_code != 200:
+                    await response.aread()
+                else:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        data = line[6:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            event = json.loads(data)
+                        except ValueError:
+                            continue
+                        if isinstance(event, dict) and event.get("error"):
+                            result["error"] = str(event["error"])
+                            break
+                        if isinstance(event, dict) and event.get("choices"):
+                            if result["ttft"] is None:
+                                result["ttft"] = time.monotonic() - started
+                            result["chunks"] += 1
+        except httpx.HTTPError as e:
+            result["error"] = type(e).__name__
+        result["latency"] = time.monotonic() - started
+        self.results.append(result)
+
+    async def session(self, client: httpx.AsyncClient, deadline: float, start_delay: float):
+        await asyncio.sleep(start_delay)
+        session_id = uuid.uuid4().hex[:12]
+        while time.monotonic() < deadline and self.issued < self.args.requests:
+            self.issued += 1
+            await self.one_request(client, session_id)
+            if self.args.think_time:
+                await asyncio.sleep(random.expovariate(1.0 / self.args.think_time))
+
+    async def run(self) -> Dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        timeout = httpx.Timeout(self.args.timeout, connect=10.0)
+        started = time.monotonic()
+        deadline = started + self.args.duration if self.args.duration else float("inf")
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            await asyncio.gather(*[
+                self.session(client, deadline, self.args.ramp_seconds * i / self.args.concurrency)
+                for i in range(self.args.concurrency)
+            ])
+            backend_metrics = None
+            try:
+                backend_metrics = (await client.get(f"{self.args.url.rstrip('/')}/metrics")).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+        return self.report(time.monotonic() - started, backend_metrics)
+
+    def report(self, elapsed: float, backend_metrics: Optional[Dict]) -> Dict:
+        ok = [r for r in self.results if r["status"] == 200 and not r["error"]]
+        statuses = Counter(str(r["status"]) for r in self.results)
+        errors = Counter(r["error"] for r in self.results if r["error"])
+        return {
+            "config": {k: v for k, v in vars(self.args).items() if k not in ("output", "questions")},
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": len(self.results),
+            "succeeded": len(ok),
+            "rejected_429": statuses.get("429", 0),
+            "statuses": dict(statuses),
+            "errors": dict(errors),
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+            "chunks_per_second": round(sum(r["chunks"] for r in ok) / elapsed, 3) if elapsed else None,
+            "ttft_seconds": summarize([r["ttft"] for r in ok if r["ttft"] is not None]),
+            "latency_seconds": summarize([r["latency"] for r in ok]),
+            "cache_hits": sum(1 for r in ok if r.get("cache") == "hit"),
+            "coalesced": sum(1 for r in ok if r.get("coalesced")),
+            "service_levels": dict(Counter(r.get("service_level") for r in ok)),
+            "backend_metrics": backend_metrics,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EduMate end-to-end load test")
+    parser.add_argument("--url", default="http://localhost:8000", help="backend base URL (add /api for the web host)")
+    parser.add_argument("--endpoint", choices=["chat", "rag"], default="chat")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent student sessions")
+    parser.add_argument("--requests", type=int, default=200, help="total requests")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds (0 = no limit)")
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="spread session starts over N seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a session's requests")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="fraction of re-asked questions")
+    parser.add_argument("--unique", action="store_true", help="make new questions unique (defeats caching)")
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--model", help="model to request (default: backend default)")
+    parser.add_argument("--module", help="module id for retrieval (/rag only)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="write the JSON report here as well as stdout")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        questions = [q.strip() for q in Path(args.questions).read_text(encoding="utf-8").splitlines() if q.strip()]
+
+    report = asyncio.run(LoadTest(args, questions).run())
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Mock LLM Server
+===============
+Local OpenAI-compatible chat completions server for benchmarking EduMate
+without paying OpenRouter or fighting its latency variance.
+
+- POST /v1/chat/completions: streaming (SSE) and non-streaming answers
+- Configurable time to first token (log-normal around --ttft), tokens per
+  second, answer length, error rate (HTTP 503) and mid-stream stalls
+- Per-model overrides (--profiles) to exercise failover and hedging, e.g.
+  a slow or failing primary model
+- GET /stats: requests served, in flight, errors injected
+
+Usage:
+    python bench/mock_llm.py --port 9100 --ttft 0.8 --tps 40 --error-rate 0.02
+    OPENROUTER_BASE_URL=http://localhost:9100/v1 OPENROUTER_API_KEY=mock ...
+
+    # primary model stalls, fallback is healthy
+    python bench/mock_llm.py --profiles '{"mock/slow": {"ttft": 6}, "mock/broken": {"error_rate": 1}}'
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import uuid
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the module assessment coursework deadline lecture seminar feedback marks "
+    "submission portfolio report criteria learning outcomes reading week tutor "
+    "office hours extension policy plagiarism referencing group project exam "
+    "revision handbook moodle rubric grade weighting late penalty support"
+).split()
+
+
+@dataclass
+class Profile:
+    """Latency/failure behaviour of one mock model."""
+    ttft: float = 0.8           # median seconds to first token
+    ttft_sigma: float = 0.35    # log-normal spread of the TTFT
+    tps: float = 40.0           # tokens per second once streaming
+    tokens: int = 200           # answer length when max_tokens is not set
+    error_rate: float = 0.0     # fraction of requests answered with HTTP 503
+    stall_rate: float = 0.0     # fraction of streams that stall mid-answer
+    stall_seconds: float = 30.0
+    tokens_per_chunk: int = 2
+
+
+class MockLLM:
+    def __init__(self, default: Profile, profiles: Dict[str, Profile]):
+        self.default = default
+        self.profiles = profiles
+        self.stats = {"requests": 0, "in_flight": 0, "errors_injected": 0, "stalls_injected": 0}
+
+    def profile(self, model: str) -> Profile:
+        return self.profiles.get(model, self.default)
+
+    def answer_tokens(self, messages: List[Dict], n: int) -> List[str]:
+        """Deterministic pseudo-answer for a prompt (same prompt, same text)."""
+        rng = random.Random(json.dumps(messages, sort_keys=True))
+        return [rng.choice(WORDS) + " " for _ in range(n)]
+
+    def ttft(self, profile: Profile) -> float:
+        return random.lognormvariate(math.log(max(profile.ttft, 1e-3)), profile.ttft_sigma)
+
+
+def create_app(mock: MockLLM) -> FastAPI:
+    app = FastAPI(title="EduMate mock LLM")
+
+    @app.get("/stats")
+    def stats():
+        return {**mock.stats, "default_profile": asdict(mock.default)}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        profile = mock.profile(model)
+        mock.stats["requests"] += 1
+
+        if random.random() < profile.error_rate:
+            mock.stats["errors_injected"] += 1
+            return JSONResponse({"error": {"message": "mock upstream overloaded"}}, status_code=503)
+
+        n_tokens = int(body.get("max_tokens") or profile.tokens)
+        tokens = mock.answer_tokens(body.get("messages", []), n_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not body.get("stream"):
+            mock.stats["in_flight"] += 1
+            try:
+                await asyncio.sleep(mock.ttft(profile) + n_tokens / profile.tps)
+            finally:
+                mock.stats["in_flight"] -= 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"completion_tokens": n_tokens},
+            }
+
+        async def events():
+            mock.stats["in_flight"] += 1
+            try:
+                await asyncio.sleep(mock.ttft(profile))
+                stall_at = random.randrange(n_tokens) if random.random() < profile.stall_rate else None
+                step = max(1, profile.tokens_per_chunk)
+                for i in range(0, n_tokens, step):
+                    if stall_at is not None and i >= stall_at:
+                        mock.stats["stalls_injected"] += 1
+                        stall_at = None
+                        await asyncio.sleep(profile.stall_seconds)
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": "".join(tokens[i:i + step])}}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(step / profile.tps)
+                yield "data: [DONE]\n\n"
+            finally:
+                mock.stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=Profile.ttft, help="median time to first token (s)")
+    parser.add_argument("--ttft-sigma", type=float, default=Profile.ttft_sigma)
+    parser.add_argument("--tps", type=float, default=Profile.tps, help="tokens per second")
+    parser.add_argument("--tokens", type=int, default=Profile.tokens, help="answer length without max_tokens")
+    parser.add_argument("--error-rate", type=float, default=Profile.error_rate)
+    parser.add_argument("--stall-rate", type=float, default=Profile.stall_rate)
+    parser.add_argument("--stall-seconds", type=float, default=Profile.stall_seconds)
+    parser.add_argument("--profiles", default="{}", help='per-model overrides, JSON: {"model": {"ttft": 5}}')
+    args = parser.parse_args()
+
+    default = Profile(
+        ttft=args.ttft,
+        ttft_sigma=args.ttft_sigma,
+        tps=args.tps,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+    )
+    profiles = {model: replace(default, **overrides) for model, overrides in json.loads(args.profiles).items()}
+
+    print(f"[INFO] Mock LLM on http://{args.host}:{args.port}/v1 (default profile: {asdict(default)})")
+    uvicorn.run(create_app(MockLLM(default, profiles)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
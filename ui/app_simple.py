@@ -109,6 +109,7 @@ if user_input := st.chat_input("💬 Ask me anything about your course..."):
                     "model": WORKING_MODEL,
                     "messages": st.session_state.messages,
                     "temperature": 0.2,
+                    "session_id": st.session_state.session_id,
                 }
 
                 resp = requests.post(
@@ -146,7 +147,11 @@ if user_input := st.chat_input("💬 Ask me anything about your course..."):
             except requests.exceptions.Timeout:
                 st.warning("⏱️ The request took too long (>120s). Try again or simplify your query.")
             except requests.HTTPError as e:
-                st.error(f"❌ API Error ({e.response.status_code}): {e.response.text[:400]}")
+                if e.response.status_code == 429:
+                    wait = e.response.headers.get("Retry-After", "a few")
+                    st.warning(f"⏳ EduMate is busy right now. Please try again in {wait} seconds.")
+                else:
+                    st.error(f"❌ API Error ({e.response.status_code}): {e.response.text[:400]}")
             except Exception as e:
                 st.error(f"❌ Unexpected Error:\n```\n{str(e)}\n```")
 